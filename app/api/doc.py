@@ -1,15 +1,15 @@
 from fastapi import APIRouter, Depends, status, UploadFile, File, Form
 from typing import List
-from schema import DocumentUploadResponse, StandardResponse, DocOutput, DocumentDeletionResponse
-from controllers import upload_files, getDocsByOrgId, deleteDocuments
-from core import BadRequestException, logger
+from schema import DocumentUploadResponse, StandardResponse, DocOutput, DocumentDeletionResponse, IngestJobOutput
+from controllers import upload_files, getDocsByOrgId, deleteDocuments, getIngestJob
+from core import AppBaseException, BadRequestException, logger
 from db import get_database
 from pymongo.asynchronous.database import AsyncDatabase
 from dependencies import require_admin
 
 router = APIRouter()
 
-@router.post('/upload', response_model=DocumentUploadResponse, status_code=status.HTTP_201_CREATED, dependencies=[Depends(require_admin)])
+@router.post('/upload', response_model=DocumentUploadResponse, status_code=status.HTTP_202_ACCEPTED, dependencies=[Depends(require_admin)])
 async def upload_documents(
     files: List[UploadFile] = File(...),
     organizationId: str = Form(...),
@@ -27,7 +27,7 @@ async def upload_documents(
         db: Database connection
         
     Returns:
-        DocumentUploadResponse with upload and processing results
+        DocumentUploadResponse with upload results and the ingestion job ID
     """
     try:
         result = await upload_files(files, organizationId,fileName, db)
@@ -35,6 +35,21 @@ async def upload_documents(
     except Exception as e:
         raise BadRequestException(f"Error uploading files: {e}")
 
+@router.get('/jobs/{jobId}', response_model=StandardResponse[IngestJobOutput], status_code=status.HTTP_200_OK, dependencies=[Depends(require_admin)])
+async def get_ingest_job(jobId: str, db: AsyncDatabase = Depends(get_database)):
+    """Get the stage, progress and timings of a background ingestion job."""
+    try:
+        job = await getIngestJob(jobId, db)
+        return StandardResponse(
+            status="success",
+            message=f"Ingestion job is {job.status}",
+            data=job
+        )
+    except AppBaseException:
+        raise
+    except Exception as e:
+        raise BadRequestException(f"Error retrieving ingestion job: {e}")
+
 @router.get('/documents/{orgId}', response_model=StandardResponse[List[DocOutput]], status_code=status.HTTP_200_OK)
 async def get_documents_by_org(orgId: str, db: AsyncDatabase = Depends(get_database)):
     """Get all documents for an organization."""
@@ -1,11 +1,14 @@
+import json
 import os
-from fastapi import APIRouter,Depends,status
-from dependencies import require_admin
-from schema import SearchBase, StandardResponse, QueryResponse
+from typing import Any, AsyncIterator, Dict, Optional
+from fastapi import APIRouter,Depends,Query,status
+from fastapi.responses import StreamingResponse
+from dependencies import require_admin, get_current_user
+from schema import SearchBase, StandardResponse, QueryResponse, QueryCacheStats, ChatHistoryPage, ChatQuery, ChatQueryResponse
 from pymongo.asynchronous.database import AsyncDatabase
 from db import get_database
-from core import BadRequestException
-from controllers import query_doc
+from core import BadRequestException, ForbiddenException, logger
+from controllers import query_doc, stream_query_doc, getQueryCacheStats, getChatHistoryPage, chat_query_doc
 
 router = APIRouter()
 
@@ -16,13 +19,103 @@ router = APIRouter()
 @router.post('/query',response_model=StandardResponse[QueryResponse],status_code=status.HTTP_200_OK)
 async def query(userSearch:SearchBase, db:AsyncDatabase = Depends(get_database)):
     try:        
-        print("documentId",userSearch.documentId)
-        result = await query_doc(userSearch.searchTxt,userSearch.orgId, db)
-        print("result....",result)
+        logger.debug(f"Query scoped to document: {userSearch.documentId}")
+        result = await query_doc(
+            userSearch.searchTxt, userSearch.orgId, db,
+            limit=userSearch.limit or 5, document_id=userSearch.documentId, min_score=userSearch.minScore,
+            rerank=userSearch.rerank
+        )
+        logger.debug(f"Query result: {result}")
         return StandardResponse(         
             status="success",
             message="Data fetched successfully",
             data=result
         )
     except Exception as e:
-            raise BadRequestException(f"Error in querying {e}")  
\ No newline at end of file
+            raise BadRequestException(f"Error in querying {e}")  
+
+
+@router.post('/chat',response_model=StandardResponse[ChatQueryResponse],status_code=status.HTTP_200_OK)
+async def chat_query(
+    chatQuery: ChatQuery,
+    db: AsyncDatabase = Depends(get_database),
+    user: dict = Depends(get_current_user)
+):
+    """
+    Answer a question within a chat session: follow-ups are rewritten into a
+    standalone question from the session's summary and recent messages, and
+    the turn is saved to the session's history. Only the session's user, or an
+    admin of its organization, can continue it.
+    """
+    org_id = user.get("organizationId")
+    if chatQuery.orgId is not None and chatQuery.orgId != org_id:
+        raise ForbiddenException("Cannot query another organization's documents")
+    result = await chat_query_doc(
+        chatQuery.searchTxt, org_id, chatQuery.sessionId, user.get("id"), db,
+        limit=chatQuery.limit or 5, document_id=chatQuery.documentId, min_score=chatQuery.minScore,
+        rerank=chatQuery.rerank, is_admin=user.get("role") == "admin"
+    )
+    return StandardResponse(
+        status="success",
+        message="Data fetched successfully",
+        data=result
+    )
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    """Encode one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post('/stream',status_code=status.HTTP_200_OK)
+async def query_stream(userSearch:SearchBase, db:AsyncDatabase = Depends(get_database)):
+    """
+    Answer a query as Server-Sent Events: a "sources" event with the document IDs,
+    "token" events with the answer as the LLM writes it, and a final "done" event
+    with the confidence and timings (or "error" if the query failed midway).
+    """
+    async def events() -> AsyncIterator[str]:
+        async for event, data in stream_query_doc(
+            userSearch.searchTxt, userSearch.orgId, db,
+            limit=userSearch.limit or 5, document_id=userSearch.documentId, min_score=userSearch.minScore,
+            rerank=userSearch.rerank
+        ):
+            yield _sse(event, data)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get('/cache/stats',response_model=StandardResponse[QueryCacheStats],status_code=status.HTTP_200_OK, dependencies=[Depends(require_admin)])
+async def query_cache_stats():
+    return StandardResponse(
+        status="success",
+        message="Cache stats fetched successfully",
+        data=getQueryCacheStats()
+    )
+
+
+@router.get('/history/{sessionId}',response_model=StandardResponse[ChatHistoryPage],status_code=status.HTTP_200_OK)
+async def chat_history(
+    sessionId: str,
+    limit: Optional[int] = Query(None, ge=1, description="Messages per page, settings.CHAT_HISTORY_PAGE_SIZE by default"),
+    before: Optional[str] = Query(None, description="The before cursor of the previous page"),
+    db: AsyncDatabase = Depends(get_database),
+    user: dict = Depends(get_current_user)
+):
+    """
+    A session's chat history one page at a time, starting from its newest
+    messages. Only the session's user, or an admin of its organization, can read it.
+    """
+    return StandardResponse(
+        status="success",
+        message="Chat history fetched successfully",
+        data=await getChatHistoryPage(
+            sessionId, db, user.get("organizationId"), user.get("id"),
+            is_admin=user.get("role") == "admin", limit=limit, before=before
+        )
+    )
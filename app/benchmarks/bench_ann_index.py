@@ -0,0 +1,71 @@
+"""
+Recall@k and QPS of the IVF index in utils.ann_index against exact search
+over the same vectors, for a range of nprobe settings. The corpus is drawn
+around random topic centres so it has the cluster structure real chunk
+embeddings have.
+
+Run from the app directory:
+    python -m benchmarks.bench_ann_index [vectors] [dim] [nlist]
+"""
+import sys
+import tempfile
+import time
+import numpy as np
+from utils.ann_index import IVFVectorIndex
+from utils.local_vector_store import LocalVectorIndex
+
+
+def _corpus(size: int, dim: int, rng: np.random.Generator) -> np.ndarray:
+    topics = rng.standard_normal((max(1, size // 200), dim), dtype=np.float32)
+    vectors = topics[rng.integers(0, len(topics), size)]
+    return vectors + 0.6 * rng.standard_normal((size, dim), dtype=np.float32)
+
+
+def _fill(index: LocalVectorIndex, vectors: np.ndarray) -> None:
+    for start in range(0, len(vectors), 10000):
+        batch = vectors[start:start + 10000]
+        ids = [f"v{start + i}" for i in range(len(batch))]
+        index.add(ids, batch, [""] * len(batch), [{"orgId": "org"}] * len(batch))
+
+
+def _run(index: LocalVectorIndex, queries: np.ndarray, k: int, **options):
+    start = time.perf_counter()
+    results = [[row for row, _ in index.search(query, k, **options)] for query in queries]
+    return results, len(queries) / (time.perf_counter() - start)
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    dim = int(sys.argv[2]) if len(sys.argv) > 2 else 384
+    nlist = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    k = 10
+    rng = np.random.default_rng(0)
+    vectors = _corpus(size, dim, rng)
+    queries = _corpus(200, dim, rng)
+
+    with tempfile.TemporaryDirectory() as exact_dir, tempfile.TemporaryDirectory() as ivf_dir:
+        exact = LocalVectorIndex(exact_dir, initial_capacity=size)
+        _fill(exact, vectors)
+        truth, exact_qps = _run(exact, queries, k)
+
+        ivf = IVFVectorIndex(ivf_dir, initial_capacity=size, nlist=nlist, min_train_vectors=size + 1)
+        _fill(ivf, vectors)
+        start = time.perf_counter()
+        ivf.train()
+        print(f"{size} vectors, dim={dim}, nlist={ivf.nlist}, trained in {time.perf_counter() - start:.1f}s")
+        print(f"{'index':>12} {'recall@10':>10} {'QPS':>9}")
+        print(f"{'exact':>12} {1.0:>10.3f} {exact_qps:>9.0f}")
+
+        for nprobe in (1, 2, 4, 8, 16, 32, 64):
+            if nprobe > ivf.nlist:
+                break
+            found, qps = _run(ivf, queries, k, nprobe=nprobe)
+            recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(found, truth)])
+            print(f"{f'nprobe={nprobe}':>12} {recall:>10.3f} {qps:>9.0f}")
+
+        exact.close()
+        ivf.close()
+
+
+if __name__ == "__main__":
+    main()
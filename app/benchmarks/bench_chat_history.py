@@ -0,0 +1,115 @@
+"""
+Append and read latency of chat history at 10, 1k and 50k messages per
+session, for the old layout (every message $push-ed into one chatHistory
+document that is read whole) and one chatMessages document per message
+read through the (sessionId, _id) index.
+
+Each session is prefilled to its size, then the script times appending a
+user/assistant turn, reading the last settings.CHAT_HISTORY_MESSAGES
+messages, a token budget's worth of them, and a page deep in the history
+through the history API's before cursor.
+
+Needs a MongoDB server at settings.mongodb_uri; a scratch database is
+created and dropped. Run from the app directory:
+    python -m benchmarks.bench_chat_history [repeats]
+"""
+import asyncio
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, List
+import numpy as np
+from bson import ObjectId
+from pymongo import AsyncMongoClient
+from controllers import query_service
+from core import settings
+from db import ensure_indexes
+from schema import ChatHistoryCreate, ChatMessage
+from benchmarks.fixtures import chat_token_counter
+
+SIZES = (10, 1000, 50000)
+_TEXT = "How do I reset the pressure sensor on the pump after replacing the filter cartridge? " * 2
+
+
+def _message(i: int) -> dict:
+    return {"role": "user" if i % 2 == 0 else "assistant", "content": f"{i} {_TEXT}", "timestamp": None}
+
+
+async def _time(repeats: int, call: Callable[[], Awaitable]) -> str:
+    latencies: List[float] = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        await call()
+        latencies.append(time.perf_counter() - start)
+    return f"{np.median(latencies) * 1000:>8.2f} {np.percentile(latencies, 95) * 1000:>8.2f}"
+
+
+async def _legacy(db, size: int, repeats: int) -> None:
+    session_id = f"legacy-{size}"
+    now = datetime.now(timezone.utc)
+    await db.legacyChatHistory.insert_one({
+        "sessionId": session_id, "userId": "u", "orgId": "o", "isActive": True,
+        "createdAt": now, "updatedAt": now, "messages": [_message(i) for i in range(size)]
+    })
+
+    async def append():
+        await db.legacyChatHistory.find_one_and_update(
+            {"sessionId": session_id},
+            {"$push": {"messages": {"$each": [_message(0), _message(1)]}}, "$set": {"updatedAt": now}},
+            upsert=True, return_document=True
+        )
+
+    async def read():
+        doc = await db.legacyChatHistory.find_one({"sessionId": session_id})
+        return doc["messages"][-settings.CHAT_HISTORY_MESSAGES:]
+
+    print(f"{'array':>9} {size:>7} {await _time(repeats, append)} {await _time(repeats, read)}")
+
+
+async def _per_message(db, size: int, repeats: int) -> None:
+    session_id = f"messages-{size}"
+    for start in range(0, size, 10000):
+        await db.chatMessages.insert_many([
+            {"_id": ObjectId(), "sessionId": session_id, **_message(i)} for i in range(start, min(size, start + 10000))
+        ])
+    await db.chatHistory.insert_one({"sessionId": session_id, "userId": "u", "orgId": "o", "messageCount": size})
+    turn = ChatHistoryCreate(
+        sessionId=session_id, userId="u", orgId="o",
+        messages=[ChatMessage(**_message(0)), ChatMessage(**_message(1))]
+    )
+    # A page deep in the history, the one before its 50th message
+    deep = await db.chatMessages.find_one({"sessionId": session_id}, sort=[("_id", 1)], skip=min(size - 1, 50))
+
+    append = await _time(repeats, lambda: query_service.save_chat_history(turn))
+    read = await _time(repeats, lambda: query_service.get_chat_history(session_id))
+    budget = await _time(repeats, lambda: query_service.get_chat_history(session_id, limit=1000, max_tokens=1000))
+    page = await _time(repeats, lambda: query_service.getChatHistoryPage(
+        session_id, db, "o", "u", before=str(deep["_id"])
+    ))
+    print(f"{'messages':>9} {size:>7} {append} {read} {budget} {page}")
+
+
+async def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    chat_token_counter()
+    client = AsyncMongoClient(settings.mongodb_uri)
+    db = client[f"{settings.DATABASE_NAME}_bench_chat_history"]
+    query_service.get_database = lambda: db
+    try:
+        await client.drop_database(db.name)
+        await ensure_indexes(db)
+        print(f"{repeats} repeats, median and p95 ms; reads take the last {settings.CHAT_HISTORY_MESSAGES} messages")
+        print(
+            f"{'layout':>9} {'size':>7} {'append':>8} {'p95':>8} {'read':>8} {'p95':>8} "
+            f"{'budget':>8} {'p95':>8} {'page':>8} {'p95':>8}"
+        )
+        for size in SIZES:
+            await _legacy(db, size, repeats)
+            await _per_message(db, size, repeats)
+    finally:
+        await client.drop_database(db.name)
+        await client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
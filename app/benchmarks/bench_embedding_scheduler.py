@@ -0,0 +1,148 @@
+"""
+Embedding throughput of utils.embedding_scheduler.EmbeddingScheduler against
+a local stub embedding server that simulates per-request latency and a
+tokens-per-second rate limit answered with 429 + Retry-After.
+
+The baseline embeds fixed batches of texts one after another, the way
+PineconeVectorStore.add_documents did before.
+
+Run from the app directory:
+    python -m benchmarks.bench_embedding_scheduler [texts] [server_tokens_per_second]
+"""
+import json
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+from benchmarks.fixtures import _WORDS
+from utils.embedding_scheduler import EmbeddingScheduler
+
+
+def _count_tokens(text: str) -> int:
+    # Close enough to tiktoken for synthetic English text, and keeps the stub self-contained
+    return len(text.split())
+
+
+class _StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, tokens_per_second: float, base_latency: float, per_token_latency: float):
+        super().__init__(address, _StubHandler)
+        self.tokens_per_second = tokens_per_second
+        self.base_latency = base_latency
+        self.per_token_latency = per_token_latency
+        self.lock = threading.Lock()
+        self.window_start = time.monotonic()
+        self.window_tokens = 0
+        self.requests = 0
+        self.rejected = 0
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        texts = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["input"]
+        tokens = sum(_count_tokens(text) for text in texts)
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            now = time.monotonic()
+            if now - server.window_start >= 1.0:
+                server.window_start, server.window_tokens = now, 0
+            if server.window_tokens + tokens > server.tokens_per_second:
+                server.rejected += 1
+                retry_after = 1.0 - (now - server.window_start)
+                self.send_response(429)
+                self.send_header("Retry-After", f"{retry_after:.3f}")
+                self.end_headers()
+                return
+            server.window_tokens += tokens
+
+        time.sleep(server.base_latency + server.per_token_latency * tokens)
+        body = json.dumps({"data": [{"embedding": [float(len(text)), 1.0]} for text in texts]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StubHTTPEmbeddings:
+    """Minimal embeddings client for the stub server. HTTP errors keep their status code."""
+
+    def __init__(self, url: str):
+        self.url = url
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        request = urllib.request.Request(
+            self.url, data=json.dumps({"input": texts}).encode(), headers={"Content-Type": "application/json"}
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                return [item["embedding"] for item in json.loads(response.read())["data"]]
+        except urllib.error.HTTPError as e:
+            e.status_code = e.code
+            e.response = e
+            raise
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def _corpus(count: int) -> List[str]:
+    return [" ".join(_WORDS[(i + j) % len(_WORDS)] for j in range(150)) for i in range(count)]
+
+
+def _sequential(backend: StubHTTPEmbeddings, texts: List[str], batch_size: int = 32) -> None:
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start:start + batch_size]
+        while True:
+            try:
+                backend.embed_documents(batch)
+                break
+            except urllib.error.HTTPError as e:
+                if e.code != 429:
+                    raise
+                time.sleep(float(e.headers.get("Retry-After", 1.0)))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    tokens_per_second = float(sys.argv[2]) if len(sys.argv) > 2 else 120000
+    texts = _corpus(count)
+    total_tokens = sum(_count_tokens(text) for text in texts)
+
+    server = _StubServer(("127.0.0.1", 0), tokens_per_second, base_latency=0.15, per_token_latency=0.00002)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    backend = StubHTTPEmbeddings(f"http://127.0.0.1:{server.server_address[1]}/embeddings")
+    print(f"Corpus: {count} texts, {total_tokens} tokens; server limit {tokens_per_second:.0f} tokens/s")
+    print(f"{'mode':>22} {'seconds':>8} {'tokens/s':>9} {'requests':>9} {'429s':>5} {'batch p50':>10}")
+
+    start = time.perf_counter()
+    _sequential(backend, texts)
+    elapsed = time.perf_counter() - start
+    print(f"{'sequential x32':>22} {elapsed:>8.2f} {total_tokens / elapsed:>9.0f} {server.requests:>9} {server.rejected:>5} {'-':>10}")
+
+    for concurrency in (2, 4, 8):
+        server.requests = server.rejected = 0
+        scheduler = EmbeddingScheduler(
+            backend, max_batch_tokens=8000, max_concurrency=concurrency, backoff=0.2, token_counter=_count_tokens
+        )
+        start = time.perf_counter()
+        vectors = scheduler.embed_documents(texts)
+        elapsed = time.perf_counter() - start
+        assert len(vectors) == count and vectors[0] == [float(len(texts[0])), 1.0]
+        stats = scheduler.stats()
+        print(f"{f'scheduler c={concurrency}':>22} {elapsed:>8.2f} {total_tokens / elapsed:>9.0f} "
+              f"{server.requests:>9} {server.rejected:>5} {stats['latency_p50']:>9.3f}s")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
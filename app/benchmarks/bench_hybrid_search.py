@@ -0,0 +1,154 @@
+"""
+Retrieval quality and latency of vector, keyword (BM25) and hybrid search
+through query_service._retrieve on a small labelled fixture set.
+
+Every chunk of the synthetic manuals describes one fault with three topic
+words, an error code ("E-1042") and a part number ("PN-58213"), among
+filler text. Three kinds of labelled questions target one chunk each:
+
+    code        "what does error E-1042 mean"
+    paraphrase  the topic words swapped for synonyms
+    topic       the topic words themselves
+
+The stand-in embedding knows the synonyms but treats codes as noise, the
+way embedding models blur rare identifiers, so vector search should win
+paraphrases, BM25 codes, and hybrid both. Reported per kind: recall@k (the
+labelled chunk is in the top k) and MRR, then retrieval latency.
+
+Run from the app directory:
+    python -m benchmarks.bench_hybrid_search [documents] [chunks per document]
+"""
+import hashlib
+import random
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+import numpy as np
+from controllers import query_service
+from core import settings
+from utils.lexical_index import LexicalIndex
+from utils.local_vector_store import LocalVectorIndex, LocalVectorStore
+from benchmarks.fixtures import _WORDS
+
+K = 5
+TOPIC_WORDS = [
+    "overheating", "leak", "vibration", "corrosion", "blockage", "noise", "drift", "stall", "surge", "wear",
+    "misalignment", "cavitation", "backflow", "freezing", "short", "overload", "jam", "crack", "rust", "spark"
+]
+SYNONYMS = {
+    "overheating": "hot", "leak": "drip", "vibration": "shaking", "corrosion": "oxidation", "blockage": "clog",
+    "noise": "rattle", "drift": "deviation", "stall": "halt", "surge": "spike", "wear": "abrasion",
+    "misalignment": "offset", "cavitation": "bubbles", "backflow": "reversal", "freezing": "icing",
+    "short": "shorted", "overload": "overstrain", "jam": "stuck", "crack": "fracture", "rust": "tarnish",
+    "spark": "arcing"
+}
+_CANONICAL = {synonym: word for word, synonym in SYNONYMS.items()}
+_CODE = re.compile(r"^[a-z]+-\d+$")
+
+
+class StandInEmbeddings:
+    """Bag of words that maps synonyms onto one word and ignores codes."""
+    dim = 512
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in re.findall(r"[a-z0-9-]+", text.lower()):
+            if _CODE.match(word):
+                continue
+            word = _CANONICAL.get(word, word)
+            vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % self.dim] += 1.0
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def labelled_fixture(documents: int, chunks: int, rng: random.Random):
+    """Chunks (id, text, metadata) and labelled questions (kind, question, relevant chunk id)."""
+    rows, questions = [], []
+    codes = rng.sample(range(1000, 10000), documents * chunks)
+    for d in range(documents):
+        for c in range(chunks):
+            chunk_id = f"doc{d}#{c}"
+            topic = rng.sample(TOPIC_WORDS, 3)
+            code, part = f"E-{codes[d * chunks + c]}", f"PN-{rng.randrange(10000, 99999)}"
+            filler = " ".join(rng.choice(_WORDS) for _ in range(120))
+            text = (
+                f"{filler[:300]} Fault: {' '.join(topic)}. Error code {code} is shown; "
+                f"replace part {part} if it persists. {filler[300:]}"
+            )
+            rows.append((chunk_id, text, {"orgId": "org", "documentId": f"doc{d}"}))
+            if rng.random() < 0.1:
+                questions.append(("code", f"what does error {code} mean", chunk_id))
+                questions.append(("code", f"where do I order {part}", chunk_id))
+                questions.append(("paraphrase", f"how to fix {' '.join(SYNONYMS[w] for w in topic)}", chunk_id))
+                questions.append(("topic", f"how to fix {' '.join(topic)}", chunk_id))
+    return rows, questions
+
+
+def _evaluate(label: str, questions, hybrid: bool, keyword_only_index=None) -> List[float]:
+    settings.HYBRID_SEARCH_ENABLED = hybrid
+    latencies, results = [], {}
+    for kind, question, relevant in questions:
+        start = time.perf_counter()
+        if keyword_only_index is not None:
+            hits = keyword_only_index.search(question, K)
+        else:
+            hits = query_service._retrieve(question, "org", K)
+        latencies.append(time.perf_counter() - start)
+        ids = [doc.id for doc, _ in hits]
+        rank = ids.index(relevant) + 1 if relevant in ids else None
+        results.setdefault(kind, []).append(rank)
+    cells = []
+    for kind in ("code", "paraphrase", "topic"):
+        ranks = results[kind]
+        recall = sum(rank is not None for rank in ranks) / len(ranks)
+        mrr = sum(1 / rank for rank in ranks if rank) / len(ranks)
+        cells.append(f"{recall:>10.2f} {mrr:>6.2f}")
+    print(f"{label:>8} " + " ".join(cells) + f" {np.median(latencies) * 1000:>9.2f} {np.percentile(latencies, 95) * 1000:>8.2f}")
+    return latencies
+
+
+def main():
+    documents = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    chunks = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    rng = random.Random(0)
+    rows, questions = labelled_fixture(documents, chunks, rng)
+    settings.RETRIEVAL_CACHE_ENABLED = False
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = LocalVectorIndex(Path(tmp) / "vectors", initial_capacity=len(rows))
+        store = LocalVectorStore(index, StandInEmbeddings())
+        lexical = LexicalIndex(Path(tmp) / "lexical" / "org.sqlite3")
+        ids, texts, metadatas = (list(column) for column in zip(*rows))
+        store.add_texts(texts, metadatas, ids=ids)
+        start = time.perf_counter()
+        lexical.add(ids, texts, metadatas)
+        build = time.perf_counter() - start
+        query_service.get_vectorstore = lambda embedding=None, namespace=None: store
+        query_service.fetch_vectors = lambda ids, namespace=None: index.fetch(ids)
+        query_service.get_lexical_index = lambda org_id: lexical
+
+        counts = {kind: sum(q[0] == kind for q in questions) for kind in ("code", "paraphrase", "topic")}
+        print(f"{len(rows)} chunks in {documents} documents, BM25 index built in {build * 1000:.0f} ms")
+        print(f"{len(questions)} labelled questions {counts}, k={K}, {settings.HYBRID_CANDIDATES} candidates per retriever")
+        print(f"{'':>8} {'code R@5':>10} {'MRR':>6} {'para R@5':>10} {'MRR':>6} {'topic R@5':>10} {'MRR':>6} {'p50 ms':>9} {'p95 ms':>8}")
+        _evaluate("vector", questions, hybrid=False)
+        _evaluate("bm25", questions, hybrid=False, keyword_only_index=lexical)
+        _evaluate("hybrid", questions, hybrid=True)
+
+        # Deleting a document must take its chunks out of keyword results
+        removed = lexical.delete("doc0")
+        assert removed == chunks and all(not doc.id.startswith("doc0#") for doc, _ in lexical.search("error code", 1000))
+        lexical.close()
+        print(f"OK: deleting doc0 removed its {removed} chunks from the keyword index")
+
+
+if __name__ == "__main__":
+    main()
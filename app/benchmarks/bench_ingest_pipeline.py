@@ -0,0 +1,89 @@
+"""
+End-to-end time, time to first vector and peak traced memory of the
+pipelined rag1.process_all_pdfs against the previous load-all, split-all,
+store-all approach. The vector store is a stub that sleeps per upsert batch
+to stand in for embedding and Pinecone round trips.
+
+Run from the app directory:
+    python -m benchmarks.bench_ingest_pipeline [files] [pages_per_file] [seconds_per_32_chunks]
+"""
+import sys
+import time
+import tracemalloc
+from benchmarks.fixtures import write_synthetic_corpus
+from rag1 import main as rag_main
+from services.pdf_processor import parse_pdfs, shutdown_parse_executor
+
+
+class SlowVectorStore:
+    """Stands in for the vector store, sleeping per batch of 32 like embed + upsert round trips."""
+
+    def __init__(self, seconds_per_batch: float):
+        self.seconds_per_batch = seconds_per_batch
+        self.started = 0.0
+        self.first_vector_at = None
+        self.stored = 0
+
+    def add_documents(self, documents, ids=None, **kwargs):
+        for start in range(0, len(documents), 32):
+            time.sleep(self.seconds_per_batch)
+            if self.first_vector_at is None:
+                self.first_vector_at = time.perf_counter() - self.started
+        self.stored += len(documents)
+        return ids
+
+
+def _stage(files: int, pages: int) -> tuple:
+    staging_dir = rag_main.create_staging_dir()
+    paths = write_synthetic_corpus(staging_dir, files, pages)
+    mappings = {path.rsplit("/", 1)[-1]: f"doc{i}" for i, path in enumerate(paths)}
+    return staging_dir, paths, mappings
+
+
+def _batch_ingest(files: int, pages: int) -> int:
+    """The pre-pipeline flow: every step finishes completely before the next one starts."""
+    staging_dir, paths, mappings = _stage(files, pages)
+    try:
+        docs = parse_pdfs(paths, mappings)
+        chunks = rag_main._create_text_splitter().split_documents(docs)
+        chunks = rag_main._add_organization_metadata(chunks, "org")
+        rag_main._store_chunks_in_vectorstore(chunks)
+        return len(chunks)
+    finally:
+        rag_main._cleanup_processed_files(staging_dir)
+
+
+def _pipelined_ingest(files: int, pages: int) -> int:
+    staging_dir, _, mappings = _stage(files, pages)
+    return rag_main.process_all_pdfs("org", mappings, staging_dir)["chunks_processed"]
+
+
+def _measure(name: str, ingest, files: int, pages: int, seconds_per_batch: float) -> None:
+    store = SlowVectorStore(seconds_per_batch)
+    rag_main.get_vectorstore = lambda embedding=None, namespace=None: store
+    tracemalloc.start()
+    store.started = time.perf_counter()
+    chunks = ingest(files, pages)
+    elapsed = time.perf_counter() - store.started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert store.stored == chunks
+    print(f"{name:>10} {elapsed:>9.2f} {store.first_vector_at or 0:>13.2f} {peak / 2 ** 20:>13.1f} {chunks:>8}")
+
+
+def main():
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    pages = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    seconds_per_batch = float(sys.argv[3]) if len(sys.argv) > 3 else 0.05
+
+    # The stub store never embeds, so no embedding backend is needed
+    rag_main.get_embedding_model = lambda: None
+    print(f"Corpus: {files} files x {pages} pages, {seconds_per_batch}s per 32-chunk upsert")
+    print(f"{'mode':>10} {'seconds':>9} {'first vector':>13} {'peak MB':>13} {'chunks':>8}")
+    _measure("batch", _batch_ingest, files, pages, seconds_per_batch)
+    _measure("pipelined", _pipelined_ingest, files, pages, seconds_per_batch)
+    shutdown_parse_executor()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Per-request overhead of building the chat model client and prompt on every
+query, against the process-wide client of services.llm_client.
+
+A local stub chat-completions server answers instantly over HTTP/1.1 with
+keep-alive, but holds every new connection for a set time before serving
+it, as the TCP and TLS handshakes with the real API take. The same prompt
+is sent through three set-ups:
+
+    per request         ChatOpenAI and ChatPromptTemplate built per query (the old code)
+    per request+timeout the same with an httpx.Timeout, which langchain-openai
+                        cannot share a cached HTTP client for
+    pooled              llm_clients.chat() and a precompiled template
+
+and the script reports latency, client construction time, the number of
+connections the server saw and failed requests (retries are off, so a
+stalled connect shows up as an error instead of a slow request).
+
+Run from the app directory:
+    python -m benchmarks.bench_llm_client [requests] [handshake_ms]
+"""
+import asyncio
+import json
+import sys
+import threading
+import time
+from typing import List
+import httpx
+import numpy as np
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_openai import ChatOpenAI
+from core import settings
+from services.llm_client import LLMClientRegistry
+
+_MESSAGES = [
+    ('system', 'You are a helpful assistant.'),
+    ('human', 'Given the following context, please answer the question from given context only. If context is insufficient then say I do not know \n\nContext:\n{context}\n\nQuestion: {question}')
+]
+_INPUT = {"context": "The pump must be primed before start-up. " * 20, "question": "What must be done before start-up?"}
+_COMPLETION = json.dumps({
+    "id": "chatcmpl-stub", "object": "chat.completion", "created": 0, "model": "gpt-4o-mini",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "Prime the pump."}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 200, "completion_tokens": 4, "total_tokens": 204}
+}).encode()
+
+
+class StubCompletionsServer:
+    """Keep-alive chat-completions stub on its own thread, counting the connections it accepts."""
+
+    def __init__(self, handshake: float):
+        self.handshake = handshake
+        self.connections = 0
+        self.url = ""
+        self._ready = threading.Event()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        # A new connection costs the handshake round trips before the first request is served
+        await asyncio.sleep(self.handshake)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.decode().split("\r\n"):
+                    if line.lower().startswith("content-length:"):
+                        length = int(line.split(":", 1)[1])
+                await reader.readexactly(length)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nConnection: keep-alive\r\n"
+                    + f"Content-Length: {len(_COMPLETION)}\r\n\r\n".encode() + _COMPLETION
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+
+    async def _serve(self) -> None:
+        server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.url = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/v1"
+        self._ready.set()
+        async with server:
+            await server.serve_forever()
+
+    def start(self) -> "StubCompletionsServer":
+        threading.Thread(target=lambda: asyncio.run(self._serve()), daemon=True).start()
+        self._ready.wait()
+        return self
+
+
+async def _run(label: str, server: StubCompletionsServer, requests: int, make) -> None:
+    """Send requests sequential queries, make() returning the (chat model, prompt template) of each."""
+    connections = server.connections
+    latencies: List[float] = []
+    setup: List[float] = []
+    errors = 0
+    for _ in range(requests):
+        start = time.perf_counter()
+        chat, template = make()
+        built = time.perf_counter()
+        try:
+            await chat.ainvoke(template.invoke(_INPUT))
+        except Exception:
+            errors += 1
+            continue
+        setup.append(built - start)
+        latencies.append(time.perf_counter() - start)
+    print(
+        f"{label:>20} {np.mean(latencies) * 1000:>9.2f} {np.percentile(latencies, 95) * 1000:>8.2f} "
+        f"{np.mean(setup) * 1000:>9.2f} {server.connections - connections:>12} {errors:>7}"
+    )
+
+
+async def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    handshake_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 40
+    server = StubCompletionsServer(handshake_ms / 1000).start()
+    settings.OPENAI_BASE_URL = server.url
+    settings.CHAT_MAX_RETRIES = 0
+    registry = LLMClientRegistry()
+    template = ChatPromptTemplate.from_messages(_MESSAGES)
+
+    def per_request():
+        chat = ChatOpenAI(model_name=settings.CHAT_MODEL, api_key=settings.OPENAI_API_KEY, base_url=server.url, max_retries=0)
+        return chat, ChatPromptTemplate.from_messages(_MESSAGES)
+
+    def per_request_timeout():
+        chat = ChatOpenAI(
+            model_name=settings.CHAT_MODEL, api_key=settings.OPENAI_API_KEY, base_url=server.url,
+            timeout=httpx.Timeout(settings.CHAT_TIMEOUT, connect=settings.CHAT_CONNECT_TIMEOUT), max_retries=0
+        )
+        return chat, ChatPromptTemplate.from_messages(_MESSAGES)
+
+    print(f"{requests} sequential requests, {handshake_ms:.0f} ms per new connection, stub answers instantly")
+    print(f"{'':>20} {'mean ms':>9} {'p95 ms':>8} {'setup ms':>9} {'connections':>12} {'errors':>7}")
+    await _run("per request", server, requests, per_request)
+    await _run("per request+timeout", server, requests, per_request_timeout)
+    await _run("pooled", server, requests, lambda: (registry.chat(), template))
+    await registry.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,64 @@
+"""
+p50/p99 query latency of utils.local_vector_store.LocalVectorIndex at 10k,
+100k and 1M vectors, unfiltered and filtered on orgId.
+
+1M vectors of dimension 1536 take about 6 GB on disk; pass a smaller
+dimension to try the larger sizes on a small machine.
+
+Run from the app directory:
+    python -m benchmarks.bench_local_vector_store [dim] [sizes...]
+"""
+import sys
+import tempfile
+import time
+import numpy as np
+from utils.local_vector_store import LocalVectorIndex
+
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    return samples[len(samples) // 2] * 1000, samples[int(len(samples) * 0.99)] * 1000
+
+
+def _fill(index: LocalVectorIndex, size: int, dim: int, orgs: int, rng: np.random.Generator) -> None:
+    batch = 10000
+    for start in range(0, size, batch):
+        count = min(batch, size - start)
+        vectors = rng.standard_normal((count, dim), dtype=np.float32)
+        ids = [f"v{start + i}" for i in range(count)]
+        metadatas = [{"orgId": f"org{(start + i) % orgs}", "documentId": f"doc{(start + i) // 50}"} for i in range(count)]
+        index.add(ids, vectors, [""] * count, metadatas)
+
+
+def _query(index: LocalVectorIndex, dim: int, queries: int, rng: np.random.Generator, filter=None):
+    timings = []
+    for _ in range(queries):
+        vector = rng.standard_normal(dim, dtype=np.float32)
+        start = time.perf_counter()
+        index.search(vector, 5, filter)
+        timings.append(time.perf_counter() - start)
+    return _percentiles(timings)
+
+
+def main():
+    dim = int(sys.argv[1]) if len(sys.argv) > 1 else 1536
+    sizes = [int(arg) for arg in sys.argv[2:]] or [10000, 100000, 1000000]
+    orgs = 20
+    rng = np.random.default_rng(0)
+    print(f"dim={dim}, k=5, {orgs} organizations")
+    print(f"{'vectors':>9} {'p50 ms':>8} {'p99 ms':>8} {'org p50 ms':>11} {'org p99 ms':>11}")
+
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            index = LocalVectorIndex(tmp, initial_capacity=size)
+            _fill(index, size, dim, orgs, rng)
+            queries = 200 if size <= 100000 else 50
+            _query(index, dim, 5, rng)  # warm the page cache
+            p50, p99 = _query(index, dim, queries, rng)
+            org_p50, org_p99 = _query(index, dim, queries, rng, {"orgId": "org3"})
+            print(f"{size:>9} {p50:>8.2f} {p99:>8.2f} {org_p50:>11.2f} {org_p99:>11.2f}")
+            index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Query latency of a small organization when every organization shares one
+index and is filtered on orgId, against each organization having its own
+shard, as the number of organizations grows. One large tenant holds half of
+the vectors, the rest are spread evenly over the others.
+
+Run from the app directory:
+    python -m benchmarks.bench_org_partitions [vectors] [dim] [tenant counts...]
+"""
+import sys
+import tempfile
+import time
+import numpy as np
+from utils.local_vector_store import LocalVectorBackend
+
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    return samples[len(samples) // 2] * 1000, samples[int(len(samples) * 0.99)] * 1000
+
+
+def _tenant_of(size: int, tenants: int, rng: np.random.Generator) -> np.ndarray:
+    """Tenant 0 is the noisy one with half of the vectors."""
+    owners = rng.integers(1, max(tenants, 2), size)
+    owners[: size // 2] = 0
+    return owners if tenants > 1 else np.zeros(size, dtype=np.int64)
+
+
+def _fill(backend: LocalVectorBackend, owners: np.ndarray, dim: int, partitioned: bool, rng: np.random.Generator) -> None:
+    for start in range(0, len(owners), 10000):
+        batch = owners[start:start + 10000]
+        vectors = rng.standard_normal((len(batch), dim), dtype=np.float32)
+        for tenant in np.unique(batch):
+            rows = np.flatnonzero(batch == tenant)
+            ids = [f"v{start + row}" for row in rows]
+            metadatas = [{"orgId": f"org{tenant}"}] * len(rows)
+            index = backend.shard(f"org-org{tenant}" if partitioned else None)
+            index.add(ids, vectors[rows], [""] * len(rows), metadatas)
+
+
+def _query(backend: LocalVectorBackend, tenant: int, dim: int, partitioned: bool, queries: int, rng: np.random.Generator):
+    index = backend.shard(f"org-org{tenant}" if partitioned else None)
+    filter = None if partitioned else {"orgId": f"org{tenant}"}
+    timings = []
+    for _ in range(queries):
+        vector = rng.standard_normal(dim, dtype=np.float32)
+        start = time.perf_counter()
+        index.search(vector, 5, filter)
+        timings.append(time.perf_counter() - start)
+    return _percentiles(timings)
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    dim = int(sys.argv[2]) if len(sys.argv) > 2 else 384
+    tenant_counts = [int(arg) for arg in sys.argv[3:]] or [2, 10, 50, 200]
+    rng = np.random.default_rng(0)
+    print(f"{size} vectors, dim={dim}, k=5, latency of a small tenant's queries")
+    print(f"{'tenants':>8} {'tenant vectors':>15} {'filtered p50':>13} {'p99':>7} {'partitioned p50':>16} {'p99':>7}")
+
+    for tenants in tenant_counts:
+        owners = _tenant_of(size, tenants, rng)
+        small = 1 if tenants > 1 else 0
+        results = []
+        for partitioned in (False, True):
+            with tempfile.TemporaryDirectory() as tmp:
+                backend = LocalVectorBackend(tmp, embedding_factory=lambda: None)
+                _fill(backend, owners, dim, partitioned, rng)
+                _query(backend, small, dim, partitioned, 5, rng)  # warm the page cache
+                results.append(_query(backend, small, dim, partitioned, 200, rng))
+                backend.refresh()
+        (filtered_p50, filtered_p99), (partitioned_p50, partitioned_p99) = results
+        tenant_vectors = int((owners == small).sum())
+        print(
+            f"{tenants:>8} {tenant_vectors:>15} {filtered_p50:>10.2f} ms {filtered_p99:>7.2f} "
+            f"{partitioned_p50:>13.2f} ms {partitioned_p99:>7.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Parse throughput of services.pdf_processor.parse_pdfs at 1, 2, 4 and N workers.
+
+Run from the app directory:
+    python -m benchmarks.bench_pdf_parse [files] [pages_per_file]
+"""
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from benchmarks.fixtures import write_synthetic_corpus
+from core import settings
+from services.pdf_processor import parse_pdfs, shutdown_parse_executor
+
+
+def main():
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    pages = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    cpu_count = os.cpu_count() or 1
+    worker_counts = sorted({1, 2, 4, cpu_count})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = write_synthetic_corpus(Path(tmp), files, pages)
+        mappings = {os.path.basename(path): f"doc{i}" for i, path in enumerate(paths)}
+        print(f"Corpus: {files} files x {pages} pages")
+        print(f"{'workers':>8} {'seconds':>9} {'pages/s':>9} {'speedup':>8}")
+
+        baseline = None
+        for workers in worker_counts:
+            # The shared pool is sized from settings once, so each size gets a fresh pool
+            settings.PDF_PARSE_WORKERS = workers
+            if workers > 1:
+                # Spawned workers import the app once per pool, which a long-lived server pays only at startup
+                parse_pdfs(paths, mappings)
+            start = time.perf_counter()
+            docs = parse_pdfs(paths, mappings)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            assert len(docs) == files * pages
+            print(f"{workers:>8} {elapsed:>9.2f} {len(docs) / elapsed:>9.0f} {baseline / elapsed:>7.2f}x")
+            shutdown_parse_executor()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Prompt size and latency of the query path at different k (SearchBase.limit),
+with and without a minimum score and a document scope.
+
+Chunks of about 1000 characters are stored in a local vector index with a
+bag-of-words stand-in for the embedding model, so similarity scores behave
+like real ones: chunks sharing the query's words score higher. Retrieval is
+timed through query_service._retrieve; LLM time is modelled from the prompt
+size with a prefill cost per prompt token plus a fixed generation time.
+
+Run from the app directory:
+    python -m benchmarks.bench_query_k [chunks] [documents]
+"""
+import hashlib
+import random
+import sys
+import tempfile
+import time
+from typing import List
+import numpy as np
+from controllers import query_service
+from core import settings
+from utils.local_vector_store import LocalVectorIndex, LocalVectorStore
+from benchmarks.fixtures import _WORDS, chat_token_counter
+
+PREFILL_MS_PER_TOKEN = 0.15
+GENERATION_MS = 800
+
+
+class BagOfWordsEmbeddings:
+    dim = 384
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in text.lower().split():
+            vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % self.dim] += 1.0
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def _run(label: str, store, count, k: int, queries: List[str], **options) -> None:
+    tokens, retrieval, chunks = [], [], []
+    for query in queries:
+        start = time.perf_counter()
+        scored = query_service._retrieve(query, "org", k, **options)
+        retrieval.append(time.perf_counter() - start)
+        prompt, _, _ = query_service._build_prompt(query, scored)
+        tokens.append(count(prompt.to_string()))
+        chunks.append(len(scored))
+    mean_tokens = np.mean(tokens)
+    llm_ms = PREFILL_MS_PER_TOKEN * mean_tokens + GENERATION_MS
+    print(
+        f"{label:>24} {k:>3} {np.mean(chunks):>7.1f} {mean_tokens:>14.0f} "
+        f"{np.median(retrieval) * 1000:>13.2f} {llm_ms:>12.0f}"
+    )
+
+
+def main():
+    chunk_count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    documents = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    rng = random.Random(0)
+    count, counter_name = chat_token_counter()
+    settings.RETRIEVAL_CACHE_ENABLED = settings.HYBRID_SEARCH_ENABLED = False
+
+    with tempfile.TemporaryDirectory() as tmp:
+        embeddings = BagOfWordsEmbeddings()
+        store = LocalVectorStore(LocalVectorIndex(tmp, initial_capacity=chunk_count), embeddings)
+        for start in range(0, chunk_count, 2000):
+            texts = [" ".join(rng.choice(_WORDS) for _ in range(150)) for _ in range(min(2000, chunk_count - start))]
+            metadatas = [{"orgId": "org", "documentId": f"doc{(start + i) % documents}"} for i in range(len(texts))]
+            store.add_texts(texts, metadatas, ids=[f"c{start + i}" for i in range(len(texts))])
+        query_service.get_vectorstore = lambda embedding=None, namespace=None: store
+
+        queries = [" ".join(rng.choice(_WORDS) for _ in range(6)) for _ in range(50)]
+        print(f"{chunk_count} chunks in {documents} documents, tokens counted with {counter_name}")
+        print(f"LLM time modelled as {PREFILL_MS_PER_TOKEN} ms per prompt token + {GENERATION_MS} ms")
+        print(f"{'retrieval':>24} {'k':>3} {'chunks':>7} {'prompt tokens':>14} {'retrieval ms':>13} {'LLM ms':>12}")
+        for k in (1, 3, 5, 10, 20):
+            _run("all documents", store, count, k, queries)
+        for k in (5, 20):
+            _run("minScore=0.6", store, count, k, queries, min_score=0.6)
+        for k in (5, 20):
+            _run("documentId=doc7", store, count, k, queries, document_id="doc7")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Answer-relevant recall at small k with and without reranking, and the
+per-stage latency of query_doc.
+
+Uses the labelled fixture of bench_hybrid_search, with a revised copy of
+every other manual so near-duplicate chunks compete for the top k (either
+copy of the labelled chunk counts as a hit). For each reranker and k the
+script reports recall@k over all questions, how many of the top k are
+duplicates of a better ranked chunk, and the mean retrieval and rerank
+times reported by QueryResponse.timings (LLM stubbed out).
+
+Run from the app directory:
+    python -m benchmarks.bench_reranker [documents] [chunks per document]
+"""
+import asyncio
+import random
+import sys
+import tempfile
+from pathlib import Path
+import numpy as np
+from controllers import query_service
+from core import settings
+from services import reranker
+from utils.lexical_index import LexicalIndex
+from utils.local_vector_store import LocalVectorIndex, LocalVectorStore
+from benchmarks.bench_hybrid_search import StandInEmbeddings, labelled_fixture
+from benchmarks.fixtures import chat_token_counter
+from benchmarks.load_query_path import StubChatModel
+
+
+async def _evaluate(name: str, k: int, questions, texts) -> None:
+    settings.RERANKER = name
+    recalls, duplicates, timings = [], [], []
+    for _, question, relevant in questions:
+        chunks = await query_service._retrieve_ranked(question, "org", k, None, 0.0, reranker.get_reranker())
+        ids = [doc.id for doc, _ in chunks[0]]
+        seen = [texts[chunk_id] for chunk_id in ids]
+        recalls.append(texts[relevant] in seen)
+        duplicates.append(len(seen) - len(set(seen)))
+    for _, question, _ in questions[:50]:
+        response = await query_service.query_doc(question, "org", None, limit=k)
+        timings.append(response.timings)
+    print(
+        f"{name:>14} {k:>3} {np.mean(recalls):>9.2f} {np.mean(duplicates):>11.2f} "
+        f"{np.mean([t.retrieval_ms for t in timings]):>13.2f} {np.mean([t.rerank_ms for t in timings]):>10.2f} "
+        f"{np.mean([t.prompt_ms for t in timings]):>10.2f} {np.mean([t.llm_ms for t in timings]):>8.2f}"
+    )
+
+
+async def main():
+    documents = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    chunks = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    rows, questions = labelled_fixture(documents, chunks, random.Random(0))
+    # A revision of every other manual repeats its chunks under new IDs
+    rows += [
+        (chunk_id.replace("#", "-rev#"), text, {**metadata, "documentId": metadata["documentId"] + "-rev"})
+        for chunk_id, text, metadata in rows if int(metadata["documentId"][3:]) % 2 == 0
+    ]
+    texts = {chunk_id: text for chunk_id, text, _ in rows}
+    chat_token_counter()
+    StubChatModel.latency = 0.0
+    query_service.get_chat_model = StubChatModel
+    settings.ANSWER_CACHE_ENABLED = settings.RETRIEVAL_CACHE_ENABLED = False
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = LocalVectorIndex(Path(tmp) / "vectors", initial_capacity=len(rows))
+        store = LocalVectorStore(index, StandInEmbeddings())
+        lexical = LexicalIndex(Path(tmp) / "lexical" / "org.sqlite3")
+        ids, chunk_texts, metadatas = (list(column) for column in zip(*rows))
+        store.add_texts(chunk_texts, metadatas, ids=ids)
+        lexical.add(ids, chunk_texts, metadatas)
+        fetch = lambda ids, namespace=None: index.fetch(ids)
+        query_service.get_vectorstore = lambda embedding=None, namespace=None: store
+        query_service.fetch_vectors = reranker.fetch_vectors = fetch
+        query_service.get_lexical_index = lambda org_id: lexical
+
+        print(f"{len(rows)} chunks, {len(questions)} labelled questions, {settings.RERANK_CANDIDATES} candidates reranked")
+        print(
+            f"{'reranker':>14} {'k':>3} {'recall@k':>9} {'duplicates':>11} "
+            f"{'retrieval ms':>13} {'rerank ms':>10} {'prompt ms':>10} {'LLM ms':>8}"
+        )
+        for name in ("none", "lexical", "mmr", "cross-encoder"):
+            for k in (2, 3, 5):
+                await _evaluate(name, k, questions, texts)
+        lexical.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,73 @@
+"""
+Peak RSS of services.upload_stream.stream_upload_to_disk as the upload grows,
+next to the previous read-everything-then-write approach. Each measurement
+runs in a fresh process so peak RSS is not carried over between sizes.
+
+Run from the app directory:
+    python -m benchmarks.bench_upload_memory [sizes_in_mb...]
+"""
+import asyncio
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+from services.upload_stream import stream_upload_to_disk
+
+_BLOCK = b"%PDF-1.4\n" + os.urandom(64 * 1024 - 9)
+
+
+class SyntheticUpload:
+    """Async reader that produces `size` bytes without ever holding them all in memory."""
+
+    def __init__(self, size: int):
+        self.remaining = size
+
+    async def read(self, size: int = -1) -> bytes:
+        if size < 0:
+            size = self.remaining
+        size = min(size, self.remaining)
+        self.remaining -= size
+        blocks, tail = divmod(size, len(_BLOCK))
+        return _BLOCK * blocks + _BLOCK[:tail]
+
+
+async def _read_all(upload: SyntheticUpload, path: str) -> None:
+    content = await upload.read()
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+def _child(mode: str, size: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "upload.pdf")
+        upload = SyntheticUpload(size)
+        if mode == "stream":
+            asyncio.run(stream_upload_to_disk(upload, path, max_bytes=size))
+        else:
+            asyncio.run(_read_all(upload, path))
+    # ru_maxrss is reported in kilobytes on Linux
+    print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+def _measure(mode: str, size: int) -> float:
+    out = subprocess.check_output(
+        [sys.executable, "-m", "benchmarks.bench_upload_memory", "--child", mode, str(size)]
+    )
+    return int(out.decode().strip().splitlines()[-1]) / 1024
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        _child(sys.argv[2], int(sys.argv[3]))
+        return
+
+    sizes_mb = [int(arg) for arg in sys.argv[1:]] or [10, 50, 100, 200]
+    print(f"{'file MB':>8} {'stream RSS MB':>14} {'read-all RSS MB':>16}")
+    for size_mb in sizes_mb:
+        size = size_mb * 1024 * 1024
+        print(f"{size_mb:>8} {_measure('stream', size):>14.1f} {_measure('read-all', size):>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Pinecone control-plane calls per 1,000 queries: opening the index on every
+call, as get_vectorstore did before, against the shared VectorStoreClient.
+Uses a fake Pinecone client that counts calls instead of going to the network.
+
+Run from the app directory:
+    python -m benchmarks.bench_vectorstore_client [queries]
+"""
+import sys
+import time
+from collections import Counter
+from utils import pinecone_store
+
+
+class CountingPinecone:
+    """Stands in for pinecone.Pinecone and counts control-plane calls."""
+
+    def __init__(self):
+        self.calls = Counter()
+
+    def has_index(self, name):
+        self.calls["has_index"] += 1
+        return True
+
+    def create_index(self, **kwargs):
+        self.calls["create_index"] += 1
+
+    def Index(self, name, **kwargs):
+        # Resolving the index host is a describe_index call in the Pinecone client
+        self.calls["describe_index"] += 1
+        return object()
+
+
+class StubVectorStore:
+    def __init__(self, index, embedding):
+        self.index = index
+        self.embedding = embedding
+
+
+def _run(name: str, get_store, client: CountingPinecone, queries: int) -> None:
+    start = time.perf_counter()
+    for _ in range(queries):
+        get_store()
+    elapsed = time.perf_counter() - start
+    total = sum(client.calls.values())
+    print(f"{name:>12} {total:>14} {dict(client.calls)!s:>40} {elapsed * 1e6 / queries:>10.1f}us")
+
+
+def main():
+    queries = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    pinecone_store.PineconeVectorStore = StubVectorStore
+    print(f"{queries} queries")
+    print(f"{'mode':>12} {'control calls':>14} {'breakdown':>40} {'per query':>12}")
+
+    per_call = CountingPinecone()
+    _run("per call", lambda: StubVectorStore(pinecone_store.create_index(per_call), None), per_call, queries)
+
+    shared = CountingPinecone()
+    client = pinecone_store.VectorStoreClient(shared)
+    _run("shared", client.vectorstore, shared, queries)
+
+
+if __name__ == "__main__":
+    main()
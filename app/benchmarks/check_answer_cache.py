@@ -0,0 +1,89 @@
+"""
+Answer cache check for controllers.query_service.query_doc with stubbed
+retrieval and LLM.
+
+A support-desk workload asks 200 distinct questions over and over, some
+reworded. The script reports the hit rate, the latency of hits and misses
+and the saved time, then checks that invalidating the organization (as
+uploads and deletes do) makes the next query miss, and that an answer
+computed before an invalidation is not cached after it.
+
+Run from the app directory:
+    python -m benchmarks.check_answer_cache [queries]
+"""
+import asyncio
+import hashlib
+import random
+import sys
+import time
+from typing import List
+import numpy as np
+from controllers import query_service
+from core import settings
+from services.answer_cache import AnswerCache, normalize_question
+from benchmarks.fixtures import chat_token_counter
+from benchmarks.load_query_path import StubChatModel, StubVectorStore
+
+
+def _bag_of_words(text: str, dim: int = 256) -> List[float]:
+    """Deterministic stand-in for a query embedding: rewordings share most of their words."""
+    vector = np.zeros(dim, dtype=np.float32)
+    for word in normalize_question(text).split():
+        vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % dim] += 1.0
+    return vector.tolist()
+
+
+def _questions(count: int) -> List[str]:
+    topics = ["refund", "invoice", "password", "shipping", "warranty", "login", "export", "billing", "api", "plan"]
+    actions = ["change", "reset", "cancel", "download", "update", "find", "enable", "delete", "renew", "share"]
+    objects = ["account", "order", "report", "subscription", "team", "card", "address", "profile", "key", "data"]
+    questions = [f"How do I {a} my {o} {t} settings?" for t in topics for a in actions for o in objects]
+    random.Random(0).shuffle(questions)
+    return questions[:count]
+
+
+def _reword(question: str, rng: random.Random) -> str:
+    return rng.choice([question.lower(), question.upper(), "  " + question.rstrip("?") + " ", "please, " + question])
+
+
+async def main():
+    queries = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    store = StubVectorStore(0.03, 0.04)
+    chat_token_counter()
+    settings.HYBRID_SEARCH_ENABLED = False
+    StubChatModel.latency = 0.3
+    query_service.get_vectorstore = lambda embedding=None, namespace=None: store
+    query_service.get_chat_model = StubChatModel
+    cache = AnswerCache(max_entries=10000, ttl=3600, similarity=0.9, embed_query=_bag_of_words)
+    query_service.answer_cache = cache
+
+    rng = random.Random(1)
+    questions = _questions(200)
+    hit_latency, miss_latency = [], []
+    for _ in range(queries):
+        question = rng.choice(questions)
+        if rng.random() < 0.3:
+            question = _reword(question, rng)
+        start = time.perf_counter()
+        response = await query_service.query_doc(question, "org", None)
+        (hit_latency if response.cached else miss_latency).append(time.perf_counter() - start)
+
+    stats = cache.stats()
+    print(f"{queries} queries over {len(questions)} questions, 30% reworded")
+    print(f"hit rate {stats['hit_rate']:.1%} ({stats['semantic_hits']} semantic hits), saved {stats['saved_seconds']:.1f}s")
+    print(f"mean latency: hit {np.mean(hit_latency) * 1000:.2f} ms, miss {np.mean(miss_latency) * 1000:.1f} ms")
+
+    question = questions[0]
+    assert (await query_service.query_doc(question, "org", None)).cached
+    cache.invalidate("org")
+    assert not (await query_service.query_doc(question, "org", None)).cached, "invalidation must drop cached answers"
+
+    generation = cache.generation("org")
+    cache.invalidate("org")
+    assert not cache.store("org", "stale question", "stale", [], 1.0, 0.5, generation), "stale answers must not be cached"
+    assert cache.stats()["hit_rate"] > 0.5
+    print("OK: repeated questions are served from the cache and invalidation drops them")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
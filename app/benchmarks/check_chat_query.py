@@ -0,0 +1,179 @@
+"""
+Prompt tokens per turn of a long conversation through
+query_service.chat_query_doc, against resending the whole history.
+
+A stub chat model answers the three prompts of a turn: condensing the
+follow-up into a standalone question, answering it from the retrieved
+context, and extending the rolling summary when older messages are folded
+into it. It counts the tokens of every prompt it gets. Chat history lives in
+the in-memory collections of check_chat_writer, retrieval in the stub
+vector store of load_query_path.
+
+Checks that the history sent per turn stays within
+settings.CHAT_HISTORY_TOKENS plus the summary while the full history keeps
+growing, that retrieval got the standalone question, and that every turn
+was saved. A legacy session stored with a long backlog and no summary must
+then have every old message folded once, oldest first, over the following
+turns. Another user of the organization, or anyone from another one, must
+be refused the session, while an admin of its organization may continue it.
+
+Run from the app directory:
+    python -m benchmarks.check_chat_query [turns]
+"""
+import asyncio
+import sys
+from datetime import datetime, timezone
+from typing import Any, List
+from bson import ObjectId
+from controllers import query_service
+from core import ForbiddenException, settings
+from services.chat_writer import ChatHistoryWriter
+from benchmarks.fixtures import chat_token_counter
+from benchmarks.check_chat_writer import StandInDatabase
+from benchmarks.load_query_path import StubMessage, StubVectorStore
+
+_FILLER = "the pump manual explains the pressure sensor, the filter and the reset procedure in detail "
+
+
+class CountingChatModel:
+    """Answers condense, summary and answer prompts, recording the prompt tokens of each call."""
+
+    count_tokens = None
+    calls: List[tuple] = []
+    # Messages given to summary prompts, in the order they were folded
+    folded: List[str] = []
+
+    def __init__(self, **kwargs: Any):
+        pass
+
+    async def ainvoke(self, prompt: Any) -> StubMessage:
+        messages = prompt.to_messages()
+        tokens = sum(self.count_tokens(message.content) for message in messages)
+        system = messages[0].content
+        if system.startswith("Rewrite"):
+            kind, answer = "condense", f"standalone: {messages[-1].content[len('Question: '):]}"
+        elif "running summary" in system:
+            kind, answer = "summary", "Summary: " + _FILLER * 12
+            CountingChatModel.folded.extend(messages[-1].content.split("New messages:\n", 1)[1].split("\n"))
+        else:
+            kind, answer = "answer", "Answer: " + _FILLER * 4
+        CountingChatModel.calls.append((kind, tokens))
+        return StubMessage(answer)
+
+
+async def main():
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    count_tokens, counter_name = chat_token_counter()
+    CountingChatModel.count_tokens = staticmethod(count_tokens)
+    db = StandInDatabase()
+    store = StubVectorStore(0.0, 0.0)
+    query_service.get_database = lambda: db
+    query_service.get_vectorstore = lambda embedding=None, namespace=None: store
+    query_service.get_chat_model = CountingChatModel
+    query_service.chat_writer = ChatHistoryWriter()
+    settings.ANSWER_CACHE_ENABLED = settings.RETRIEVAL_CACHE_ENABLED = settings.HYBRID_SEARCH_ENABLED = False
+
+    print(f"{turns} turns, history budget {settings.CHAT_HISTORY_TOKENS} tokens, tokens counted by {counter_name}")
+    print(
+        f"{'turn':>5} {'history':>8} {'condense':>9} {'answer':>7} {'summary':>8} "
+        f"{'prompt tokens':>14} {'full history':>13}"
+    )
+    full_history = 0
+    per_turn: List[int] = []
+    history_sent: List[int] = []
+    summary_calls: List[int] = []
+    for turn in range(1, turns + 1):
+        question = f"and what about step {turn} of the reset, {_FILLER.strip()}"
+        CountingChatModel.calls = []
+        response = await query_service.chat_query_doc(question, "org", "session", "user", db, rerank=False)
+        assert response.standalone_query == (question if turn == 1 else f"standalone: {question}"), response.standalone_query
+        tokens = {kind: sum(t for k, t in CountingChatModel.calls if k == kind) for kind in ("condense", "answer", "summary")}
+        total = sum(tokens.values())
+        per_turn.append(total)
+        summary_calls.append(tokens["summary"])
+        history_sent.append(response.history_tokens)
+        # What a prompt carrying every earlier message would cost on top of the answer prompt
+        naive = tokens["answer"] + full_history
+        if turn <= 3 or turn % 5 == 0 or response.summarized:
+            print(
+                f"{turn:>5} {response.history_tokens:>8} {tokens['condense']:>9} {tokens['answer']:>7} "
+                f"{tokens['summary']:>8} {total:>14} {naive:>13}"
+                + ("  folded" if response.summarized else "")
+            )
+        full_history += count_tokens(question) + count_tokens(response.answer)
+
+    stored = db.chatMessages._find({"sessionId": "session"})
+    assert len(stored) == turns * 2, f"{len(stored)} messages stored"
+    session = db.chatHistory._find({"sessionId": "session"})[0]
+    assert session.get("summary"), "no rolling summary stored with the session"
+    summary_tokens = count_tokens(session["summary"])
+    assert max(history_sent) <= settings.CHAT_HISTORY_TOKENS + summary_tokens, "history sent outgrew its budget"
+    # Between folds the recent window refills, so per turn tokens rise and drop back; they must stop growing
+    quarter = turns // 4
+    third, last = per_turn[2 * quarter:3 * quarter], per_turn[3 * quarter:]
+    means = [sum(third) / len(third), sum(last) / len(last)]
+    assert max(last) <= 1.1 * max(third) and means[1] <= 1.1 * means[0], "prompt tokens per turn keep growing"
+    print(
+        f"prompt tokens per turn, folds included: mean {means[0]:.0f} and peak {max(third)} in the third quarter, "
+        f"mean {means[1]:.0f} and peak {max(last)} in the last"
+    )
+    print(
+        f"OK: history sent per turn at most {max(history_sent)} tokens, "
+        f"{full_history} tokens of full history after {turns} turns"
+    )
+    await _foreign_callers(db)
+    await _legacy_session(db, count_tokens)
+
+
+async def _legacy_session(db: StandInDatabase, count_tokens) -> None:
+    """A session saved before rolling summaries, folded over the turns after it."""
+    backlog = 5 * settings.CHAT_HISTORY_MAX_PAGE_SIZE
+    db.chatMessages.docs.extend(
+        {"_id": ObjectId(), "sessionId": "legacy", "role": "user" if i % 2 == 0 else "assistant",
+         "content": f"old message {i}, {_FILLER.strip()}"}
+        for i in range(backlog)
+    )
+    db.chatHistory.docs.append({
+        "_id": ObjectId(), "sessionId": "legacy", "userId": "user", "orgId": "org",
+        "createdAt": datetime.now(timezone.utc), "messageCount": backlog
+    })
+    CountingChatModel.folded = []
+    turns = 0
+    while True:
+        turns += 1
+        response = await query_service.chat_query_doc(f"question {turns}", "org", "legacy", "user", db, rerank=False)
+        if not response.summarized:
+            break
+        assert turns < 100, "backlog never caught up"
+    stored = sorted(db.chatMessages._find({"sessionId": "legacy"}), key=lambda doc: doc["_id"])
+    until = db.chatHistory._find({"sessionId": "legacy"})[0]["summarizedUntil"]
+    expected = [f"{doc['role']}: {doc['content']}" for doc in stored if doc["_id"] <= until]
+    assert CountingChatModel.folded == expected, "legacy messages skipped, repeated or folded out of order"
+    tail = sum(count_tokens(doc["content"]) for doc in stored if doc["_id"] > until)
+    assert tail <= settings.CHAT_HISTORY_TOKENS, f"{tail} tokens left unsummarized"
+    print(
+        f"OK: legacy session of {backlog} unsummarized messages folded oldest first over {turns - 1} turns, "
+        f"{len(expected)} messages folded once each, {tail} tokens left verbatim"
+    )
+
+
+async def _foreign_callers(db: StandInDatabase) -> None:
+    """Only the session's user, or an admin of its organization, may add turns to it."""
+    calls = len(CountingChatModel.calls)
+    messages = len(db.chatMessages.docs)
+    for org_id, user_id, is_admin in (("org", "intruder", False), ("other-org", "user", False), ("other-org", "admin", True)):
+        try:
+            await query_service.chat_query_doc(
+                "what did we talk about?", org_id, "session", user_id, db, rerank=False, is_admin=is_admin
+            )
+        except ForbiddenException:
+            continue
+        raise AssertionError(f"{user_id} of {org_id} continued another user's session")
+    assert len(CountingChatModel.calls) == calls and len(db.chatMessages.docs) == messages, "refused turn reached the model or was saved"
+    response = await query_service.chat_query_doc("what did we talk about?", "org", "session", "admin", db, rerank=False, is_admin=True)
+    assert response.answer, "admin of the organization was refused"
+    print("OK: another user's session refused, an admin of its organization allowed")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,230 @@
+"""
+Check the write-behind chat history writer of services.chat_writer against
+in-memory stand-ins of the chatMessages and chatHistory collections that
+count round trips.
+
+    1. 1,000 messages saved turn by turn without the writer, the old way
+    2. the same through the writer, from 100 concurrent sessions, with a
+       graceful restart (stop, then a new writer) halfway through
+    3. a backend slow enough for the buffer to fill, which must stay bounded
+
+and checks that every message is stored exactly once, in order, with the
+right per-session counts, that reads see messages not flushed yet, and
+that the writer needs far fewer round trips.
+
+Run from the app directory:
+    python -m benchmarks.check_chat_writer
+"""
+import asyncio
+import random
+from types import SimpleNamespace
+from typing import Any, Dict, List
+from controllers import query_service
+from schema import ChatHistoryCreate, ChatMessage
+from services.chat_writer import ChatHistoryWriter
+from benchmarks.fixtures import chat_token_counter
+
+SESSIONS = 100
+TURNS = 5
+
+
+class CountingCollection:
+    """The collection calls chat history makes, kept in memory and counted as round trips."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.docs: List[Dict[str, Any]] = []
+        self.round_trips = 0
+
+    async def _round_trip(self) -> None:
+        self.round_trips += 1
+        await asyncio.sleep(self.latency)
+
+    def _find(self, query: Dict[str, Any]) -> List[Dict[str, Any]]:
+        found = []
+        for doc in self.docs:
+            if all(
+                all(
+                    doc.get(key) is not None and (doc[key] < bound if op == "$lt" else doc[key] > bound)
+                    for op, bound in value.items()
+                ) if isinstance(value, dict) else doc.get(key) == value
+                for key, value in query.items()
+            ):
+                found.append(doc)
+        return found
+
+    def _upsert(self, query: Dict[str, Any], update: Dict[str, Any], upsert: bool = True) -> int:
+        found = self._find(query)
+        doc = found[0] if found else None
+        if doc is None:
+            if not upsert:
+                return 0
+            doc = {**query, **update.get("$setOnInsert", {})}
+            self.docs.append(doc)
+        doc.update(update.get("$set", {}))
+        for key, value in update.get("$inc", {}).items():
+            doc[key] = doc.get(key, 0) + value
+        return len(found[:1])
+
+    async def insert_many(self, docs, ordered=True):
+        await self._round_trip()
+        self.docs.extend(dict(doc) for doc in docs)
+
+    async def update_one(self, query, update, upsert=False):
+        await self._round_trip()
+        matched = self._upsert(query, update, upsert)
+        return SimpleNamespace(matched_count=matched, modified_count=matched)
+
+    async def bulk_write(self, requests, ordered=True):
+        await self._round_trip()
+        for request in requests:
+            if type(request).__name__ == "InsertOne":
+                self.docs.append(dict(request._doc))
+            else:
+                self._upsert(request._filter, request._doc)
+
+    async def find_one(self, query, projection=None):
+        await self._round_trip()
+        found = self._find(query)
+        return dict(found[0]) if found else None
+
+    def find(self, query):
+        return _Cursor(self, self._find(query))
+
+
+class _Cursor:
+    def __init__(self, collection: CountingCollection, docs: List[Dict[str, Any]]):
+        self.collection = collection
+        self.docs = docs
+
+    def sort(self, key, direction):
+        self.docs = sorted(self.docs, key=lambda doc: doc[key], reverse=direction < 0)
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    async def __aiter__(self):
+        await self.collection._round_trip()
+        for doc in self.docs:
+            yield doc
+
+    async def close(self):
+        pass
+
+
+class StandInDatabase:
+    def __init__(self, latency: float = 0.0):
+        self.chatMessages = CountingCollection(latency)
+        self.chatHistory = CountingCollection(latency)
+
+    @property
+    def round_trips(self) -> int:
+        return self.chatMessages.round_trips + self.chatHistory.round_trips
+
+
+def _turn(session: int, turn: int) -> ChatHistoryCreate:
+    return ChatHistoryCreate(
+        sessionId=f"session-{session}", userId="user", orgId="org",
+        messages=[
+            ChatMessage(role="user", content=f"question {turn} of session {session}"),
+            ChatMessage(role="assistant", content=f"answer {turn} of session {session}")
+        ]
+    )
+
+
+async def _session(session: int, turns: range, rng: random.Random) -> None:
+    for turn in turns:
+        await query_service.save_chat_history(_turn(session, turn))
+        await asyncio.sleep(rng.random() * 0.01)
+
+
+def _check_stored(db: StandInDatabase) -> None:
+    assert len(db.chatMessages.docs) == SESSIONS * TURNS * 2, f"{len(db.chatMessages.docs)} messages stored"
+    assert len({doc["_id"] for doc in db.chatMessages.docs}) == len(db.chatMessages.docs), "message stored twice"
+    for session in range(SESSIONS):
+        stored = sorted(db.chatMessages._find({"sessionId": f"session-{session}"}), key=lambda doc: doc["_id"])
+        expected = [msg.content for turn in range(TURNS) for msg in _turn(session, turn).messages]
+        assert [doc["content"] for doc in stored] == expected, f"session {session} out of order"
+        header = db.chatHistory._find({"sessionId": f"session-{session}"})
+        assert len(header) == 1 and header[0]["messageCount"] == TURNS * 2, f"session {session} count wrong"
+
+
+async def _direct() -> int:
+    db = StandInDatabase()
+    query_service.get_database = lambda: db
+    query_service.chat_writer = ChatHistoryWriter()
+    rng = random.Random(0)
+    await asyncio.gather(*(_session(session, range(TURNS), rng) for session in range(SESSIONS)))
+    _check_stored(db)
+    return db.round_trips
+
+
+async def _write_behind() -> int:
+    db = StandInDatabase()
+    query_service.get_database = lambda: db
+    rng = random.Random(0)
+    half = TURNS // 2
+
+    writer = query_service.chat_writer = ChatHistoryWriter(flush_messages=500, flush_interval=0.05, max_messages=5000)
+    await writer.start(db)
+    await asyncio.gather(*(_session(session, range(half), rng) for session in range(SESSIONS)))
+    # Submitted but not flushed yet, reads must still see it
+    await query_service.save_chat_history(_turn(0, half))
+    history = await query_service.get_chat_history("session-0")
+    assert history[-1].content == f"answer {half} of session 0", "read missed a buffered message"
+    await writer.stop()
+    trips = writer.round_trips
+
+    writer = query_service.chat_writer = ChatHistoryWriter(flush_messages=500, flush_interval=0.05, max_messages=5000)
+    await writer.start(db)
+    await asyncio.gather(*(
+        _session(session, range(half + 1 if session == 0 else half, TURNS), rng) for session in range(SESSIONS)
+    ))
+    await writer.stop()
+    _check_stored(db)
+    return trips + writer.round_trips
+
+
+async def _backpressure() -> Dict[str, Any]:
+    db = StandInDatabase(latency=0.05)
+    query_service.get_database = lambda: db
+    writer = query_service.chat_writer = ChatHistoryWriter(flush_messages=50, flush_interval=0.05, max_messages=100)
+    await writer.start(db)
+    most = 0
+
+    async def watch():
+        nonlocal most
+        while writer.running:
+            most = max(most, writer.stats()["buffered"])
+            await asyncio.sleep(0.001)
+
+    watcher = asyncio.create_task(watch())
+    await asyncio.gather(*(_session(session, range(TURNS), random.Random(session)) for session in range(SESSIONS)))
+    await writer.stop()
+    await watcher
+    _check_stored(db)
+    return {"most_buffered": most, "waits": writer.waits}
+
+
+async def main():
+    chat_token_counter()
+    messages = SESSIONS * TURNS * 2
+    direct = await _direct()
+    write_behind = await _write_behind()
+    per_thousand = lambda trips: trips * 1000 / messages
+    print(f"{messages} messages from {SESSIONS} concurrent sessions")
+    print(f"{'':>14} {'round trips':>12} {'per 1,000 messages':>19}")
+    print(f"{'per turn':>14} {direct:>12} {per_thousand(direct):>19.0f}")
+    print(f"{'write-behind':>14} {write_behind:>12} {per_thousand(write_behind):>19.0f}")
+    assert write_behind * 10 <= direct, "write-behind should need far fewer round trips"
+
+    pressure = await _backpressure()
+    print(f"slow backend, 100 message buffer: at most {pressure['most_buffered']} buffered, {pressure['waits']} waits")
+    assert pressure["most_buffered"] <= 100 and pressure["waits"] > 0, "buffer was not bounded"
+    print("OK: no message lost or reordered across a graceful restart, buffer bounded")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,66 @@
+"""
+Fire N overlapping uploads through rag1.process_all_pdfs and check that
+every chunk is ingested exactly once, with the vector store replaced by an
+in-memory recorder.
+
+Run from the app directory:
+    python -m benchmarks.check_concurrent_ingest [uploads] [files_per_upload]
+"""
+import sys
+import tempfile
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.fixtures import write_synthetic_pdf
+from core import settings
+from rag1 import main as rag_main
+
+
+class RecordingVectorStore:
+    """Stands in for the vector store and records every vector ID it receives."""
+
+    def __init__(self):
+        self.ids = Counter()
+        self.lock = threading.Lock()
+
+    def add_documents(self, documents, ids=None, **kwargs):
+        with self.lock:
+            self.ids.update(ids)
+        return ids
+
+
+def _upload(upload_no: int, files: int):
+    staging_dir = rag_main.create_staging_dir()
+    mappings = {}
+    for i in range(files):
+        filename = f"org_upload{upload_no}_{i}.pdf"
+        write_synthetic_pdf(staging_dir / filename, pages=3, seed=upload_no * 100 + i)
+        mappings[filename] = f"doc-{upload_no}-{i}"
+    return rag_main.process_all_pdfs("org", mappings, staging_dir)
+
+
+def main():
+    uploads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    files = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    store = RecordingVectorStore()
+    rag_main.get_vectorstore = lambda *args, **kwargs: store
+
+    # Chunks also go to the keyword index, kept out of the app's own lexical_index folder
+    with tempfile.TemporaryDirectory() as tmp, ThreadPoolExecutor(max_workers=uploads) as pool:
+        settings.LEXICAL_INDEX_PATH = tmp
+        results = list(pool.map(lambda n: _upload(n, files), range(uploads)))
+
+    expected = sum(r["chunks_processed"] for r in results)
+    duplicates = [vector_id for vector_id, count in store.ids.items() if count > 1]
+    documents = {vector_id.split("#")[0] for vector_id in store.ids}
+
+    print(f"uploads={uploads} chunks_reported={expected} chunks_stored={sum(store.ids.values())}")
+    assert not duplicates, f"chunks ingested more than once: {duplicates[:5]}"
+    assert sum(store.ids.values()) == expected
+    assert len(documents) == uploads * files
+    print("OK: every chunk ingested exactly once")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Prompt context built by utils.context_builder against the plain join of the
+retrieved chunks.
+
+Synthetic documents are split with the ingestion text splitter (1000
+characters, 200 overlap). Each query retrieves k chunks in runs of
+neighbours around a few hits, as a question about one passage does. The
+script reports context tokens with and without the builder, at the default
+budget and a tight one, and checks that merged neighbours reproduce the
+document text without the repeated overlap and that the budget holds.
+
+Run from the app directory:
+    python -m benchmarks.check_context_builder [queries] [k]
+"""
+import random
+import sys
+from typing import Dict, List, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from core import settings
+from rag1.main import _create_text_splitter
+from utils.context_builder import build_context
+from benchmarks.fixtures import _WORDS, chat_token_counter
+
+
+def _documents(count: int, rng: random.Random) -> Dict[str, Tuple[str, List[Document]]]:
+    splitter = _create_text_splitter()
+    documents = {}
+    for d in range(count):
+        sentences = [
+            " ".join(rng.choice(_WORDS) for _ in range(rng.randint(8, 20))).capitalize() + "."
+            for _ in range(400)
+        ]
+        text = " ".join(sentences)
+        chunks = splitter.split_text(text)
+        documents[f"doc{d}"] = (text, [
+            Document(id=f"doc{d}#{i}", page_content=chunk, metadata={"documentId": f"doc{d}"})
+            for i, chunk in enumerate(chunks)
+        ])
+    return documents
+
+
+def _retrieve(documents, k: int, rng: random.Random) -> List[Tuple[Document, float]]:
+    """k chunks in runs of up to 3 neighbours, best first with scores falling with rank."""
+    picked: Dict[str, Document] = {}
+    while len(picked) < k:
+        _, chunks = documents[rng.choice(list(documents))]
+        start = rng.randrange(len(chunks))
+        for chunk in chunks[start:start + rng.randint(1, 3)]:
+            if len(picked) < k:
+                picked[chunk.id] = chunk
+    return [(doc, 0.9 - 0.02 * rank) for rank, doc in enumerate(picked.values())]
+
+
+def main():
+    queries = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    rng = random.Random(0)
+    count, counter_name = chat_token_counter()
+    documents = _documents(5, rng)
+    chunk_count = sum(len(chunks) for _, chunks in documents.values())
+    print(f"{chunk_count} chunks in {len(documents)} documents, k={k}, tokens counted with {counter_name}")
+
+    results = {settings.QUERY_CONTEXT_TOKENS: [], 1000: []}
+    for _ in range(queries):
+        scored = _retrieve(documents, k, rng)
+        naive = count("\n\n".join(doc.page_content for doc, _ in scored))
+        for budget, rows in results.items():
+            context = build_context(scored, max_tokens=budget)
+            assert context.tokens <= budget, (context.tokens, budget)
+            assert context.tokens + context.tokens_saved == naive
+            assert not context.chunks or scored[0] in context.chunks, "the best chunk is kept"
+            rows.append((naive, context.tokens, len(context.chunks)))
+
+    print(f"{'budget':>7} {'plain join':>11} {'built':>7} {'saved':>7} {'chunks kept':>12}")
+    for budget, rows in results.items():
+        naive, built, kept = (np.mean(column) for column in zip(*rows))
+        print(f"{budget:>7} {naive:>11.0f} {built:>7.0f} {(naive - built) / naive:>7.1%} {kept:>9.1f}/{k}")
+
+    # A run of neighbours becomes one passage that reads exactly like the document
+    text, chunks = documents["doc0"]
+    run = chunks[3:7]
+    context = build_context([(doc, 0.5) for doc in reversed(run)], max_tokens=10 ** 6)
+    assert [doc.id for doc, _ in context.chunks] == [doc.id for doc in run], "chunks follow document order"
+    assert "\n\n" not in context.text and context.text in text, "overlap between neighbours is removed"
+    assert len(context.text) < sum(len(doc.page_content) for doc in run)
+    print("OK: neighbouring chunks are merged without overlap, ordered by document and kept within the budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Ingest the same upload twice through rag1.process_all_pdfs with a fake
+embedding backend behind utils.embedding_cache.CachedEmbeddings, and check
+that the second ingestion, using a fresh cache instance on the same file,
+makes zero backend calls.
+
+Run from the app directory:
+    python -m benchmarks.check_embedding_cache [files] [pages_per_file]
+"""
+import sys
+import tempfile
+from pathlib import Path
+from benchmarks.fixtures import write_synthetic_pdf
+from core import settings
+from rag1 import main as rag_main
+from utils.embedding_cache import CachedEmbeddings
+
+
+class FakeEmbeddingBackend:
+    """Deterministic stand-in for the embedding API that counts calls."""
+
+    def __init__(self):
+        self.calls = 0
+        self.texts = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        self.texts += len(texts)
+        return [[float(len(text)), float(sum(map(ord, text)) % 997)] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class EmbeddingVectorStore:
+    """Stands in for the vector store and embeds documents the way PineconeVectorStore does."""
+
+    def __init__(self, embedding):
+        self.embedding = embedding
+
+    def add_documents(self, documents, ids=None, **kwargs):
+        self.embedding.embed_documents([doc.page_content for doc in documents])
+        return ids
+
+
+def _ingest(files: int, pages: int) -> dict:
+    staging_dir = rag_main.create_staging_dir()
+    mappings = {}
+    for i in range(files):
+        filename = f"org_cache_{i}.pdf"
+        write_synthetic_pdf(staging_dir / filename, pages=pages, seed=i)
+        mappings[filename] = f"doc-{i}"
+    return rag_main.process_all_pdfs("org", mappings, staging_dir)
+
+
+def main():
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    pages = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    rag_main.get_vectorstore = lambda embedding=None, namespace=None: EmbeddingVectorStore(embedding)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Chunks also go to the keyword index, kept out of the app's own lexical_index folder
+        settings.LEXICAL_INDEX_PATH = str(Path(tmp) / "lexical")
+        cache_path = Path(tmp) / "embeddings.sqlite3"
+        for run in ("first", "second"):
+            backend = FakeEmbeddingBackend()
+            cache = CachedEmbeddings(backend, model="fake-model", path=cache_path)
+            rag_main.get_embedding_model = lambda: cache
+            result = _ingest(files, pages)
+            print(f"{run} ingestion: chunks={result['chunks_processed']} backend_calls={backend.calls} "
+                  f"texts_embedded={backend.texts} cache={cache.stats()}")
+            cache.close()
+
+        assert backend.calls == 0, f"second ingestion made {backend.calls} backend calls"
+        print("OK: repeated ingestion made zero backend calls")
+
+
+if __name__ == "__main__":
+    main()
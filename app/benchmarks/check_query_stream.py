@@ -0,0 +1,126 @@
+"""
+Time to first byte of POST /api/query/stream against POST /api/query, with a
+fake streaming LLM and a stubbed vector store.
+
+The app is driven directly over ASGI, so the times are when the app hands
+bytes to the server. Checks that the sources event arrives right after
+retrieval, the first token right after the LLM's first token, and that the
+SSE stream ends with a done event.
+
+Run from the app directory:
+    python -m benchmarks.check_query_stream
+"""
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Tuple
+from fastapi import FastAPI
+from langchain_core.messages import AIMessage, AIMessageChunk
+from api import query_router
+from controllers import query_service
+from core import settings
+from db import get_database
+from benchmarks.fixtures import chat_token_counter
+from benchmarks.load_query_path import StubVectorStore
+
+RETRIEVAL = 0.05
+FIRST_TOKEN = 0.3
+TOKENS = 40
+TOKEN_GAP = 0.02
+
+
+class FakeStreamingChatModel:
+    def __init__(self, **kwargs: Any):
+        pass
+
+    async def astream(self, prompt: Any):
+        await asyncio.sleep(FIRST_TOKEN)
+        for i in range(TOKENS):
+            if i:
+                await asyncio.sleep(TOKEN_GAP)
+            yield AIMessageChunk(content=f"token{i} ")
+
+    async def ainvoke(self, prompt: Any) -> AIMessage:
+        await asyncio.sleep(FIRST_TOKEN + TOKEN_GAP * (TOKENS - 1))
+        return AIMessage(content=" ".join(f"token{i}" for i in range(TOKENS)))
+
+
+async def _request(app: FastAPI, path: str, body: Dict[str, Any]) -> Tuple[int, List[Tuple[float, bytes]], float]:
+    """POST body to path, return the status, (seconds since start, bytes) per body message and the total time."""
+    payload = json.dumps(body).encode()
+    received = False
+    chunks: List[Tuple[float, bytes]] = []
+    status = 0
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body" and message.get("body"):
+            chunks.append((time.perf_counter() - start, message["body"]))
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode())],
+        "client": ("127.0.0.1", 1234), "server": ("127.0.0.1", 80)
+    }
+    start = time.perf_counter()
+    await app(scope, receive, send)
+    return status, chunks, time.perf_counter() - start
+
+
+def _events(chunks: List[Tuple[float, bytes]]) -> List[Tuple[float, str, Dict[str, Any]]]:
+    events = []
+    for at, body in chunks:
+        for block in body.decode().split("\n\n"):
+            if block.strip():
+                lines = dict(line.split(": ", 1) for line in block.splitlines())
+                events.append((at, lines["event"], json.loads(lines["data"])))
+    return events
+
+
+async def main():
+    chat_token_counter()
+    query_service.get_vectorstore = lambda embedding=None, namespace=None: StubVectorStore(RETRIEVAL, 0)
+    query_service.get_chat_model = FakeStreamingChatModel
+    # Both endpoints get the same question, neither may answer it from a cache
+    settings.ANSWER_CACHE_ENABLED = settings.RETRIEVAL_CACHE_ENABLED = False
+    settings.HYBRID_SEARCH_ENABLED = False
+
+    app = FastAPI()
+    app.include_router(query_router, prefix="/api/query")
+    app.dependency_overrides[get_database] = lambda: None
+    body = {"searchTxt": "what is in the report?", "orgId": "org", "documentId": "doc"}
+
+    status, chunks, total = await _request(app, "/api/query/query", body)
+    assert status == 200, status
+    print(f"/query         status={status} ttfb={chunks[0][0] * 1000:7.1f} ms  total={total * 1000:7.1f} ms")
+
+    status, chunks, total = await _request(app, "/api/query/stream", body)
+    assert status == 200, status
+    events = _events(chunks)
+    names = [name for _, name, _ in events]
+    first_token = next(at for at, name, _ in events if name == "token")
+    print(
+        f"/query/stream  status={status} ttfb={chunks[0][0] * 1000:7.1f} ms  "
+        f"first token={first_token * 1000:7.1f} ms  total={total * 1000:7.1f} ms"
+    )
+    print("done event:", events[-1][2])
+
+    assert names[0] == "sources" and names[-1] == "done", names
+    assert names.count("token") == TOKENS, names
+    assert chunks[0][0] < RETRIEVAL + 0.1, "sources should be sent as soon as retrieval finishes"
+    assert first_token < RETRIEVAL + FIRST_TOKEN + 0.1, "the first token should not wait for the full answer"
+    print("OK: sources and tokens are streamed before the answer is complete")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,71 @@
+"""
+Retrieval cache check for controllers.query_service._retrieve with a
+stubbed vector store that counts its searches.
+
+Repeats a small set of search texts, reports the hit rate and the latency of
+hits and misses, then checks that bumping the organization's generation (as
+ingestion and deletion do) forces a fresh search, and that results of a
+search that raced a bump are not served afterwards.
+
+Run from the app directory:
+    python -m benchmarks.check_retrieval_cache [queries]
+"""
+import random
+import sys
+import time
+import numpy as np
+from controllers import query_service
+from core import settings
+from services.retrieval_cache import RetrievalCache
+from benchmarks.load_query_path import StubVectorStore
+
+
+class CountingVectorStore(StubVectorStore):
+    searches = 0
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, **kwargs):
+        CountingVectorStore.searches += 1
+        return super().similarity_search_by_vector_with_score(embedding, k, **kwargs)
+
+
+def main():
+    queries = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    store = CountingVectorStore(0.0, 0.04)
+    settings.HYBRID_SEARCH_ENABLED = False
+    query_service.get_vectorstore = lambda embedding=None, namespace=None: store
+    cache = RetrievalCache(max_entries=10000, ttl=600)
+    query_service.retrieval_cache = cache
+
+    rng = random.Random(0)
+    texts = [f"search text {i}" for i in range(100)]
+    hit_latency, miss_latency = [], []
+    for _ in range(queries):
+        searches = CountingVectorStore.searches
+        start = time.perf_counter()
+        query_service._retrieve(rng.choice(texts), "org")
+        elapsed = time.perf_counter() - start
+        (miss_latency if CountingVectorStore.searches > searches else hit_latency).append(elapsed)
+
+    stats = cache.stats()
+    print(f"{queries} retrievals over {len(texts)} search texts: {CountingVectorStore.searches} vector searches")
+    print(f"hit rate {stats['hit_rate']:.1%}, mean latency: hit {np.mean(hit_latency) * 1000:.3f} ms, miss {np.mean(miss_latency) * 1000:.1f} ms")
+
+    searches = CountingVectorStore.searches
+    query_service._retrieve(texts[0], "org")
+    assert CountingVectorStore.searches == searches, "a repeated search must be served from the cache"
+    cache.bump("org")
+    query_service._retrieve(texts[0], "org")
+    assert CountingVectorStore.searches == searches + 1, "a new generation must search again"
+    query_service._retrieve(texts[0], "other-org")
+    assert CountingVectorStore.searches == searches + 2, "organizations must not share results"
+
+    # A search that started before a bump is stored under the old generation
+    key = cache.key("org", [1.0, 2.0], 5)
+    cache.bump("org")
+    cache.put(key, [])
+    assert cache.get(cache.key("org", [1.0, 2.0], 5)) is None, "results from before a bump must not be served"
+    print("OK: repeated searches skip the vector store until the organization's documents change")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import random
+from pathlib import Path
+from typing import Callable, List, Tuple
+from utils import context_builder
+
+_WORDS = (
+    "pump valve pressure manual safety install torque sensor filter warranty "
+    "maintenance cycle error code reset panel motor voltage cable bracket seal"
+).split()
+
+
+def _page_stream(rng: random.Random, lines: int) -> bytes:
+    """Build a page content stream with `lines` lines of random words."""
+    parts = ["BT /F1 10 Tf 50 760 Td 12 TL"]
+    for _ in range(lines):
+        text = " ".join(rng.choice(_WORDS) for _ in range(12))
+        parts.append(f"({text}) '")
+    parts.append("ET")
+    return "\n".join(parts).encode("latin-1")
+
+
+def write_synthetic_pdf(path: Path, pages: int, lines_per_page: int = 50, seed: int = 0) -> Path:
+    """Write a minimal, valid text PDF with the given number of pages."""
+    rng = random.Random(seed)
+    objects: List[bytes] = []
+    page_ids = [4 + 2 * i for i in range(pages)]
+    kids = " ".join(f"{pid} 0 R" for pid in page_ids)
+
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode())
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for pid in page_ids:
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {pid + 1} 0 R >>".encode()
+        )
+        stream = _page_stream(rng, lines_per_page)
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref_at = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_at)
+
+    path.write_bytes(bytes(out))
+    return path
+
+
+def write_synthetic_corpus(folder: Path, files: int, pages: int) -> List[str]:
+    """Write `files` synthetic PDFs of `pages` pages each and return their paths."""
+    folder.mkdir(parents=True, exist_ok=True)
+    return [
+        str(write_synthetic_pdf(folder / f"manual_{i:03d}.pdf", pages, seed=i))
+        for i in range(files)
+    ]
+
+
+def chat_token_counter() -> Tuple[Callable[[str], int], str]:
+    """
+    Token counter of the chat model and its name. Without the tiktoken files
+    (no network) it falls back to about 4 characters per token for English,
+    and the context builder is switched to that fallback too.
+    """
+    try:
+        context_builder.count_chat_tokens("warm up")
+        return context_builder.count_chat_tokens, "tiktoken"
+    except Exception:
+        count = lambda text: len(text) // 4
+        context_builder.count_chat_tokens = count
+        return count, "~4 characters per token"
@@ -0,0 +1,99 @@
+"""
+Load test of query embedding with and without utils.query_batcher coalescing.
+
+Clients in flight each embed a stream of questions through the query pool,
+the way _retrieve does, one in ten of them a popular question other
+clients ask too. The stub backend takes a fixed round trip per call plus a
+little per text, and serves at most a few calls at once like a rate-limited
+API, so single-text calls queue up behind each other under load. For each
+concurrency the script reports backend calls, texts collapsed onto an
+identical in-flight one, p50/p99 latency and QPS, and checks every query got
+its own text's vector.
+
+Run from the app directory:
+    python -m benchmarks.load_query_embeddings [call_ms] [backend_slots] [window_ms]
+"""
+import asyncio
+import random
+import sys
+import threading
+import time
+from typing import List
+import numpy as np
+from core import settings
+from services.query_executor import run_blocking
+from utils.query_batcher import QueryEmbeddingBatcher
+
+QUERIES_PER_CLIENT = 40
+
+
+class StubEmbeddingBackend:
+    """Embedding API stand-in: call_seconds per call, 0.05 ms per text, at most slots calls at once."""
+
+    def __init__(self, call_seconds: float, slots: int):
+        self.call_seconds = call_seconds
+        self._slots = threading.Semaphore(slots)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    @staticmethod
+    def vector(text: str) -> List[float]:
+        return [float(len(text)), float(sum(map(ord, text)) % 997)]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self._lock:
+            self.calls += 1
+        with self._slots:
+            time.sleep(self.call_seconds + 0.00005 * len(texts))
+        return [self.vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+async def _client(batcher: QueryEmbeddingBatcher, client: int, latencies: List[float]) -> None:
+    rng = random.Random(client)
+    for i in range(QUERIES_PER_CLIENT):
+        if rng.random() < 0.1:
+            text = f"how do I reset the pump, popular question {rng.randrange(5)}"
+        else:
+            text = f"client {client} question {i} about the valve"
+        start = time.perf_counter()
+        vector = await run_blocking(batcher.embed_query, text)
+        latencies.append(time.perf_counter() - start)
+        assert vector == StubEmbeddingBackend.vector(text), "query got another text's vector"
+
+
+async def _load(in_flight: int, call_seconds: float, slots: int, window: float) -> None:
+    backend = StubEmbeddingBackend(call_seconds, slots)
+    batcher = QueryEmbeddingBatcher(backend, window=window, max_batch=settings.QUERY_EMBEDDING_BATCH_SIZE)
+    latencies: List[float] = []
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(batcher, client, latencies) for client in range(in_flight)))
+    elapsed = time.perf_counter() - start
+    stats = batcher.stats()
+    label = f"{window * 1000:.0f} ms window" if window > 0 else "per query"
+    print(
+        f"{in_flight:>9} {label:>14} {backend.calls:>13} {stats['collapsed']:>10} "
+        f"{np.percentile(latencies, 50) * 1000:>8.1f} {np.percentile(latencies, 99) * 1000:>8.1f} "
+        f"{len(latencies) / elapsed:>8.0f}"
+    )
+
+
+def main():
+    call_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 30
+    slots = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    window_ms = float(sys.argv[3]) if len(sys.argv) > 3 else settings.QUERY_EMBEDDING_WINDOW_MS
+    print(
+        f"backend: {call_ms:.0f} ms per call, {slots} calls at once; {QUERIES_PER_CLIENT} queries per client, "
+        f"query pool of {settings.QUERY_THREADS} threads"
+    )
+    print(f"{'in flight':>9} {'':>14} {'backend calls':>13} {'collapsed':>10} {'p50 ms':>8} {'p99 ms':>8} {'QPS':>8}")
+    for in_flight in (1, 8, 32, 64):
+        for window in (0.0, window_ms / 1000):
+            asyncio.run(_load(in_flight, call_ms / 1000, slots, window))
+    print("OK: every query received the vector of its own text")
+
+
+if __name__ == "__main__":
+    main()
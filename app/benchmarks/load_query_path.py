@@ -0,0 +1,119 @@
+"""
+Load test of controllers.query_service.query_doc with stubbed backends.
+
+The vector store stub blocks for the embedding and search round trips like
+the real HTTP clients do, and the chat model stub awaits its latency like
+ChatOpenAI.ainvoke. With a non-blocking query path, QPS grows with the
+number of requests in flight until the query pool (settings.QUERY_THREADS)
+is saturated.
+
+Run from the app directory:
+    python -m benchmarks.load_query_path [embed_ms] [search_ms] [llm_ms]
+"""
+import asyncio
+import sys
+import time
+from typing import Any, List
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+from controllers import query_service
+from core import settings
+from benchmarks.fixtures import chat_token_counter
+
+
+class StubEmbeddings:
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.seconds)
+        return [float(len(text)), float(sum(map(ord, text)) % 997)]
+
+
+class StubVectorStore(VectorStore):
+    def __init__(self, embed_seconds: float, search_seconds: float):
+        self.embed_seconds = embed_seconds
+        self.search_seconds = search_seconds
+        self._embeddings = StubEmbeddings(embed_seconds)
+
+    @property
+    def embeddings(self) -> StubEmbeddings:
+        return self._embeddings
+
+    def add_texts(self, texts, metadatas=None, **kwargs: Any) -> List[str]:
+        raise NotImplementedError
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs: Any):
+        raise NotImplementedError
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return self.similarity_search_by_vector(self._embeddings.embed_query(query), k, **kwargs)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, **kwargs)]
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4, **kwargs: Any):
+        time.sleep(self.search_seconds)
+        return [
+            (Document(page_content=f"chunk {i} about {embedding}", metadata={"documentId": f"doc{i}"}), 0.9 - 0.02 * i)
+            for i in range(k)
+        ]
+
+
+class StubMessage:
+    def __init__(self, content: str):
+        self.content = content
+
+
+class StubChatModel:
+    latency = 0.0
+
+    def __init__(self, **kwargs: Any):
+        pass
+
+    async def ainvoke(self, prompt: Any) -> StubMessage:
+        await asyncio.sleep(self.latency)
+        return StubMessage("stub answer")
+
+
+async def _load(in_flight: int, duration: float) -> float:
+    """Keep in_flight queries running for duration seconds, return the completed queries per second."""
+    completed = 0
+    deadline = time.perf_counter() + duration
+
+    async def client(n: int) -> None:
+        nonlocal completed
+        while time.perf_counter() < deadline:
+            await query_service.query_doc(f"question {n}", "org", None)
+            completed += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(n) for n in range(in_flight)))
+    return completed / (time.perf_counter() - start)
+
+
+def main():
+    embed_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 30
+    search_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 40
+    llm_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 300
+    store = StubVectorStore(embed_ms / 1000, search_ms / 1000)
+    chat_token_counter()
+    StubChatModel.latency = llm_ms / 1000
+    query_service.get_vectorstore = lambda embedding=None, namespace=None: store
+    query_service.get_chat_model = StubChatModel
+    # Every client asks a different question, only the query path itself is measured
+    settings.ANSWER_CACHE_ENABLED = settings.RETRIEVAL_CACHE_ENABLED = False
+    # The stub store has no keyword index to fuse with
+    settings.HYBRID_SEARCH_ENABLED = False
+
+    ideal = 1000 / (embed_ms + search_ms + llm_ms)
+    print(f"embed={embed_ms}ms search={search_ms}ms llm={llm_ms}ms, query pool of {settings.QUERY_THREADS} threads")
+    print(f"{'in flight':>9} {'QPS':>8} {'QPS / in flight':>16} {'linear':>7}")
+    for in_flight in (1, 2, 4, 8, 16, 32, 64):
+        qps = asyncio.run(_load(in_flight, duration=3.0))
+        print(f"{in_flight:>9} {qps:>8.1f} {qps / in_flight:>16.2f} {qps / (ideal * in_flight):>6.0%}")
+
+
+if __name__ == "__main__":
+    main()
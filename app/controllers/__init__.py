@@ -1,14 +1,14 @@
 from .organization_services import createOrg, getOrganizations, get_organization_by_id, get_org_by_name, updateOrganization,delete_organization_by_id
 from .user_services import createUser, getUsersByOrgId, getUserById, updateUser, deleteUser
 from .auth_services import authenticateUser
-from .doc_services import upload_files, getDocsByOrgId, deleteDocuments
-from .query_service import query_doc
+from .doc_services import upload_files, getDocsByOrgId, deleteDocuments, getIngestJob
+from .query_service import query_doc, stream_query_doc, getQueryCacheStats, getChatHistoryPage, chat_query_doc
 
 
 __all__ = [
     "createOrg","getOrganizations", "get_organization_by_id", "get_org_by_name","updateOrganization","delete_organization_by_id","deleteUser",
     "createUser","updateUser", "getUserById", "authenticateUser", "getUsersByOrgId",
     "authenticateUser",
-    "upload_files","getDocsByOrgId","deleteDocuments",
-    "query_doc"
+    "upload_files","getDocsByOrgId","deleteDocuments","getIngestJob",
+    "query_doc","stream_query_doc","getQueryCacheStats","getChatHistoryPage","chat_query_doc"
 ]
\ No newline at end of file
@@ -1,14 +1,19 @@
 import os
+import shutil
 import time
 from datetime import datetime
 from typing import List, Dict, Any
 from fastapi import UploadFile
 from pymongo.asynchronous.database import AsyncDatabase
 from bson import ObjectId
-from core import logger, BadRequestException
-from schema import DocumentUploadResponse, ProcessingResult, DocOutput, DocumentDeletionResponse, DocumentDeletionErrors
-from rag1.main import process_all_pdfs
-from utils import get_vectorstore
+from pymongo.errors import BulkWriteError
+from core import logger, settings, AppBaseException, BadRequestException, NotFoundException
+from schema import DocumentUploadResponse, ProcessingResult, DocOutput, DocumentDeletionResponse, DocumentDeletionErrors, IngestJobOutput
+from rag1.main import create_staging_dir
+from services.retrieval_cache import invalidate_org_caches
+from services.ingest_queue import ingest_queue
+from services.upload_stream import stream_upload_to_disk
+from utils import get_vectorstore, org_namespace, get_lexical_index
 
 async def upload_files(
     files: List[UploadFile],
@@ -17,7 +22,7 @@ async def upload_files(
     db: AsyncDatabase 
 ) -> DocumentUploadResponse:
     """
-    Upload files and process them for the given organization.
+    Upload files and queue them for background processing for the given organization.
     
     Args:
         files: List of files to upload
@@ -25,9 +30,11 @@ async def upload_files(
         db: Database connection
         
     Returns:
-        DocumentUploadResponse with upload and processing results
+        DocumentUploadResponse with upload results and the ingestion job ID
     """
     upload_start_time = time.time()
+    staging_dir = None
+    job_id = None
     try:
         if not files:
             raise BadRequestException("No files provided for upload")
@@ -35,10 +42,14 @@ async def upload_files(
         if not organizationId:
             raise BadRequestException("Organization ID is required")
 
-        UPLOAD_DIR = "uploaded_files"
-        os.makedirs(UPLOAD_DIR, exist_ok=True)
+        # Every upload gets its own staging folder so overlapping uploads never share files
+        staging_dir = create_staging_dir()
         documents_to_insert = []
         errors = []
+        request_bytes = 0
+        duplicate_hashes = []  # Content hashes of files that match an already uploaded document
+        retried_documents = {}  # Map unique_filename to the ID of a failed document with the same content
+        staged_hashes = set()  # Content hashes of the files this request inserts or retries
 
         logger.info(f"Starting upload of {len(files)} files for organization {organizationId}")
 
@@ -54,86 +65,140 @@ async def upload_files(
                     errors.append(f"Invalid file type for '{file.filename}'. Only PDF files are allowed.")
                     continue
 
+                # Reject oversized files before reading them when the size is already known
+                max_bytes = min(settings.MAX_UPLOAD_FILE_SIZE, settings.MAX_UPLOAD_REQUEST_SIZE - request_bytes)
+                if file.size is not None and file.size > max_bytes:
+                    errors.append(f"File '{file.filename}' exceeds the upload size limit")
+                    continue
+
                 # Generate unique filename
                 timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S_%f")[:-3]
                 unique_filename = f"{organizationId}_{timestamp}_{file.filename}"
-                file_path = os.path.join(UPLOAD_DIR, unique_filename)
+                file_path = os.path.join(staging_dir, unique_filename)
 
-                # Save the file
-                content = await file.read()
-                if len(content) == 0:
-                    errors.append(f"File '{file.filename}' is empty")
+                # Stream the file to disk, hashing and validating it on the way
+                stored = await stream_upload_to_disk(file, file_path, max_bytes=max_bytes)
+                request_bytes += stored["size"]
+
+                # Byte-identical re-uploads short-circuit to the existing document
+                if stored["sha256"] in staged_hashes:
+                    os.remove(file_path)
+                    duplicate_hashes.append(stored["sha256"])
+                    continue
+
+                existing = await db.documents.find_one(
+                    {"organizationId": organizationId, "sha256": stored["sha256"]},
+                    {"_id": 1, "status": 1}
+                )
+                if existing and existing.get("status") != "failed":
+                    os.remove(file_path)
+                    duplicate_hashes.append(stored["sha256"])
+                    logger.info(f"File {file.filename} is a duplicate of document {existing['_id']}")
+                    continue
+                if existing:
+                    # A previous ingestion of the same content failed, so retry it under the same document ID
+                    await db.documents.update_one(
+                        {"_id": existing["_id"]},
+                        {"$set": {"unique_filename": unique_filename, "path": file_path, "uploadedAt": datetime.utcnow(), "status": "uploaded"}}
+                    )
+                    retried_documents[unique_filename] = str(existing["_id"])
+                    staged_hashes.add(stored["sha256"])
                     continue
-                    
-                with open(file_path, "wb") as f:
-                    f.write(content)
 
                 doc = {
                     "organizationId": organizationId,
                     "name": fileName,
                     "unique_filename": unique_filename,
                     "path": file_path,
-                    "file_size": len(content),
+                    "file_size": stored["size"],
+                    "sha256": stored["sha256"],
                     "uploadedAt": datetime.utcnow(),
                     "status": "uploaded"
                 }
 
                 documents_to_insert.append(doc)
-                logger.info(f"Prepared file for upload: {file.filename} ({len(content)} bytes)")
+                staged_hashes.add(stored["sha256"])
+                logger.info(f"Prepared file for upload: {file.filename} ({stored['size']} bytes)")
                 
+            except AppBaseException as e:
+                logger.warning(f"Rejected file {file.filename}: {e.detail}")
+                errors.append(f"File '{file.filename}' rejected: {e.detail}")
             except Exception as e:
                 logger.error(f"Error processing file {file.filename}: {str(e)}")
                 errors.append(f"Error processing file {file.filename}: {str(e)}")
         
         # Insert into MongoDB and create document mapping
         inserted_ids = []
-        document_mappings = {}  # Map unique_filename to document ID
+        document_mappings = dict(retried_documents)  # Map unique_filename to document ID
         
         if documents_to_insert:
             try:
-                result = await db.documents.insert_many(documents_to_insert)
+                result = await db.documents.insert_many(documents_to_insert, ordered=False)
                 print("Upload files result",result)
                 inserted_ids = result.inserted_ids
-                
-                # Create mapping between unique_filename and document ID
-                for i, doc in enumerate(documents_to_insert):
-                    if i < len(inserted_ids):
-                        document_mappings[doc['unique_filename']] = str(inserted_ids[i])
-                
-                logger.info(f"Inserted {len(inserted_ids)} documents into database")
-                logger.info(f"Created document mappings: {document_mappings}")
-                
+            except BulkWriteError as e:
+                # Rows that failed to insert have no documents record and must not be ingested
+                rejected = {err["index"]: err for err in e.details.get("writeErrors", [])}
+                for i, err in sorted(rejected.items()):
+                    doc = documents_to_insert[i]
+                    os.remove(doc["path"])
+                    if err.get("code") == 11000:
+                        # A concurrent upload inserted the same content first; the file becomes a duplicate
+                        duplicate_hashes.append(doc["sha256"])
+                    else:
+                        logger.error(f"Error inserting document {doc['unique_filename']}: {err.get('errmsg')}")
+                        errors.append(f"Database insertion error for '{doc['unique_filename']}': {err.get('errmsg')}")
+                documents_to_insert = [doc for i, doc in enumerate(documents_to_insert) if i not in rejected]
+                inserted_ids = [doc["_id"] for doc in documents_to_insert]
             except Exception as e:
                 logger.error(f"Error inserting documents: {str(e)}")
                 errors.append(f"Database insertion error: {str(e)}")
-        
-        # Process PDFs after successful upload with document mappings
+            
+            # Create mapping between unique_filename and document ID
+            for i, doc in enumerate(documents_to_insert):
+                if i < len(inserted_ids):
+                    document_mappings[doc['unique_filename']] = str(inserted_ids[i])
+            
+            logger.info(f"Inserted {len(inserted_ids)} documents into database")
+            logger.info(f"Created document mappings: {document_mappings}")
+        
+        # Resolve duplicates to the IDs of the documents that already hold their content
+        duplicate_ids = []
+        if duplicate_hashes:
+            async for doc in db.documents.find(
+                {"organizationId": organizationId, "sha256": {"$in": duplicate_hashes}}, {"_id": 1, "sha256": 1}
+            ):
+                duplicate_ids.append(str(doc["_id"]))
+            logger.info(f"Skipped {len(duplicate_hashes)} duplicate files for organization {organizationId}")
+        
+        # Queue PDF processing in the background with document mappings
         processing_result = ProcessingResult(
             status="skipped",
             message="No files to process",
             chunks_processed=0,
-            documents_loaded=0
+            documents_loaded=0,
+            documents_deduplicated=len(duplicate_hashes)
         )
+        if duplicate_hashes and not document_mappings:
+            processing_result.status = "deduplicated"
+            processing_result.message = "All files were already uploaded"
+        job_id = None
         
-        if documents_to_insert and document_mappings:
+        if document_mappings:
             try:
-                process_start_time = time.time()
-                # Pass document mappings to the processing function
-                processing_response = process_all_pdfs(organizationId, document_mappings)
-                processing_time = time.time() - process_start_time
-                
+                job_id = await ingest_queue.submit(organizationId, document_mappings, staging_dir)
+                # Cached answers and results may not reflect the new documents, ingestion invalidates them again once done
+                invalidate_org_caches(organizationId)
                 processing_result = ProcessingResult(
-                    status=processing_response.get("status", "unknown"),
-                    message=processing_response.get("message", "Processing completed"),
-                    chunks_processed=processing_response.get("chunks_processed", 0),
-                    documents_loaded=processing_response.get("documents_loaded", 0),
-                    processing_time=processing_time
+                    status="queued",
+                    message=f"Processing queued as job {job_id}",
+                    chunks_processed=0,
+                    documents_loaded=0,
+                    documents_deduplicated=len(duplicate_hashes)
                 )
                 
-                logger.info(f"PDF processing completed for organization {organizationId}")
-                
             except Exception as e:
-                logger.error(f"Error processing PDFs: {str(e)}")
+                logger.error(f"Error queueing PDF processing: {str(e)}")
                 processing_result = ProcessingResult(
                     status="failed",
                     message=f"PDF processing failed: {str(e)}",
@@ -146,15 +211,17 @@ async def upload_files(
         
         # Create response
         response = DocumentUploadResponse(
-            success=len(documents_to_insert) > 0,
-            files_uploaded=len(documents_to_insert),
+            success=len(document_mappings) > 0 or len(duplicate_ids) > 0,
+            files_uploaded=len(document_mappings),
             processing_result=processing_result,
-            document_ids=[str(id) for id in inserted_ids] if inserted_ids else [],
+            document_ids=list(document_mappings.values()),
+            duplicate_document_ids=duplicate_ids,
+            job_id=job_id,
             upload_time=upload_time,
             errors=errors if errors else []
         )
         
-        logger.info(f"Upload completed: {len(documents_to_insert)} files uploaded, {len(errors)} errors")
+        logger.info(f"Upload completed: {len(document_mappings)} files uploaded, {len(duplicate_hashes)} duplicates, {len(errors)} errors")
         return response
 
     except Exception as e:
@@ -175,6 +242,21 @@ async def upload_files(
             upload_time=time.time() - upload_start_time,
             errors=[str(e)]
         )
+    finally:
+        # Once queued, the staged files belong to the ingestion job, which removes them when done
+        if staging_dir is not None and job_id is None:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+async def getIngestJob(jobId: str, db: AsyncDatabase) -> IngestJobOutput:
+    """Get the status, progress and timings of a background ingestion job."""
+    if not ObjectId.is_valid(jobId):
+        raise BadRequestException("Invalid job ID format")
+    
+    job = await db.ingestJobs.find_one({"_id": ObjectId(jobId)})
+    if not job:
+        raise NotFoundException("Ingestion job not found")
+    
+    return IngestJobOutput.model_validate({**job, "_id": str(job["_id"])})
 
 async def getDocsByOrgId(orgId: str, db: AsyncDatabase) -> List[DocOutput]:
     """Get all documents for an organization."""
@@ -267,12 +349,11 @@ async def deleteDocuments(documentIds: List[str], db: AsyncDatabase) -> Document
         deleted_embeddings_count = 0
         
         try:
-            vectorstore = get_vectorstore()
-            
-            # Delete embeddings based on document IDs
+            # Delete embeddings based on document IDs, within each organization's namespace
             for doc in documents_to_delete:
                 doc_id_str = str(doc['_id'])
                 try:
+                    vectorstore = get_vectorstore(namespace=org_namespace(doc.get('organizationId')))
                     # Delete vectors by metadata filter
                     # Note: This depends on your vectorstore implementation
                     # For Pinecone, we need to delete by IDs that contain the documentId
@@ -283,6 +364,15 @@ async def deleteDocuments(documentIds: List[str], db: AsyncDatabase) -> Document
                     error_msg = f"Failed to delete embeddings for document {doc_id_str}: {str(e)}"
                     vectorstore_deletion_errors.append(error_msg)
                     logger.error(error_msg)
+                # Keep the keyword index in step with the vectors
+                if settings.HYBRID_SEARCH_ENABLED and doc.get('organizationId'):
+                    try:
+                        removed = get_lexical_index(doc['organizationId']).delete(doc_id_str)
+                        logger.info(f"Deleted {removed} keyword index chunks for document ID: {doc_id_str}")
+                    except Exception as e:
+                        error_msg = f"Failed to delete keyword index entries for document {doc_id_str}: {str(e)}"
+                        vectorstore_deletion_errors.append(error_msg)
+                        logger.error(error_msg)
         
         except Exception as e:
             error_msg = f"Failed to connect to vectorstore: {str(e)}"
@@ -293,6 +383,10 @@ async def deleteDocuments(documentIds: List[str], db: AsyncDatabase) -> Document
         mongodb_deletion_result = await db.documents.delete_many({"_id": {"$in": object_ids}})
         deleted_from_mongodb = mongodb_deletion_result.deleted_count
         
+        # Cached answers and results may cite the deleted documents
+        for org_id in {doc.get('organizationId') for doc in documents_to_delete if doc.get('organizationId')}:
+            invalidate_org_caches(org_id)
+        
         logger.info(f"Deleted {deleted_from_mongodb} documents from MongoDB")
         
         # Step 5: Prepare response summary
@@ -1,15 +1,24 @@
 
-from typing import List
-from schema import ChatHistoryCreate,ChatHistoryResponse, ChatMessage ,QueryResponse, SearchBase 
+import time
+from collections import defaultdict
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+from schema import ChatHistoryCreate,ChatHistoryResponse, ChatHistoryPage, ChatMessage ,ChatQueryResponse, QueryResponse, QuerySource, SearchBase, QueryStreamDone, QueryStreamTimings, QueryTimings, AnswerCacheStats, RetrievalCacheStats, QueryCacheStats
 from fastapi import HTTPException
 from db import get_database
-from core import DatabaseConnectionException, BadRequestException, settings
+from core import AppBaseException, DatabaseConnectionException, BadRequestException, ForbiddenException, NotFoundException, settings, logger
 from pymongo.asynchronous.database import AsyncDatabase
+import numpy as np
 from datetime import datetime, timezone
-from utils import  get_vectorstore
+from bson import ObjectId
+from utils import  get_vectorstore, fetch_vectors, org_namespace, build_context, Context, get_lexical_index, context_builder
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_openai import ChatOpenAI
-from langchain.schema import HumanMessage, AIMessage, BaseMessage
+from langchain.schema import HumanMessage, AIMessage, BaseMessage, Document
+from services.query_executor import run_blocking
+from services.answer_cache import answer_cache, CachedAnswer
+from services.retrieval_cache import retrieval_cache
+from services.reranker import Reranker, get_reranker
+from services.llm_client import get_chat_model
+from services.chat_writer import chat_writer
 
 
 
@@ -17,7 +26,221 @@ from langchain.schema import HumanMessage, AIMessage, BaseMessage
 
 
 
-async def query_doc(search_text: str, org_id: str, db: AsyncDatabase):
+# Compiled once, every query only fills it in
+_ANSWER_PROMPT = ChatPromptTemplate.from_messages([
+    ('system', 'You are a helpful assistant.'),
+    ('human', 'Given the following context, please answer the question from given context only. If context is insufficient then say I do not know \n\nContext:\n{context}\n\nQuestion: {question}')
+])
+
+_CONDENSE_PROMPT = ChatPromptTemplate.from_messages([
+    ('system', 'Rewrite the last question of the user as a standalone question that can be understood without the conversation. Keep names, codes and numbers exactly as written. Only return the question.\n\nSummary of the earlier conversation:\n{summary}'),
+    MessagesPlaceholder('history'),
+    ('human', 'Question: {question}')
+])
+
+_SUMMARY_PROMPT = ChatPromptTemplate.from_messages([
+    ('system', 'You keep a running summary of a conversation between a user and an assistant about the user\'s documents. Extend the summary with the new messages in at most {words} words, keeping topics, names, codes and open questions. Only return the summary.'),
+    ('human', 'Current summary:\n{summary}\n\nNew messages:\n{messages}')
+])
+
+
+def _retrieve(
+    search_text: str,
+    org_id: str,
+    k: int = 5,
+    document_id: Optional[str] = None,
+    min_score: float = 0.0
+) -> List[Tuple[Document, float]]:
+    """
+    Embed the query and search the organization's vectors, optionally only one
+    document's. With hybrid search on, the organization's keyword index is
+    searched too and both rankings are fused. Returns up to k (chunk,
+    similarity) pairs scoring at least min_score, best first. Blocking, run
+    it through run_blocking.
+    """
+    # Search the organization's own namespace, or filter the shared one by organization
+    namespace = org_namespace(org_id)
+    vector_store = get_vectorstore(namespace=namespace)
+    search_filter: Dict[str, Any] = {}
+    if namespace is None:
+        search_filter["orgId"] = org_id
+    if document_id:
+        search_filter["documentId"] = document_id
+    # Fusion needs deeper rankings than the k chunks finally returned
+    candidates = max(k, settings.HYBRID_CANDIDATES) if settings.HYBRID_SEARCH_ENABLED else k
+    search_kwargs: Dict[str, Any] = {"k": candidates}
+    if search_filter:
+        search_kwargs["filter"] = search_filter
+    query_vector = vector_store.embeddings.embed_query(search_text)
+    
+    if not settings.RETRIEVAL_CACHE_ENABLED:
+        scored = vector_store.similarity_search_by_vector_with_score(query_vector, **search_kwargs)
+    else:
+        # Repeated searches reuse the results of the last identical one until the organization's documents change
+        key = retrieval_cache.key(org_id, query_vector, candidates, search_filter)
+        scored = retrieval_cache.get(key)
+        if scored is None:
+            scored = vector_store.similarity_search_by_vector_with_score(query_vector, **search_kwargs)
+            retrieval_cache.put(key, scored)
+    
+    if settings.HYBRID_SEARCH_ENABLED:
+        keyword_hits = get_lexical_index(org_id).search(search_text, candidates, document_id)
+        scored = _fuse(scored, keyword_hits, k, query_vector, namespace)
+    return [(doc, score) for doc, score in scored[:k] if score >= min_score]
+
+
+def _fuse(
+    vector_hits: List[Tuple[Document, float]],
+    keyword_hits: List[Tuple[Document, float]],
+    k: int,
+    query_vector: List[float],
+    namespace: Optional[str] = None
+) -> List[Tuple[Document, float]]:
+    """
+    Reciprocal rank fusion of vector and keyword results, keeping the top k.
+    
+    Every chunk keeps its vector similarity as its score, so confidence and
+    min_score mean the same with and without hybrid search. Chunks found only
+    by keyword have their stored vectors fetched to compute it.
+    """
+    fused: Dict[str, float] = defaultdict(float)
+    docs: Dict[str, Document] = {}
+    similarity: Dict[str, float] = {}
+    for rank, (doc, score) in enumerate(vector_hits):
+        key = doc.id or doc.page_content
+        fused[key] += 1.0 / (settings.HYBRID_RRF_K + rank + 1)
+        docs[key] = doc
+        similarity[key] = score
+    for rank, (doc, _) in enumerate(keyword_hits):
+        fused[doc.id] += 1.0 / (settings.HYBRID_RRF_K + rank + 1)
+        docs.setdefault(doc.id, doc)
+    top = sorted(fused, key=lambda key: -fused[key])[:k]
+    
+    keyword_only = [key for key in top if key not in similarity]
+    if keyword_only:
+        vectors = fetch_vectors(keyword_only, namespace)
+        query = np.asarray(query_vector, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        for key in keyword_only:
+            vector = np.asarray(vectors.get(key, ()), dtype=np.float32)
+            norm = np.linalg.norm(vector) if vector.size else 0.0
+            similarity[key] = float(query @ vector / norm) if norm else 0.0
+    return [(docs[key], similarity[key]) for key in top]
+
+
+def _build_prompt(search_text: str, scored: List[Tuple[Document, float]]) -> Tuple[Any, List[str], Context]:
+    """Build the answer prompt from the retrieved chunks and collect the IDs of the documents it uses."""
+    # Drop the overlap between neighbouring chunks and keep the context within the token budget
+    context = build_context(scored)
+    document_ids = []
+    
+    for doc, _ in context.chunks:
+        # Extract only document ID from metadata (sources removed)
+        doc_id = doc.metadata.get('documentId')
+        if doc_id and doc_id not in document_ids:
+            document_ids.append(doc_id)
+            
+        logger.debug(f"Retrieved chunk metadata: {doc.metadata}")
+    
+    logger.info(
+        f"Query context: {len(context.chunks)} of {len(scored)} chunks, {context.tokens} tokens, "
+        f"{context.tokens_saved} tokens saved"
+    )
+    
+    # Build prompt with context
+    prompt = _ANSWER_PROMPT.invoke({
+        'question': search_text,
+        'context': context.text,
+    })
+    return prompt, document_ids, context
+
+
+def _answer_scope(limit: int, document_id: Optional[str], min_score: float, reranker: str = "none") -> str:
+    """Retrieval options that change the answer, so answers are only shared between identical ones."""
+    return f"k={limit};documentId={document_id or ''};minScore={min_score};rerank={reranker}"
+
+
+async def _retrieve_ranked(
+    search_text: str,
+    org_id: str,
+    limit: int,
+    document_id: Optional[str],
+    min_score: float,
+    reranker: Reranker
+) -> Tuple[List[Tuple[Document, float]], float, float]:
+    """
+    Retrieve the query's chunks in the query pool, over-fetching
+    settings.RERANK_CANDIDATES for the reranker to cut down to limit.
+    Returns the chunks and the seconds spent retrieving and reranking.
+    """
+    started = time.perf_counter()
+    if reranker.name == "none":
+        scored = await run_blocking(_retrieve, search_text, org_id, limit, document_id, min_score)
+        return scored, time.perf_counter() - started, 0.0
+    candidates = await run_blocking(
+        _retrieve, search_text, org_id, max(limit, settings.RERANK_CANDIDATES), document_id, min_score
+    )
+    retrieved = time.perf_counter()
+    scored = await run_blocking(reranker.rerank, search_text, candidates, limit, org_namespace(org_id))
+    return scored, retrieved - started, time.perf_counter() - retrieved
+
+
+async def _lookup_answer(org_id: str, search_text: str, scope: str) -> Tuple[Optional[CachedAnswer], Optional[Any]]:
+    """Look the question up in the answer cache, returning the answer and the question embedding if computed."""
+    if not settings.ANSWER_CACHE_ENABLED:
+        return None, None
+    return await run_blocking(answer_cache.lookup, org_id, search_text, scope)
+
+
+async def _store_answer(
+    org_id: str,
+    search_text: str,
+    scope: str,
+    answer: str,
+    sources: List[QuerySource],
+    confidence: float,
+    latency: float,
+    generation: int,
+    question_vector: Optional[Any] = None
+) -> None:
+    """Cache a generated answer, never failing the query if that does not work."""
+    if not settings.ANSWER_CACHE_ENABLED:
+        return
+    try:
+        await run_blocking(
+            answer_cache.store, org_id, search_text, answer, [source.documentId for source in sources], confidence,
+            latency, generation, question_vector, scope=scope, sources=[source.model_dump() for source in sources]
+        )
+    except Exception as e:
+        logger.warning(f"Failed to cache answer for organization {org_id}: {str(e)}")
+
+
+def _sources(scored: List[Tuple[Document, float]]) -> List[QuerySource]:
+    """Best similarity score of each retrieved document, in order of first appearance."""
+    best: Dict[str, float] = {}
+    for doc, score in scored:
+        doc_id = doc.metadata.get('documentId')
+        if doc_id and (doc_id not in best or score > best[doc_id]):
+            best[doc_id] = score
+    return [QuerySource(documentId=doc_id, score=score) for doc_id, score in best.items()]
+
+
+def _confidence(scored: List[Tuple[Document, float]]) -> float:
+    """Mean similarity of the chunks the answer is based on, clipped to [0, 1]."""
+    if not scored:
+        return 0.0
+    return min(max(sum(score for _, score in scored) / len(scored), 0.0), 1.0)
+
+
+async def query_doc(
+    search_text: str,
+    org_id: str,
+    db: AsyncDatabase,
+    limit: int = 5,
+    document_id: Optional[str] = None,
+    min_score: Optional[float] = None,
+    rerank: bool = True
+):
     """
     Query documents using RAG pipeline with organization filtering.
     
@@ -25,27 +248,41 @@ async def query_doc(search_text: str, org_id: str, db: AsyncDatabase):
         search_text: The user's search query
         org_id: Organization ID for filtering
         db: Database connection
+        limit: Maximum number of chunks to retrieve
+        document_id: Optional document to restrict the search to
+        min_score: Minimum similarity of retrieved chunks, settings.QUERY_MIN_SCORE if not given
+        rerank: Whether to rerank over-fetched chunks with settings.RERANKER
         
     Returns:
         QueryResponse containing the response and metadata
     """
     try:
-        print(f"Processing query: '{search_text}' for organization: {org_id}")
+        logger.debug(f"Processing query: '{search_text}' for organization: {org_id}")
+        started = time.perf_counter()
+        min_score = settings.QUERY_MIN_SCORE if min_score is None else min_score
+        reranker = get_reranker() if rerank else get_reranker("none")
+        scope = _answer_scope(limit, document_id, min_score, reranker.name)
         
-        # Get vectorstore and create retriever with org filter
-        vector_store = get_vectorstore()
-        retriever = vector_store.as_retriever(
-            search_kwargs={
-                "k": 5,
-                "filter": {"orgId": org_id}  # Filter by organization
-            }
-        )
+        # Repeated questions are answered from the answer cache
+        generation = answer_cache.generation(org_id)
+        cached, question_vector = await _lookup_answer(org_id, search_text, scope)
+        if cached is not None:
+            return QueryResponse(
+                query=search_text,
+                answer=cached.answer,
+                document_ids=cached.document_ids,
+                sources=cached.sources,
+                confidence=cached.confidence,
+                cached=True
+            )
         
-        # Retrieve relevant documents
-        docs = retriever.invoke(search_text)
+        # Retrieve relevant documents; embedding and vector search block, so they run in the query pool
+        scored, retrieval_seconds, rerank_seconds = await _retrieve_ranked(
+            search_text, org_id, limit, document_id, min_score, reranker
+        )
         
-        if not docs:
-            print(f"No documents found for query: '{search_text}' in organization: {org_id}")
+        if not scored:
+            logger.debug(f"No documents found for query: '{search_text}' in organization: {org_id}")
             return QueryResponse(
                 query=search_text,
                 answer="I couldn't find any relevant information in your documents for this query.",
@@ -53,102 +290,538 @@ async def query_doc(search_text: str, org_id: str, db: AsyncDatabase):
                 confidence=0.0
             )
         
-        # Prepare context from retrieved documents and collect document IDs
-        context_parts = []
-        document_ids = []
-        
-        for doc in docs:
-            context_parts.append(doc.page_content)
-            
-            # Extract only document ID from metadata (sources removed)
-            doc_id = doc.metadata.get('documentId')
-            if doc_id and doc_id not in document_ids:
-                document_ids.append(doc_id)
-                
-            print(f"Retrieved chunk metadata: {doc.metadata}")
-        
-        context = "\n\n".join(context_parts)
-        
-        # Step 3: Build prompt with context
-        chat_template = ChatPromptTemplate.from_messages([
-            ('system', 'You are a helpful assistant.'),
-            ('human', 'Given the following context, please answer the question from given context only. If context is insufficient then say I do not know \n\nContext:\n{context}\n\nQuestion: {question}')
-        ])
-        
-        prompt = chat_template.invoke({
-            'question': search_text,
-            'context': context,
-        })
+        stage = time.perf_counter()
+        prompt, document_ids, context = _build_prompt(search_text, scored)
+        prompt_seconds = time.perf_counter() - stage
 
         # Step 4: Invoke the model
-        llm = ChatOpenAI(model_name="gpt-4o-mini", api_key=settings.OPENAI_API_KEY)
-        response = llm.invoke(prompt)
+        stage = time.perf_counter()
+        response = await get_chat_model().ainvoke(prompt)
+        llm_seconds = time.perf_counter() - stage
 
-        print(f"Generated response for query: '{search_text}' using {len(document_ids)} documents")
-        print("LLM response:", response.content)
+        logger.debug(f"Generated response for query: '{search_text}' using {len(document_ids)} documents")
+        logger.debug(f"LLM response: {response.content}")
+        
+        sources = _sources(context.chunks)
+        confidence = _confidence(context.chunks)
+        await _store_answer(
+            org_id, search_text, scope, response.content, sources, confidence,
+            time.perf_counter() - started, generation, question_vector
+        )
         
         return QueryResponse(
             query=search_text,
             answer=response.content,
             document_ids=document_ids,  # Include document IDs in response
-            confidence=min(len(docs) * 0.2, 1.0)  # Simple confidence scoring
+            sources=sources,
+            confidence=confidence,
+            context_tokens=context.tokens,
+            context_tokens_saved=context.tokens_saved,
+            timings=QueryTimings(
+                retrieval_ms=retrieval_seconds * 1000,
+                rerank_ms=rerank_seconds * 1000,
+                prompt_ms=prompt_seconds * 1000,
+                llm_ms=llm_seconds * 1000,
+                total_ms=(time.perf_counter() - started) * 1000
+            )
         )
         
     except Exception as e:
         raise BadRequestException(f"Error in fetching data for query {e}")
 
-async def save_chat_history(payload:ChatHistoryCreate) -> ChatHistoryResponse:
+
+async def stream_query_doc(
+    search_text: str,
+    org_id: str,
+    db: AsyncDatabase,
+    limit: int = 5,
+    document_id: Optional[str] = None,
+    min_score: Optional[float] = None,
+    rerank: bool = True
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Query documents like query_doc, but yield the answer while it is generated.
+    
+    Yields (event, data) pairs: "sources" with the document IDs and their scores
+    as soon as retrieval finishes, one "token" per piece of the answer streamed
+    by the LLM, then "done" carrying a QueryStreamDone. An error after the stream
+    has started can no longer change the status code, so it ends the
+    stream as an "error" event instead.
+    """
+    started = time.perf_counter()
+    try:
+        min_score = settings.QUERY_MIN_SCORE if min_score is None else min_score
+        reranker = get_reranker() if rerank else get_reranker("none")
+        scope = _answer_scope(limit, document_id, min_score, reranker.name)
+        generation = answer_cache.generation(org_id)
+        cached, question_vector = await _lookup_answer(org_id, search_text, scope)
+        if cached is not None:
+            yield "sources", {"document_ids": cached.document_ids, "sources": cached.sources}
+            yield "token", {"text": cached.answer}
+            elapsed = (time.perf_counter() - started) * 1000
+            done = QueryStreamDone(
+                confidence=cached.confidence,
+                timings=QueryStreamTimings(retrieval_ms=elapsed, first_token_ms=elapsed, total_ms=elapsed),
+                cached=True
+            )
+            yield "done", done.model_dump()
+            return
+        
+        scored, retrieval_seconds, rerank_seconds = await _retrieve_ranked(
+            search_text, org_id, limit, document_id, min_score, reranker
+        )
+        first_token = None
+        context = None
+        prompt_seconds = 0.0
+        
+        if not scored:
+            yield "sources", {"document_ids": [], "sources": []}
+            yield "token", {"text": "I couldn't find any relevant information in your documents for this query."}
+            confidence = 0.0
+        else:
+            stage = time.perf_counter()
+            prompt, document_ids, context = _build_prompt(search_text, scored)
+            prompt_seconds = time.perf_counter() - stage
+            sources = _sources(context.chunks)
+            yield "sources", {"document_ids": document_ids, "sources": [source.model_dump() for source in sources]}
+            
+            answer_parts = []
+            async for chunk in get_chat_model().astream(prompt):
+                if not chunk.content:
+                    continue
+                if first_token is None:
+                    first_token = time.perf_counter()
+                answer_parts.append(chunk.content)
+                yield "token", {"text": chunk.content}
+            confidence = _confidence(context.chunks)
+            await _store_answer(
+                org_id, search_text, scope, "".join(answer_parts), sources, confidence,
+                time.perf_counter() - started, generation, question_vector
+            )
+        
+        done = QueryStreamDone(
+            confidence=confidence,
+            timings=QueryStreamTimings(
+                retrieval_ms=retrieval_seconds * 1000,
+                rerank_ms=rerank_seconds * 1000,
+                prompt_ms=prompt_seconds * 1000,
+                first_token_ms=(first_token - started) * 1000 if first_token else None,
+                total_ms=(time.perf_counter() - started) * 1000
+            ),
+            context_tokens=context.tokens if context else None,
+            context_tokens_saved=context.tokens_saved if context else None
+        )
+        yield "done", done.model_dump()
+    except Exception as e:
+        yield "error", {"message": f"Error in fetching data for query {e}"}
+
+
+def getQueryCacheStats() -> QueryCacheStats:
+    """Hit rates and savings of the query caches of this worker process."""
+    return QueryCacheStats(
+        answers=AnswerCacheStats(**answer_cache.stats()),
+        retrieval=RetrievalCacheStats(**retrieval_cache.stats())
+    )
+
+async def save_chat_history(payload:ChatHistoryCreate) -> None:
+    """
+    Append messages to a session's chat history.
+
+    Every message is its own chatMessages document, ordered by its _id within
+    the session, so an append never rewrites the earlier messages and a long
+    session cannot grow into the document size limit. The session's chatHistory
+    document only keeps its owner, state and message count. While the chat
+    history writer runs, the messages are only buffered and written by it in
+    bulk with other sessions' messages.
+    """
     try:
+        if settings.CHAT_WRITE_BEHIND and chat_writer.running:
+            await chat_writer.submit(payload)
+            return
         db = get_database()
         if db is None:
             raise DatabaseConnectionException(f"Database not connected")
         now = datetime.now(timezone.utc)
-        result = await db.chatHistory.find_one_and_update(
+        if payload.messages:
+            # ObjectIds are increasing within a process, so they keep the messages in order
+            await db.chatMessages.insert_many([
+                {"_id": ObjectId(), "sessionId": payload.sessionId, **msg.model_dump(exclude={"id"})}
+                for msg in payload.messages
+            ])
+        await db.chatHistory.update_one(
             {"sessionId": payload.sessionId},
-                {
-                "$push": {
-                    "messages": {
-                        "$each": [msg.dict() for msg in payload.messages]  # ✅ Each dict is pushed individually
-                    },
-                },
+            {
                 "$setOnInsert": {
                     "userId": payload.userId,
                     "orgId": payload.orgId,
-                    "isActive":payload.isActive,
+                    "isActive": payload.isActive,
                     "createdAt": now
                 },
-                "$set": {   
-                    "updatedAt": now
-                }
+                "$set": {"updatedAt": now},
+                "$inc": {"messageCount": len(payload.messages)}
             },
-            upsert=True,
-            return_document=True
+            upsert=True
         )
-
-        # doc = await db.chatHistory.find_one({"sessionId": payload.sessionId})
-        
-        # history = ChatHistoryResponse.model_validate({**doc, "id": str(doc["_id"])}),
-        # return ChatHistoryResponse(
-        #     sessionId=doc["sessionId"],
-        #     userId=doc["userId"],
-        #     orgId=doc["orgId"],
-        #     messages=[ChatMessage(**msg) for msg in doc["messages"]],
-        #     createdAt=doc["createdAt"],
-        #     updatedAt=doc["updatedAt"]
-        # )
     except Exception as e:  
         raise HTTPException(status_code=500,detail=f"Failed to save user chat history: {e}",)
-    
 
-async def get_chat_history(session_id: str) -> List[BaseMessage]:
+
+async def _newest_first(cursor, pending: List[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+    """Stored messages read newest first, with the writer's pending ones merged in."""
+    pending = sorted(pending, key=lambda msg: msg["_id"], reverse=True)
+    i = 0
+    async for msg in cursor:
+        while i < len(pending) and pending[i]["_id"] > msg["_id"]:
+            yield pending[i]
+            i += 1
+        # A message being flushed may already be stored
+        if i < len(pending) and pending[i]["_id"] == msg["_id"]:
+            i += 1
+        yield msg
+    for msg in pending[i:]:
+        yield msg
+
+
+async def _latest_messages(
+    db: AsyncDatabase,
+    session_id: str,
+    limit: int,
+    max_tokens: Optional[int] = None,
+    before: Optional[str] = None,
+    after: Optional[ObjectId] = None
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Up to limit of a session's newest messages (older than the message before,
+    newer than the message after, if given) whose content fits in max_tokens,
+    oldest first. Only the messages
+    returned are read, through the (sessionId, _id) index, and messages the
+    chat history writer has not written yet are included. Also returns
+    whether older messages are left.
+    """
+    query: Dict[str, Any] = {"sessionId": session_id}
+    pending = chat_writer.pending(session_id)
+    if before:
+        query["_id"] = {"$lt": ObjectId(before)}
+        pending = [msg for msg in pending if msg["_id"] < ObjectId(before)]
+    if after:
+        query.setdefault("_id", {})["$gt"] = after
+        pending = [msg for msg in pending if msg["_id"] > after]
+    # One extra message tells whether there are older ones
+    cursor = db.chatMessages.find(query).sort("_id", -1).limit(limit + 1)
+    messages: List[Dict[str, Any]] = []
+    tokens = 0
+    more = False
+    try:
+        async for msg in _newest_first(cursor, pending):
+            if len(messages) == limit:
+                more = True
+                break
+            if max_tokens is not None:
+                tokens += context_builder.count_chat_tokens(msg.get("content", ""))
+                if tokens > max_tokens:
+                    more = True
+                    break
+            messages.append(msg)
+    finally:
+        await cursor.close()
+    messages.reverse()
+    return messages, more
+
+
+async def _oldest_messages(
+    db: AsyncDatabase,
+    session_id: str,
+    after: Optional[ObjectId],
+    include: Callable[[Dict[str, Any]], bool]
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    A session's messages newer than the message after, oldest first, for as
+    long as include holds. They are read a page of
+    settings.CHAT_HISTORY_MAX_PAGE_SIZE at a time through the (sessionId, _id)
+    index, with the messages the chat history writer has not written yet.
+    """
+    while True:
+        query: Dict[str, Any] = {"sessionId": session_id}
+        pending = chat_writer.pending(session_id)
+        if after is not None:
+            query["_id"] = {"$gt": after}
+            pending = [msg for msg in pending if msg["_id"] > after]
+        cursor = db.chatMessages.find(query).sort("_id", 1).limit(settings.CHAT_HISTORY_MAX_PAGE_SIZE)
+        try:
+            stored = [msg async for msg in cursor]
+        finally:
+            await cursor.close()
+        # A message being flushed may already be stored
+        page = sorted({msg["_id"]: msg for msg in stored + pending}.values(), key=lambda msg: msg["_id"])
+        page = page[:settings.CHAT_HISTORY_MAX_PAGE_SIZE]
+        for msg in page:
+            if not include(msg):
+                return
+            yield msg
+        if len(page) < settings.CHAT_HISTORY_MAX_PAGE_SIZE:
+            return
+        after = page[-1]["_id"]
+
+
+async def get_chat_history(
+    session_id: str,
+    limit: Optional[int] = None,
+    max_tokens: Optional[int] = None
+) -> List[BaseMessage]:
+    """
+    The tail of a session's chat history as LangChain messages, oldest first:
+    the last limit messages (settings.CHAT_HISTORY_MESSAGES by default), cut
+    further to the newest ones within max_tokens if given.
+    """
     db = get_database()
-    doc = await db.chatHistory.find_one({"sessionId": session_id})
-    
+    docs, _ = await _latest_messages(db, session_id, limit or settings.CHAT_HISTORY_MESSAGES, max_tokens)
+    return _as_messages(docs)
+
+
+def _as_messages(docs: List[Dict[str, Any]]) -> List[BaseMessage]:
     messages = []
-    if doc and "messages" in doc:
-        for msg in doc["messages"]:
-            if msg["role"] in ("user", "human"):
-                messages.append(HumanMessage(content=msg["message"]))
-            elif msg["role"] in ("ai", "assistant"):
-                messages.append(AIMessage(content=msg["message"]))
-    return messages
\ No newline at end of file
+    for msg in docs:
+        if msg["role"] in ("user", "human"):
+            messages.append(HumanMessage(content=msg["content"]))
+        elif msg["role"] in ("ai", "assistant"):
+            messages.append(AIMessage(content=msg["content"]))
+    return messages
+
+
+async def getChatHistoryPage(
+    session_id: str,
+    db: AsyncDatabase,
+    org_id: Optional[str],
+    user_id: Optional[str],
+    is_admin: bool = False,
+    limit: Optional[int] = None,
+    before: Optional[str] = None
+) -> ChatHistoryPage:
+    """
+    One page of a session's chat history, newest page first. The page's before
+    cursor fetches the page of messages preceding it.
+
+    Only the session's own user, or an admin of the session's organization,
+    may read it.
+    """
+    try:
+        if before and not ObjectId.is_valid(before):
+            raise BadRequestException("before must be a message ID")
+        limit = min(limit or settings.CHAT_HISTORY_PAGE_SIZE, settings.CHAT_HISTORY_MAX_PAGE_SIZE)
+        session = await db.chatHistory.find_one(
+            {"sessionId": session_id}, {"messageCount": 1, "orgId": 1, "userId": 1}
+        )
+        if session is None:
+            raise NotFoundException("Chat session not found")
+        if session.get("orgId") is not None and session["orgId"] != org_id:
+            raise ForbiddenException("Chat session belongs to another organization")
+        if not (is_admin and session.get("orgId") == org_id) and session.get("userId") != user_id:
+            raise ForbiddenException("Chat session belongs to another user")
+        docs, more = await _latest_messages(db, session_id, limit, before=before)
+        return ChatHistoryPage(
+            sessionId=session_id,
+            messages=[
+                ChatMessage(id=str(msg["_id"]), role=msg["role"], content=msg["content"], timestamp=msg.get("timestamp"))
+                for msg in docs
+            ],
+            before=str(docs[0]["_id"]) if docs and more else None,
+            messageCount=session.get("messageCount", 0)
+        )
+    except AppBaseException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching chat history of session {session_id}: {str(e)}")
+        raise BadRequestException(f"Error fetching chat history: {str(e)}")
+
+
+async def _chat_session(
+    db: AsyncDatabase,
+    session_id: str,
+    org_id: str,
+    user_id: str,
+    is_admin: bool = False
+) -> Dict[str, Any]:
+    """
+    The session's stored state, or an empty one for a new session. Only the
+    session's own user, or an admin of its organization, may continue it.
+    """
+    session = await db.chatHistory.find_one(
+        {"sessionId": session_id}, {"orgId": 1, "userId": 1, "summary": 1, "summarizedUntil": 1}
+    )
+    if session is None:
+        return {}
+    if session.get("orgId") not in (None, org_id):
+        raise ForbiddenException("Chat session belongs to another organization")
+    if not (is_admin and session.get("orgId") == org_id) and session.get("userId") != user_id:
+        raise ForbiddenException("Chat session belongs to another user")
+    return session
+
+
+async def _condense_question(
+    search_text: str,
+    summary: str,
+    history: List[Dict[str, Any]]
+) -> str:
+    """Rewrite a follow-up question into one retrieval can use on its own."""
+    if not summary and not history:
+        return search_text
+    prompt = _CONDENSE_PROMPT.invoke({
+        "summary": summary or "(none)",
+        "history": _as_messages(history),
+        "question": search_text
+    })
+    response = await get_chat_model().ainvoke(prompt)
+    return response.content.strip() or search_text
+
+
+async def _fold_chunk(db: AsyncDatabase, session_id: str, state: Dict[str, Any], chunk: List[Dict[str, Any]]) -> bool:
+    """Extend the summary in state with chunk and store it. Returns False if a concurrent fold stored one first."""
+    prompt = _SUMMARY_PROMPT.invoke({
+        "words": settings.CHAT_SUMMARY_WORDS,
+        "summary": state["summary"] or "(none)",
+        "messages": "\n".join(f"{msg['role']}: {msg['content']}" for msg in chunk)
+    })
+    summary = (await get_chat_model().ainvoke(prompt)).content.strip()
+    # A concurrent turn that folded first wins, its summary already covers these messages
+    result = await db.chatHistory.update_one(
+        {"sessionId": session_id, "summarizedUntil": state["until"]},
+        {"$set": {"summary": summary, "summarizedUntil": chunk[-1]["_id"]}}
+    )
+    if not result.matched_count:
+        return False
+    state["summary"], state["until"] = summary, chunk[-1]["_id"]
+    return True
+
+
+async def _fold_history(db: AsyncDatabase, payload: ChatHistoryCreate, session: Dict[str, Any]) -> bool:
+    """
+    Fold the session's oldest unsummarized messages into its rolling summary
+    once the unsummarized ones exceed settings.CHAT_HISTORY_TOKENS, keeping
+    the newest half of that budget verbatim. The messages are read oldest
+    first and folded in chunks of about settings.CHAT_SUMMARY_CHUNK_TOKENS,
+    at most settings.CHAT_SUMMARY_CHUNKS_PER_TURN per turn; a longer backlog,
+    such as a session saved before summaries existed, is folded on through
+    the following turns. Every message is summarized once, in order. Returns
+    whether a fold happened.
+    """
+    until = session.get("summarizedUntil")
+    recent, more = await _latest_messages(
+        db, payload.sessionId, settings.CHAT_HISTORY_MAX_PAGE_SIZE,
+        max_tokens=settings.CHAT_HISTORY_TOKENS, after=until
+    )
+    if not more:
+        return False
+    keep, kept_tokens = 0, 0
+    while keep < len(recent):
+        tokens = context_builder.count_chat_tokens(recent[-keep - 1]["content"])
+        if kept_tokens + tokens > settings.CHAT_HISTORY_TOKENS // 2:
+            break
+        keep += 1
+        kept_tokens += tokens
+    if keep:
+        first_kept = recent[-keep]["_id"]
+        folds = lambda msg: msg["_id"] < first_kept
+    else:
+        # Not even the newest message fits in half the budget, everything read is folded
+        newest = recent[-1]["_id"] if recent else None
+        folds = lambda msg: newest is None or msg["_id"] <= newest
+
+    if session.get("_id") is None:
+        # The session's first messages may still be buffered by the chat history writer
+        await db.chatHistory.update_one(
+            {"sessionId": payload.sessionId},
+            {"$setOnInsert": {
+                "userId": payload.userId,
+                "orgId": payload.orgId,
+                "isActive": payload.isActive,
+                "createdAt": datetime.now(timezone.utc)
+            }},
+            upsert=True
+        )
+    state = {"summary": session.get("summary") or "", "until": until}
+    chunk: List[Dict[str, Any]] = []
+    chunk_tokens = folded = chunks = 0
+    async for msg in _oldest_messages(db, payload.sessionId, until, folds):
+        tokens = context_builder.count_chat_tokens(msg["content"])
+        if chunk and chunk_tokens + tokens > settings.CHAT_SUMMARY_CHUNK_TOKENS:
+            if not await _fold_chunk(db, payload.sessionId, state, chunk):
+                break
+            folded, chunks = folded + len(chunk), chunks + 1
+            chunk, chunk_tokens = [], 0
+            if chunks == settings.CHAT_SUMMARY_CHUNKS_PER_TURN:
+                break
+        chunk.append(msg)
+        chunk_tokens += tokens
+    else:
+        if chunk and await _fold_chunk(db, payload.sessionId, state, chunk):
+            folded += len(chunk)
+    if folded:
+        logger.info(f"Folded {folded} messages of chat session {payload.sessionId} into its summary")
+    return folded > 0
+
+
+async def chat_query_doc(
+    search_text: str,
+    org_id: str,
+    session_id: str,
+    user_id: str,
+    db: AsyncDatabase,
+    limit: int = 5,
+    document_id: Optional[str] = None,
+    min_score: Optional[float] = None,
+    rerank: bool = True,
+    is_admin: bool = False
+) -> ChatQueryResponse:
+    """
+    Answer a question within a chat session, which only its own user or an
+    admin of its organization may continue.
+
+    The session's rolling summary and its newest messages within
+    settings.CHAT_HISTORY_TOKENS condense the question into a standalone one,
+    which is answered by query_doc (and shares its answer cache). The turn is
+    then saved, and messages that fell out of the recent window are folded
+    into the summary, so the history sent per turn stays about the same size
+    however long the session grows.
+    """
+    try:
+        session = await _chat_session(db, session_id, org_id, user_id, is_admin)
+        summary = session.get("summary") or ""
+        history, _ = await _latest_messages(
+            db, session_id, settings.CHAT_HISTORY_MAX_PAGE_SIZE,
+            max_tokens=settings.CHAT_HISTORY_TOKENS, after=session.get("summarizedUntil")
+        )
+        history_tokens = context_builder.count_chat_tokens(summary) + sum(
+            context_builder.count_chat_tokens(msg["content"]) for msg in history
+        )
+        standalone = await _condense_question(search_text, summary, history)
+        response = await query_doc(standalone, org_id, db, limit, document_id, min_score, rerank)
+
+        turn = ChatHistoryCreate(
+            sessionId=session_id,
+            userId=user_id,
+            orgId=org_id,
+            messages=[
+                ChatMessage(role="user", content=search_text, timestamp=datetime.now(timezone.utc).isoformat()),
+                ChatMessage(role="assistant", content=response.answer, timestamp=datetime.now(timezone.utc).isoformat())
+            ]
+        )
+        await save_chat_history(turn)
+        try:
+            summarized = await _fold_history(db, turn, session)
+        except Exception as e:
+            # The unsummarized messages are folded on a later turn
+            summarized = False
+            logger.warning(f"Failed to update the summary of chat session {session_id}: {str(e)}")
+
+        return ChatQueryResponse(
+            **response.model_dump(exclude={"query"}),
+            query=search_text,
+            sessionId=session_id,
+            standalone_query=standalone,
+            history_tokens=history_tokens,
+            summarized=summarized
+        )
+    except AppBaseException:
+        raise
+    except Exception as e:
+        raise BadRequestException(f"Error in fetching data for query {e}")
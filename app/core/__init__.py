@@ -1,12 +1,12 @@
 from .config import settings
-from .exceptions import AppBaseException, UserAlreadyExistsException, NotFoundException,DatabaseConnectionException,DatabaseQueryException,BadRequestException,NotModifiedException, UnauthorizedException
+from .exceptions import AppBaseException, UserAlreadyExistsException, NotFoundException,DatabaseConnectionException,DatabaseQueryException,BadRequestException,NotModifiedException, UnauthorizedException, ForbiddenException, PayloadTooLargeException
 from .exception_handlers import app_base_exception_handler
 from .security import hash_password, verify_password, create_access_token,decode_token
 from .logger import logger
 
 
 
-__all__ = ["settings", "AppBaseException", "UserAlreadyExistsException", "BadRequestException","NotModifiedException","UnauthorizedException",
+__all__ = ["settings", "AppBaseException", "UserAlreadyExistsException", "BadRequestException","NotModifiedException","UnauthorizedException","ForbiddenException","PayloadTooLargeException",
            "NotFoundException","DatabaseConnectionException","DatabaseQueryException",
            "app_base_exception_handler",
            "hash_password", "verify_password","create_access_token","decode_token",
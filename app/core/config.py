@@ -1,8 +1,9 @@
 # config/settings.py
 
+import os
 from pydantic_settings import BaseSettings
 from pydantic import Field, ValidationError
-from typing import Literal, ClassVar
+from typing import Literal, ClassVar, Optional
 
 class Settings(BaseSettings):
     mongodb_uri: str = Field(..., env="MONGODB_URI")
@@ -15,11 +16,124 @@ class Settings(BaseSettings):
     PINECONE_API_KEY:str=Field(..., env="PINECONE_API_KEY")
     PINECONE_ENV:str=Field(..., env="PINECONE_ENV")
     PINECONE_INDEX_NAME:str = "rag-1-langchain-index"
+    PINECONE_POOL_THREADS: int = 4
+
+    # Vector store backend, "local" runs an in-process index for offline use and CI
+    VECTOR_STORE_BACKEND: Literal["pinecone", "local"] = "pinecone"
+    LOCAL_VECTOR_PATH: str = "vector_index"
+    # Keep each organization's vectors in its own Pinecone namespace or local shard instead of filtering on orgId.
+    # Existing vectors stay in the default namespace until scripts/migrate_vector_namespaces.py moves them,
+    # see that script for the rollout order
+    VECTOR_ORG_PARTITIONS: bool = False
+    # "flat" is exact search, "ivf" is approximate: LOCAL_IVF_NPROBE of LOCAL_IVF_LISTS lists are scanned per query
+    LOCAL_VECTOR_INDEX: Literal["flat", "ivf"] = "flat"
+    LOCAL_IVF_LISTS: int = 0  # 0 picks 4 * sqrt(vectors) when the index is trained
+    LOCAL_IVF_NPROBE: int = 8
+    LOCAL_IVF_MIN_VECTORS: int = 10000
     
     EMBEDDING_MODEL: ClassVar[str] = "text-embedding-ada-002"
     CHUNK_OVERLAP: ClassVar[int] = 100
     CHUNK_SIZE: ClassVar[int] = 500
 
+    # Embedding cache
+    EMBEDDING_CACHE_PATH: str = "embedding_cache.sqlite3"
+    EMBEDDING_CACHE_MEMORY_ENTRIES: int = 10000
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 1000000
+
+    # Embedding batching
+    EMBEDDING_BATCH_TOKENS: int = 20000
+    EMBEDDING_BATCH_SIZE: int = 256
+    EMBEDDING_CONCURRENCY: int = 4
+    EMBEDDING_MAX_RETRIES: int = 6
+    # Concurrent query embeddings arriving within this many ms are embedded in one call (0 turns it off)
+    QUERY_EMBEDDING_WINDOW_MS: float = 5.0
+    QUERY_EMBEDDING_BATCH_SIZE: int = 32
+
+    # PDF parsing
+    PDF_PARSE_WORKERS: int = Field(default_factory=lambda: os.cpu_count() or 1)
+    PDF_PAGES_PER_TASK: int = 25
+
+    # Uploads
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024
+    MAX_UPLOAD_FILE_SIZE: int = 200 * 1024 * 1024
+    MAX_UPLOAD_REQUEST_SIZE: int = 1024 * 1024 * 1024
+
+    # Background ingestion
+    INGEST_WORKERS: int = 2
+    INGEST_PROGRESS_INTERVAL: float = 1.0
+    INGEST_PIPELINE_BUFFER: int = 4
+    INGEST_STORE_BATCH: int = 256
+    # Seconds shutdown waits for running ingestions to stop after their current batch
+    INGEST_STOP_TIMEOUT: float = 30.0
+    # A running job whose owner sent no heartbeat for this many seconds is queued again at startup
+    INGEST_JOB_LEASE: float = 300.0
+    # Seconds the ingestion thread waits for a chunk hash lookup or write on the event loop
+    INGEST_DB_TIMEOUT: float = 30.0
+
+    # Chat model, one pooled client per process (None leaves the temperature and base URL at their defaults)
+    CHAT_MODEL: str = "gpt-4o-mini"
+    CHAT_TEMPERATURE: Optional[float] = None
+    OPENAI_BASE_URL: Optional[str] = None
+    CHAT_TIMEOUT: float = 60.0
+    CHAT_CONNECT_TIMEOUT: float = 5.0
+    CHAT_MAX_RETRIES: int = 2
+    CHAT_MAX_CONNECTIONS: int = 100
+    CHAT_KEEPALIVE_CONNECTIONS: int = 20
+    CHAT_KEEPALIVE_EXPIRY: float = 60.0
+
+    # Queries, threads for the blocking embedding and vector search calls
+    QUERY_THREADS: int = 32
+    # Retrieved chunks less similar to the query than this are left out of the prompt
+    QUERY_MIN_SCORE: float = 0.0
+    # Token budget of the retrieved context in the answer prompt
+    QUERY_CONTEXT_TOKENS: int = 3000
+
+    # Chat history, read back a window or page of the newest messages at a time
+    CHAT_HISTORY_MESSAGES: int = 20
+    CHAT_HISTORY_PAGE_SIZE: int = 50
+    CHAT_HISTORY_MAX_PAGE_SIZE: int = 200
+    # Conversational queries send at most this many tokens of recent messages, older ones are folded
+    # into a rolling summary of about CHAT_SUMMARY_WORDS words
+    CHAT_HISTORY_TOKENS: int = 1000
+    CHAT_SUMMARY_WORDS: int = 200
+    # Messages are folded oldest first, this many tokens per summary call and at most this many calls per turn
+    CHAT_SUMMARY_CHUNK_TOKENS: int = 4000
+    CHAT_SUMMARY_CHUNKS_PER_TURN: int = 4
+    # Write-behind of chat messages, flushed in bulk every CHAT_FLUSH_INTERVAL seconds or CHAT_FLUSH_MESSAGES messages
+    CHAT_WRITE_BEHIND: bool = True
+    CHAT_FLUSH_INTERVAL: float = 0.2
+    CHAT_FLUSH_MESSAGES: int = 500
+    # Messages buffered at most, saving waits for a flush past that
+    CHAT_BUFFER_MESSAGES: int = 5000
+
+    # Hybrid search, vector results fused with a per-organization BM25 index by reciprocal rank fusion
+    HYBRID_SEARCH_ENABLED: bool = True
+    LEXICAL_INDEX_PATH: str = "lexical_index"
+    # Candidates taken from each retriever before fusing (at least the query's k)
+    HYBRID_CANDIDATES: int = 20
+    HYBRID_RRF_K: int = 60
+
+    # Reranking, RERANK_CANDIDATES chunks are retrieved and reranked down to the query's k ("none" turns it off)
+    RERANKER: Literal["none", "lexical", "mmr", "cross-encoder"] = "lexical"
+    RERANK_CANDIDATES: int = 30
+    RERANK_LEXICAL_WEIGHT: float = 0.3
+    RERANK_MMR_LAMBDA: float = 0.7
+    # Needs the sentence-transformers package, lexical overlap is used when it cannot be loaded
+    RERANK_CROSS_ENCODER_MODEL: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+    # Answer cache, by default only the same normalized question shares an answer. Setting ANSWER_CACHE_SIMILARITY
+    # above 0 also reuses answers of questions whose embedding is at least that similar, which can match
+    # questions that differ only in an error code or a number
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_MAX_ENTRIES: int = 10000
+    ANSWER_CACHE_TTL: float = 3600.0
+    ANSWER_CACHE_SIMILARITY: float = 0.0
+
+    # Retrieval result cache, top-k chunks per (organization, query embedding, k, filter)
+    RETRIEVAL_CACHE_ENABLED: bool = True
+    RETRIEVAL_CACHE_MAX_ENTRIES: int = 10000
+    RETRIEVAL_CACHE_TTL: float = 600.0
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
@@ -34,6 +34,10 @@ class ConflictException(AppBaseException):
     def __init__(self, detail="Conflict occurred"):
         super().__init__(status_code=status.HTTP_409_CONFLICT, error_code="CONFLICT", detail=detail)
 
+class PayloadTooLargeException(AppBaseException):
+    def __init__(self, detail="Payload too large"):
+        super().__init__(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, error_code="PAYLOAD_TOO_LARGE", detail=detail)
+
 class UnprocessableEntityException(AppBaseException):
     def __init__(self, detail="Unprocessable entity"):
         super().__init__(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, error_code="UNPROCESSABLE_ENTITY", detail=detail)
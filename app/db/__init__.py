@@ -1,3 +1,3 @@
-from .client import get_database, close_db_connection, initialize_database, DATABASE_NAME
+from .client import get_database, close_db_connection, initialize_database, ensure_indexes, DATABASE_NAME
 
-__all__ = ["get_database", "close_db_connection", "initialize_database", "DATABASE_NAME"]
\ No newline at end of file
+__all__ = ["get_database", "close_db_connection", "initialize_database", "ensure_indexes", "DATABASE_NAME"]
\ No newline at end of file
@@ -34,6 +34,22 @@ def initialize_database():
             raise DatabaseConnectionException(f"An unexpected error occurred during connection")
     return _database
 
+# --- Index Setup Function ---
+async def ensure_indexes(db):
+    """
+    Creates the indexes the application relies on.
+    Safe to call on every startup, existing indexes are left untouched.
+    """
+    # One document per organization and file content, enables re-upload deduplication
+    await db.documents.create_index(
+        [("organizationId", 1), ("sha256", 1)],
+        unique=True,
+        partialFilterExpression={"sha256": {"$exists": True}}
+    )
+    # Chat messages are read as the newest of a session, or a page before a given message
+    await db.chatMessages.create_index([("sessionId", 1), ("_id", 1)])
+    await db.chatHistory.create_index([("sessionId", 1)])
+
 # --- Database Connection Function ---
 def get_database():
     """
@@ -1,4 +1,4 @@
-from .auth import require_admin
+from .auth import require_admin, get_current_user
 
 
-__all__ = ["require_admin"]
\ No newline at end of file
+__all__ = ["require_admin", "get_current_user"]
\ No newline at end of file
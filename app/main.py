@@ -1,9 +1,16 @@
+import asyncio
 from fastapi import FastAPI, Depends, APIRouter
 from api import org_router,user_router, auth_router, doc_router, query_router
-from db import get_database, close_db_connection, initialize_database
+from db import get_database, close_db_connection, initialize_database, ensure_indexes
 from pymongo.asynchronous.database import AsyncDatabase
-from core import AppBaseException, app_base_exception_handler, DatabaseConnectionException
+from core import AppBaseException, app_base_exception_handler, DatabaseConnectionException, settings
 from fastapi.middleware.cors import CORSMiddleware
+from services.pdf_processor import shutdown_parse_executor
+from services.query_executor import shutdown_query_executor
+from services.llm_client import llm_clients
+from services.ingest_queue import ingest_queue
+from services.chat_writer import chat_writer
+from utils import get_vector_backend
 
 
 
@@ -41,12 +48,26 @@ async def startup_event():
         db = initialize_database()
         if db is not None:
             print(f"✅ Connected to database: {db.name}")
+            await ensure_indexes(db)
+            await ingest_queue.start(db)
+            await chat_writer.start(db)
         else:
             raise DatabaseConnectionException(f"Failed to connect to the database.")
     except Exception as e:
         print(f"❌ Startup error: {e}")
         raise DatabaseConnectionException(f"Startup error: {e}")
     
+    try:
+        # Open the vector index once, queries and ingests then reuse the handle
+        await asyncio.to_thread(get_vector_backend().initialize)
+        print(f"✅ Connected to vector store: {settings.VECTOR_STORE_BACKEND}")
+    except Exception as e:
+        # Not fatal, the handle is opened lazily on first use
+        print(f"⚠️ Vector store not ready: {e}")
+    
+    # One chat model client per process, its connections are reused by every query
+    llm_clients.start()
+    
     
     
 
@@ -55,6 +76,12 @@ async def shutdown_event():
     """
     Close database connection on application shutdown.
     """
+    await ingest_queue.stop()
+    # Buffered chat messages are written before the database connection closes
+    await chat_writer.stop()
+    shutdown_parse_executor()
+    shutdown_query_executor()
+    await llm_clients.close()
     await close_db_connection()
     print("🔌 Application shutdown complete")
     
@@ -67,7 +94,8 @@ async def health_check(db:AsyncDatabase = Depends(get_database)):
     try:        
         # Simple ping to check if database is accessible
         await db.command("ping")
-        return {"status": "ok", "database": "connected"}
+        vector_store = await asyncio.to_thread(get_vector_backend().health)
+        return {"status": "ok", "database": "connected", "vectorStore": vector_store}
     except Exception as e:
         raise DatabaseConnectionException(f"MongoDB is not reachable: {e}")
     
@@ -1,4 +1,4 @@
-from .main import process_all_pdfs
+from .main import process_all_pdfs, create_staging_dir
 
 
-__all__ = ["process_all_pdfs"]
\ No newline at end of file
+__all__ = ["process_all_pdfs", "create_staging_dir"]
\ No newline at end of file
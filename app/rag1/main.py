@@ -1,12 +1,28 @@
-import os
+import queue
+import shutil
+import threading
+import time
+import uuid
 from pathlib import Path
-from typing import List, Dict, Any, Optional
-from utils import get_vectorstore
-from core import logger, BadRequestException
+from typing import List, Dict, Any, Optional, Callable, Protocol
+from utils import get_vectorstore, get_embedding_model, fetch_vectors, text_hash, DedupEmbeddings, org_namespace, get_lexical_index
+from utils.lexical_index import LexicalIndex
+from core import logger, settings, BadRequestException
 from langchain.schema import Document
-from langchain_community.document_loaders import PyPDFLoader, DirectoryLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from schema import ProcessPDFResponse
+from services.pdf_processor import iter_parsed_pages
+
+# Called as on_progress(stage, {"pages": ..., "chunks": ..., "vectors": ..., "timings": {...}})
+ProgressCallback = Callable[[str, Dict[str, Any]], None]
+
+
+class ChunkHashStore(Protocol):
+    """Maps chunk content hashes to the ID of a vector that already holds their embedding."""
+
+    def lookup(self, hashes: List[str]) -> Dict[str, str]: ...
+
+    def record(self, vector_ids: Dict[str, str]) -> None: ...
 
 def _get_pdf_folder() -> Path:
     """Get the PDF folder path."""
@@ -14,57 +30,66 @@ def _get_pdf_folder() -> Path:
     return base_dir / "uploaded_files"
 
 
-def _load_pdf_documents_with_metadata(pdf_folder: Path, document_mappings: Dict[str, str]) -> List[Document]:
-    """Load all PDF documents from the specified folder and add only document IDs to metadata."""
-    loader = DirectoryLoader(
-        path=str(pdf_folder),
-        glob='*.pdf',
-        loader_cls=PyPDFLoader
-    )
-    docs = loader.load()
-    
-    # Clean metadata and add only document IDs based on filename mapping
-    for doc in docs:
-        # Extract the unique filename from the document source
-        source_path = doc.metadata.get('source', '') if doc.metadata else ''
-        filename = os.path.basename(source_path)
-        
-        # Clear all existing metadata
-        doc.metadata = {}
-        
-        # Find the corresponding document ID and add only that
-        document_id = document_mappings.get(filename)
-        if document_id:
-            doc.metadata['documentId'] = document_id
-            logger.info(f"Added document ID {document_id} to {filename}")
-        else:
-            logger.warning(f"No document ID found for {filename}")
-    
-    return docs
+def create_staging_dir() -> Path:
+    """Create a private staging folder for a single upload job."""
+    staging_dir = _get_pdf_folder() / uuid.uuid4().hex
+    staging_dir.mkdir(parents=True, exist_ok=False)
+    return staging_dir
 
 
-def _load_pdf_documents(pdf_folder: Path) -> List[Document]:
-    """Load all PDF documents from the specified folder and clean metadata."""
-    loader = DirectoryLoader(
-        path=str(pdf_folder),
-        glob='*.pdf',
-        loader_cls=PyPDFLoader
-    )
-    docs = loader.load()
-    
-    # Clean all metadata from documents
-    for doc in docs:
-        doc.metadata = {}
-    
-    return docs
+# Marks the end of the parse/chunk stage's output
+_DONE = object()
+
 
+def _put(buffer: queue.Queue, item: Any, stop: threading.Event) -> bool:
+    """Put an item on a bounded buffer, giving up once the pipeline is stopped."""
+    while not stop.is_set():
+        try:
+            buffer.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
 
-def _cleanup_processed_files(pdf_folder: Path) -> None:
-    """Remove all files from the PDF folder after processing."""
-    for filename in os.listdir(pdf_folder):
-        file_path = pdf_folder / filename
-        if file_path.is_file():
-            file_path.unlink()
+
+def _parse_and_chunk(
+    staging_dir: Path,
+    document_mappings: Dict[str, str],
+    org_id: str,
+    buffer: queue.Queue,
+    stop: threading.Event,
+    timings: Dict[str, float]
+) -> None:
+    """
+    First pipeline stage: parse exactly the mapped PDFs from the staging folder
+    one page range at a time, split each range into chunks and feed them to buffer.
+    """
+    file_paths = [str(staging_dir / filename) for filename in document_mappings]
+    pages = iter_parsed_pages(file_paths, document_mappings)
+    try:
+        text_splitter = _create_text_splitter()
+        while not stop.is_set():
+            stage_start = time.perf_counter()
+            page_docs = next(pages, None)
+            timings["parse"] += time.perf_counter() - stage_start
+            if page_docs is None:
+                break
+            
+            stage_start = time.perf_counter()
+            chunks = _add_organization_metadata(text_splitter.split_documents(page_docs), org_id)
+            timings["chunk"] += time.perf_counter() - stage_start
+            if not _put(buffer, (len(page_docs), chunks), stop):
+                return
+        _put(buffer, _DONE, stop)
+    except Exception as e:
+        _put(buffer, e, stop)
+    finally:
+        pages.close()
+
+
+def _cleanup_processed_files(staging_dir: Path) -> None:
+    """Remove the staging folder of a job after processing."""
+    shutil.rmtree(staging_dir, ignore_errors=True)
 
 
 def _create_text_splitter() -> RecursiveCharacterTextSplitter:
@@ -78,7 +103,7 @@ def _create_text_splitter() -> RecursiveCharacterTextSplitter:
 
 
 def _add_organization_metadata(chunks: List[Document], org_id: str) -> List[Document]:
-    """Clean all metadata and add only orgId and documentId."""
+    """Clean all metadata and add only orgId, documentId and the chunk's content hash."""
     for chunk in chunks:
         # Store documentId if it exists before cleaning
         document_id = None
@@ -86,7 +111,7 @@ def _add_organization_metadata(chunks: List[Document], org_id: str) -> List[Docu
             document_id = chunk.metadata.get('documentId')
         
         # Clear all metadata and set only required fields
-        chunk.metadata = {'orgId': org_id}
+        chunk.metadata = {'orgId': org_id, 'chunkHash': text_hash(chunk.page_content)}
         
         # Add documentId if it was present
         if document_id:
@@ -98,87 +123,240 @@ def _add_organization_metadata(chunks: List[Document], org_id: str) -> List[Docu
     return chunks
 
 
-def _store_chunks_in_vectorstore(chunks: List[Document]) -> None:
-    """Store document chunks in the vector database."""
-    vectorstore = get_vectorstore()
+def _load_known_embeddings(
+    chunks: List[Document],
+    chunk_store: Optional[ChunkHashStore],
+    namespace: Optional[str] = None
+) -> Dict[str, List[float]]:
+    """Look up embeddings already stored in namespace for the chunks' content hashes."""
+    if chunk_store is None or not chunks:
+        return {}
+    hashes = list({chunk.metadata['chunkHash'] for chunk in chunks})
+    vector_ids = chunk_store.lookup(hashes)
+    vectors = fetch_vectors(list(set(vector_ids.values())), namespace)
+    # Vectors of deleted documents are gone, those hashes are simply embedded again
+    return {h: vectors[vector_id] for h, vector_id in vector_ids.items() if vector_id in vectors}
+
+
+def _store_chunks_in_vectorstore(
+    chunks: List[Document],
+    chunk_store: Optional[ChunkHashStore] = None,
+    positions: Optional[Dict[str, int]] = None,
+    namespace: Optional[str] = None,
+    lexical_index: Optional[LexicalIndex] = None
+) -> int:
+    """
+    Store document chunks in the given namespace of the vector database, and
+    in lexical_index for keyword search if given.
+    
+    Identical chunks are embedded once, and chunks whose content hash is already
+    known to chunk_store reuse the stored embedding instead of calling the backend.
+    Pass the same positions dict for every batch of one ingestion so vector IDs keep counting up.
+    
+    Returns:
+        Number of chunks that reused an existing embedding
+    """
+    known = _load_known_embeddings(chunks, chunk_store, namespace)
+    embedding = DedupEmbeddings(get_embedding_model(), known)
+    vectorstore = get_vectorstore(embedding=embedding, namespace=namespace)
     
-    # Log sample metadata before storing (should only contain orgId and documentId)
+    # Log sample metadata before storing (should only contain orgId, documentId and chunkHash)
     if chunks:
         logger.info(f"Sample chunk metadata before storing (cleaned): {chunks[0].metadata}")
     
-    vectorstore.add_documents(chunks)
+    ids = _chunk_ids(chunks, positions)
+    # PineconeVectorStore adds the chunk text to the metadata dicts it is given, the lexical index stores that text already
+    metadatas = [dict(chunk.metadata) for chunk in chunks]
+    # Hand every chunk to the embedder at once so the scheduler can batch and parallelise them
+    vectorstore.add_documents(chunks, ids=ids, embedding_chunk_size=max(len(chunks), 1))
+    
+    if lexical_index is not None:
+        lexical_index.add(ids, [chunk.page_content for chunk in chunks], metadatas)
+    
+    if chunk_store is not None:
+        new_hashes: Dict[str, str] = {}
+        for chunk, vector_id in zip(chunks, ids):
+            chunk_hash = chunk.metadata['chunkHash']
+            if chunk_hash not in known and chunk_hash not in new_hashes:
+                new_hashes[chunk_hash] = vector_id
+        chunk_store.record(new_hashes)
+    
+    return embedding.hits
+
+
+def _chunk_ids(chunks: List[Document], positions: Optional[Dict[str, int]] = None) -> List[str]:
+    """Build deterministic vector IDs so re-ingesting a document overwrites instead of duplicating."""
+    positions = {} if positions is None else positions
+    ids = []
+    for chunk in chunks:
+        document_id = chunk.metadata.get('documentId', 'unmapped')
+        position = positions.get(document_id, 0)
+        positions[document_id] = position + 1
+        ids.append(f"{document_id}#{position}")
+    return ids
 
 
-def process_all_pdfs(org_id: str, document_mappings: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+def _report_progress(on_progress: Optional[ProgressCallback], stage: str, **progress: Any) -> None:
+    """Forward a progress update to the caller, never letting a reporting error fail the job."""
+    if on_progress is None:
+        return
+    try:
+        on_progress(stage, progress)
+    except Exception as e:
+        logger.warning(f"Progress callback failed at stage {stage}: {str(e)}")
+
+
+def _stopped_result(chunks: int, pages: int, started: float, timings: Dict[str, float]) -> Dict[str, Any]:
+    return {
+        "status": "stopped",
+        "message": "Processing stopped before completion",
+        "chunks_processed": chunks,
+        "documents_loaded": pages,
+        "processing_time": time.perf_counter() - started,
+        "timings": timings
+    }
+
+
+def process_all_pdfs(
+    org_id: str,
+    document_mappings: Dict[str, str],
+    staging_dir: Path,
+    on_progress: Optional[ProgressCallback] = None,
+    chunk_store: Optional[ChunkHashStore] = None,
+    cancel: Optional[threading.Event] = None
+) -> Dict[str, Any]:
     """
-    Process all PDF files for the given organization with document ID mapping.
+    Process the PDF files of a single upload for the given organization.
+    
+    Only the files named in document_mappings are read, and only from the
+    upload's own staging folder, so concurrent uploads never see each other's files.
+    
+    Ingestion is pipelined: a background thread parses and chunks one page range
+    at a time into a bounded buffer, while this thread embeds and stores chunks in
+    batches of settings.INGEST_STORE_BATCH. The first vectors land while later pages
+    are still being parsed, and memory holds only a few batches at a time.
+    
+    Once cancel is set, processing stops before the next batch and returns
+    status "stopped", leaving the staged files in place so the job can run again.
     
     Args:
         org_id: Organization identifier
-        document_mappings: Optional mapping of filename to document ID
+        document_mappings: Mapping of staged filename to document ID
+        staging_dir: Staging folder created for this upload by create_staging_dir
+        on_progress: Optional callback receiving (stage, progress) after each batch
+        chunk_store: Optional chunk hash store used to reuse embeddings across documents
+        cancel: Optional event that stops processing between batches
         
     Returns:
-        Dict containing processing results
+        Dict containing processing results, wall-clock processing time and per-stage busy time in seconds
         
     Raises:
         BadRequestException: If processing fails
     """
+    timings: Dict[str, float] = {"parse": 0.0, "chunk": 0.0, "store": 0.0}
+    buffer: queue.Queue = queue.Queue(maxsize=settings.INGEST_PIPELINE_BUFFER)
+    stop = threading.Event()
+    stopped = False
+    producer: Optional[threading.Thread] = None
+    started = time.perf_counter()
+    namespace = org_namespace(org_id)
+    lexical_index = get_lexical_index(org_id) if settings.HYBRID_SEARCH_ENABLED else None
     try:
         logger.info(f"Starting PDF processing for organization: {org_id}")
         
-        # Step 1: Get PDF folder and load documents with metadata
-        pdf_folder = _get_pdf_folder()
+        if not document_mappings:
+            raise BadRequestException("No document mappings provided for processing")
         
-        if document_mappings:
-            logger.info(f"Processing with document mappings: {document_mappings}")
-            docs = _load_pdf_documents_with_metadata(pdf_folder, document_mappings)
-        else:
-            # Fallback to original method without document IDs
-            logger.warning("Processing without document mappings - document IDs will not be included")
-            docs = _load_pdf_documents(pdf_folder)
+        # Step 1: Parse and chunk the staged documents in the background
+        logger.info(f"Processing with document mappings: {document_mappings}")
+        _report_progress(on_progress, "parsing")
+        producer = threading.Thread(
+            target=_parse_and_chunk,
+            args=(staging_dir, document_mappings, org_id, buffer, stop, timings),
+            daemon=True
+        )
+        producer.start()
         
-        if not docs:
+        # Step 2: Embed and store chunks as they arrive
+        pages = chunks_processed = chunks_deduplicated = 0
+        positions: Dict[str, int] = {}
+        pending: List[Document] = []
+        
+        def flush() -> None:
+            nonlocal chunks_processed, chunks_deduplicated
+            stage_start = time.perf_counter()
+            chunks_deduplicated += _store_chunks_in_vectorstore(pending, chunk_store, positions, namespace, lexical_index)
+            timings["store"] += time.perf_counter() - stage_start
+            chunks_processed += len(pending)
+            pending.clear()
+        
+        while True:
+            if cancel is not None and cancel.is_set():
+                stopped = True
+                break
+            item = buffer.get()
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            
+            page_count, chunks = item
+            pages += page_count
+            pending.extend(chunks)
+            if len(pending) >= settings.INGEST_STORE_BATCH:
+                flush()
+            _report_progress(
+                on_progress, "ingesting",
+                pages=pages, chunks=chunks_processed + len(pending), vectors=chunks_processed, timings=dict(timings)
+            )
+        
+        if stopped:
+            logger.info(f"Stopped PDF processing for organization {org_id} after {chunks_processed} chunks")
+            return _stopped_result(chunks_processed, pages, started, timings)
+        
+        if pending:
+            flush()
+        
+        if not pages:
             logger.info("No PDF documents found to process")
             return {
                 "status": "success", 
                 "message": "No documents to process", 
                 "chunks_processed": 0,
-                "documents_loaded": 0
+                "documents_loaded": 0,
+                "processing_time": time.perf_counter() - started,
+                "timings": timings
             }
         
-        logger.info(f"Loaded {len(docs)} document pages")
-        
-        # Step 2: Clean up processed files
-        _cleanup_processed_files(pdf_folder)
-        
-        # Step 3: Split documents into chunks
-        text_splitter = _create_text_splitter()
-        all_chunks = text_splitter.split_documents(docs)
+        _report_progress(
+            on_progress, "done",
+            pages=pages, chunks=chunks_processed, vectors=chunks_processed, timings=dict(timings)
+        )
         
-        logger.info(f"Created {len(all_chunks)} chunks from documents")
-        
-        # Log sample chunk metadata after splitting
-        if all_chunks:
-            logger.info(f"Sample chunk metadata after splitting: {all_chunks[0].metadata}")
-        
-        # Step 4: Add organization metadata (preserves existing metadata including documentId)
-        chunks_with_metadata = _add_organization_metadata(all_chunks, org_id)
-        
-        # Step 5: Store in vector database
-        _store_chunks_in_vectorstore(chunks_with_metadata)
-        
-        logger.info(f"Successfully processed {len(chunks_with_metadata)} chunks for organization {org_id}")
+        logger.info(f"Successfully processed {chunks_processed} chunks from {pages} pages for organization {org_id}, {chunks_deduplicated} reused existing embeddings")
         
         return {
             "status": "success",
-            "message": f"Processed {len(chunks_with_metadata)} chunks",
-            "chunks_processed": len(chunks_with_metadata),
-            "documents_loaded": len(docs)
+            "message": f"Processed {chunks_processed} chunks",
+            "chunks_processed": chunks_processed,
+            "documents_loaded": pages,
+            "chunks_deduplicated": chunks_deduplicated,
+            "processing_time": time.perf_counter() - started,
+            "timings": timings
         }
         
     except Exception as e:
+        if cancel is not None and cancel.is_set():
+            # Failures while shutting down, such as database calls timing out, leave the job to run again
+            stopped = True
+            logger.warning(f"PDF processing for organization {org_id} interrupted by shutdown: {str(e)}")
+            return _stopped_result(0, 0, started, timings)
         logger.error(f"Error processing PDFs for organization {org_id}: {str(e)}")
-        raise BadRequestException(f"Error in processing PDF: {str(e)}")       
-
-
-
+        raise BadRequestException(f"Error in processing PDF: {str(e)}")
+    finally:
+        # Step 3: Stop the pipeline and clean up this job's staged files, unless it is to run again
+        stop.set()
+        if producer is not None:
+            producer.join()
+        if not stopped:
+            _cleanup_processed_files(staging_dir)
@@ -5,9 +5,10 @@ from .organizationSchema import OrganizationCreate, OrganizationUpdate, Organiza
 from .docSchema import (
     DocOutput, DocModel, DocumentUploadResponse, ProcessingResult, 
     BulkUploadResponse, FileValidationResult, SearchBase,
-    DocumentDeletionResponse, DocumentDeletionErrors, DocumentDeletionRequest
+    DocumentDeletionResponse, DocumentDeletionErrors, DocumentDeletionRequest,
+    IngestJobOutput, IngestJobProgress, IngestJobTimings
 )
-from .querySchema import QueryResponse, ChatMessage, QueryRequest, ChatHistoryCreate,ChatHistoryResponse
+from .querySchema import QueryResponse, QuerySource, ChatMessage, QueryRequest, ChatHistoryCreate,ChatHistoryResponse, ChatHistoryPage, ChatQuery, ChatQueryResponse, QueryStreamDone, QueryStreamTimings, QueryTimings, AnswerCacheStats, RetrievalCacheStats, QueryCacheStats
 
 
 __all__ = [
@@ -43,12 +44,25 @@ __all__ = [
     "DocumentDeletionResponse",
     "DocumentDeletionErrors",
     "DocumentDeletionRequest",
+    "IngestJobOutput",
+    "IngestJobProgress",
+    "IngestJobTimings",
     
     # Query schemas
     "QueryResponse",
+    "QuerySource",
     "ChatMessage",
     "QueryRequest",
     "ChatHistoryCreate",
-    "ChatHistoryResponse"
+    "ChatHistoryResponse",
+    "ChatHistoryPage",
+    "ChatQuery",
+    "ChatQueryResponse",
+    "QueryStreamDone",
+    "QueryStreamTimings",
+    "QueryTimings",
+    "AnswerCacheStats",
+    "RetrievalCacheStats",
+    "QueryCacheStats"
    
 ]
\ No newline at end of file
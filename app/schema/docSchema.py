@@ -15,6 +15,7 @@ class DocOutput(DocBase):
     unique_filename: str
     path: str
     file_size: Optional[int] = Field(None, description="File size in bytes")
+    sha256: Optional[str] = Field(None, description="SHA-256 digest of the file content")
     uploadedAt: datetime
     status: str = Field(default="uploaded", description="Upload status")
     
@@ -42,6 +43,9 @@ class ProcessingResult(BaseModel):
     chunks_processed: int = Field(default=0, description="Number of chunks processed")
     documents_loaded: int = Field(default=0, description="Number of document pages loaded")
     processing_time: Optional[float] = Field(None, description="Processing time in seconds")
+    documents_deduplicated: int = Field(default=0, description="Number of uploaded files that matched an existing document")
+    chunks_deduplicated: int = Field(default=0, description="Number of chunks that reused an existing embedding")
+    dedup_hit_rate: float = Field(default=0.0, description="Share of chunks that reused an existing embedding")
     error_details: Optional[str] = Field(None, description="Error details if processing failed")
 
 # Upload response model
@@ -50,11 +54,44 @@ class DocumentUploadResponse(BaseModel):
     files_uploaded: int = Field(..., description="Number of files successfully uploaded")
     processing_result: ProcessingResult = Field(..., description="Result of PDF processing")
     document_ids: List[str] = Field(default_factory=list, description="List of uploaded document IDs")
+    duplicate_document_ids: List[str] = Field(default_factory=list, description="IDs of existing documents that matched uploaded files")
+    job_id: Optional[str] = Field(None, description="ID of the background ingestion job, poll /doc/jobs/{job_id}")
     upload_time: Optional[float] = Field(None, description="Total upload time in seconds")
     errors: Optional[List[str]] = Field(default_factory=list, description="Any errors encountered")
     
     model_config = ConfigDict(arbitrary_types_allowed=True)
 
+# Background ingestion job models
+class IngestJobProgress(BaseModel):
+    pages: int = Field(default=0, description="Number of document pages parsed")
+    chunks: int = Field(default=0, description="Number of chunks created")
+    vectors: int = Field(default=0, description="Number of vectors stored")
+
+class IngestJobTimings(BaseModel):
+    queuedAt: datetime
+    startedAt: Optional[datetime] = None
+    finishedAt: Optional[datetime] = None
+    parse: Optional[float] = Field(None, description="Time spent parsing in seconds")
+    chunk: Optional[float] = Field(None, description="Time spent chunking in seconds")
+    store: Optional[float] = Field(None, description="Time spent embedding and upserting in seconds")
+
+class IngestJobOutput(BaseModel):
+    id: Annotated[PyObjectId, Field(alias="_id", description="Unique id of the ingestion job")]
+    organizationId: str
+    documentIds: List[str] = Field(default_factory=list)
+    status: str = Field(..., description="queued, running, completed or failed")
+    stage: str = Field(..., description="queued, parsing, ingesting or done")
+    progress: IngestJobProgress = Field(default_factory=IngestJobProgress)
+    timings: IngestJobTimings
+    result: Optional[ProcessingResult] = None
+    error: Optional[str] = None
+
+    model_config = ConfigDict(
+        json_encoders={ObjectId: str},
+        populate_by_name=True,
+        arbitrary_types_allowed=True
+    )
+
 # Bulk upload response for multiple organizations
 class BulkUploadResponse(BaseModel):
     total_files: int
@@ -79,8 +116,10 @@ class FileValidationResult(BaseModel):
 class SearchBase(BaseModel):
     searchTxt: str = Field(..., min_length=1, description="Search query text")
     orgId: str = Field(..., min_length=1, description="Organization ID")
-    documentId: str = Field(..., min_length=1, description="Document ID")
+    documentId: Optional[str] = Field(default=None, min_length=1, description="Only search this document")
     limit: Optional[int] = Field(default=5, ge=1, le=20, description="Number of results")
+    minScore: Optional[float] = Field(default=None, ge=-1, le=1, description="Minimum similarity of retrieved chunks")
+    rerank: bool = Field(default=True, description="Rerank over-fetched chunks with the configured reranker, false keeps the retrieval order")
     
     model_config = ConfigDict(
         str_strip_whitespace=True,
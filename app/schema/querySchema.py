@@ -3,25 +3,87 @@ from pydantic import BaseModel, Field, BeforeValidator
 from typing import Optional, List,Annotated, Literal
 from datetime import datetime
 from bson import ObjectId
+from .docSchema import SearchBase
 
 
 PyObjectId = Annotated[str, BeforeValidator(str)]
 
 
+class QuerySource(BaseModel):
+    documentId: str
+    score: float = Field(..., description="Best similarity of the document's retrieved chunks to the query")
+
+
+class QueryTimings(BaseModel):
+    retrieval_ms: float = Field(..., description="Time to embed the query and retrieve candidate chunks")
+    rerank_ms: float = Field(0.0, description="Time to rerank the candidates")
+    prompt_ms: float = Field(0.0, description="Time to build the context and prompt")
+    llm_ms: float = Field(0.0, description="Time the LLM took to answer")
+    total_ms: float
+
+
 class QueryResponse(BaseModel):
     query: Optional[str] = None
     answer: str
     context: Optional[str] = None
     document_ids: Optional[List[str]] = Field(default_factory=list, description="MongoDB document IDs used")
+    sources: List[QuerySource] = Field(default_factory=list, description="Retrieved documents with their similarity scores")
     confidence: Optional[float] = None
+    cached: bool = Field(False, description="Whether the answer came from the answer cache")
+    context_tokens: Optional[int] = Field(None, description="Tokens of retrieved context in the prompt")
+    context_tokens_saved: Optional[int] = Field(None, description="Prompt tokens saved by removing chunk overlap and keeping to the token budget")
+    timings: Optional[QueryTimings] = None
     
     class Config:
         arbitrary_types_allowed = True
 
+class QueryStreamTimings(BaseModel):
+    retrieval_ms: float = Field(..., description="Time to embed the query and retrieve chunks")
+    rerank_ms: Optional[float] = Field(None, description="Time to rerank the retrieved candidates")
+    prompt_ms: Optional[float] = Field(None, description="Time to build the context and prompt")
+    first_token_ms: Optional[float] = Field(None, description="Time until the LLM streamed its first token")
+    total_ms: float = Field(..., description="Time until the answer was complete")
+
+
+class QueryStreamDone(BaseModel):
+    """Data of the final event of a streamed query."""
+    confidence: float
+    timings: QueryStreamTimings
+    cached: bool = False
+    context_tokens: Optional[int] = None
+    context_tokens_saved: Optional[int] = None
+
+
+class AnswerCacheStats(BaseModel):
+    entries: int
+    hits: int
+    semantic_hits: int = Field(..., description="Hits found by question similarity rather than the exact question")
+    misses: int
+    hit_rate: float
+    saved_seconds: float = Field(..., description="Sum of the original answer latencies of the cache hits")
+    invalidations: int
+
+
+class RetrievalCacheStats(BaseModel):
+    entries: int
+    hits: int
+    misses: int
+    hit_rate: float
+    expirations: int
+    evictions: int
+    generation_bumps: int = Field(..., description="Times an organization's cached results were invalidated")
+
+
+class QueryCacheStats(BaseModel):
+    answers: AnswerCacheStats
+    retrieval: RetrievalCacheStats
+
+
 class ChatMessage(BaseModel):
     role: str  # "user" or "assistant"
     content: str
     timestamp: Optional[str] = None
+    id: Optional[str] = Field(None, description="ID of the stored message, set when it is read back")
     
     class Config:
         arbitrary_types_allowed = True
@@ -60,3 +122,23 @@ class ChatHistoryResponse(BaseModel):
     class Config:
         json_encoders = {ObjectId: str}
         validate_by_name = True
+
+
+class ChatHistoryPage(BaseModel):
+    sessionId: str
+    messages: List[ChatMessage] = Field(default_factory=list, description="Messages of the page, oldest first")
+    before: Optional[str] = Field(None, description="Pass as before to fetch the next older page, None on the first message")
+    messageCount: int = Field(0, description="Messages stored for the session")
+
+
+class ChatQuery(SearchBase):
+    sessionId: str = Field(..., min_length=1, description="Chat session the question belongs to")
+    # The organization and user come from the token, an orgId sent along must match it
+    orgId: Optional[str] = Field(default=None, min_length=1, description="Organization ID")
+
+
+class ChatQueryResponse(QueryResponse):
+    sessionId: str
+    standalone_query: str = Field(..., description="The question rewritten to stand on its own, used for retrieval")
+    history_tokens: int = Field(0, description="Tokens of the rolling summary and recent messages sent along")
+    summarized: bool = Field(False, description="Whether older messages were folded into the rolling summary this turn")
@@ -0,0 +1,74 @@
+"""
+Move chat messages stored in the messages array of chatHistory documents
+into chatMessages, one document per message, and drop the array. A legacy
+message's _id is derived from its session's creation time, session ID and
+position, so the messages sort before any appended since and re-running the
+command after an interruption inserts nothing twice.
+
+Run from the app directory:
+    python -m scripts.migrate_chat_history [--dry-run]
+"""
+import argparse
+import asyncio
+import calendar
+import hashlib
+from datetime import datetime, timezone
+from typing import Any, Dict
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+from core import logger
+from db import initialize_database, ensure_indexes, close_db_connection
+
+
+def _legacy_id(session: Dict[str, Any], position: int) -> ObjectId:
+    """Timestamp of the session's creation, 5 bytes of its session ID hash, and the message position."""
+    # Stored datetimes come back naive in UTC
+    created = calendar.timegm((session.get("createdAt") or datetime.now(timezone.utc)).utctimetuple())
+    session_bytes = hashlib.md5(str(session["sessionId"]).encode()).digest()[:5]
+    return ObjectId(created.to_bytes(4, "big") + session_bytes + position.to_bytes(3, "big"))
+
+
+async def _migrate(dry_run: bool) -> Dict[str, int]:
+    db = initialize_database()
+    await ensure_indexes(db)
+    counts = {"sessions": 0, "messages": 0}
+    async for session in db.chatHistory.find({"messages": {"$exists": True}}):
+        messages = session.get("messages") or []
+        counts["sessions"] += 1
+        counts["messages"] += len(messages)
+        if dry_run:
+            continue
+        if messages:
+            try:
+                await db.chatMessages.insert_many(
+                    [
+                        {**message, "_id": _legacy_id(session, position), "sessionId": session["sessionId"]}
+                        for position, message in enumerate(messages)
+                    ],
+                    ordered=False
+                )
+            except BulkWriteError as e:
+                # Messages copied by an interrupted run already exist
+                if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                    raise
+        await db.chatHistory.update_one(
+            {"_id": session["_id"]},
+            {"$unset": {"messages": ""}, "$inc": {"messageCount": len(messages)}}
+        )
+    await close_db_connection()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move chat history messages into one document per message")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the messages that would move")
+    args = parser.parse_args()
+
+    counts = asyncio.run(_migrate(args.dry_run))
+    verb = "Would move" if args.dry_run else "Moved"
+    logger.info(f"{verb} {counts['messages']} chat messages of {counts['sessions']} sessions")
+    print(f"{verb} {counts['messages']} chat messages of {counts['sessions']} sessions")
+
+
+if __name__ == "__main__":
+    main()
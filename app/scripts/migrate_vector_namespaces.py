@@ -0,0 +1,48 @@
+"""
+Move existing vectors out of the shared default namespace into their
+organization's namespace, as chosen by utils.org_namespace from the orgId
+metadata. Vectors are copied before they are deleted from the default
+namespace, so the command can be re-run after an interruption.
+
+Run from the app directory while settings.VECTOR_ORG_PARTITIONS is on:
+    python -m scripts.migrate_vector_namespaces [--dry-run] [--batch-size N]
+
+VECTOR_ORG_PARTITIONS is off by default, queries only look in the namespace
+it selects, so turn it on in this order:
+    1. deploy with it off and check what would move with --dry-run
+    2. turn it on and restart the app, then run this script right away;
+       until it finishes, an organization whose vectors were not moved yet
+       gets fewer results
+    3. run it again, it moves whatever an older process still wrote to the
+       default namespace and reports nothing left to move when done
+"""
+import argparse
+from typing import Any, Dict, Optional
+from core import settings, logger
+from utils import get_vector_backend, org_namespace
+
+
+def _namespace_of(metadata: Dict[str, Any]) -> Optional[str]:
+    return org_namespace(metadata.get("orgId"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move vectors into per-organization namespaces")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the vectors that would move")
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+
+    if not settings.VECTOR_ORG_PARTITIONS:
+        raise SystemExit("VECTOR_ORG_PARTITIONS is off, there are no organization namespaces to move vectors to")
+
+    backend = get_vector_backend()
+    moved = backend.move_to_namespaces(_namespace_of, batch_size=args.batch_size, dry_run=args.dry_run)
+    verb = "Would move" if args.dry_run else "Moved"
+    for namespace, count in sorted(moved.items()):
+        print(f"{namespace}: {count}")
+    logger.info(f"{verb} {sum(moved.values())} vectors into {len(moved)} namespaces on the {backend.name} backend")
+    print(f"{verb} {sum(moved.values())} vectors into {len(moved)} namespaces")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from core import settings
+from utils import get_embedding_model
+from utils.embedding_cache import normalize_text
+
+
+def normalize_question(question: str) -> str:
+    """Normalize a question so case, whitespace and trailing punctuation do not change the key."""
+    return normalize_text(question).casefold().rstrip("?!. ")
+
+
+@dataclass
+class CachedAnswer:
+    answer: str
+    document_ids: List[str]
+    confidence: float
+    # Seconds the uncached answer took, i.e. what a hit saves
+    latency: float
+    vector: Optional[np.ndarray] = None
+    # Retrieval options the answer was computed with, semantic matches must share them
+    scope: str = ""
+    sources: List[Dict[str, Any]] = field(default_factory=list)
+    created_at: float = field(default_factory=time.monotonic)
+
+
+class _QuestionMatrix:
+    """Stacked question vectors of one organization and scope, grown and shrunk in place."""
+
+    def __init__(self, dim: int):
+        self.keys: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._vectors = np.empty((16, dim), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, key: str, vector: np.ndarray) -> None:
+        if key in self._rows:
+            self._vectors[self._rows[key]] = vector
+            return
+        if len(self.keys) == len(self._vectors):
+            # Doubling keeps appends amortized O(1) instead of restacking every vector
+            grown = np.empty((2 * len(self._vectors), self._vectors.shape[1]), dtype=np.float32)
+            grown[:len(self.keys)] = self._vectors
+            self._vectors = grown
+        self._rows[key] = len(self.keys)
+        self._vectors[len(self.keys)] = vector
+        self.keys.append(key)
+
+    def remove(self, key: str) -> None:
+        row = self._rows.pop(key, None)
+        if row is None:
+            return
+        # The last row takes the removed one's place
+        last = self.keys.pop()
+        if row < len(self.keys):
+            self.keys[row] = last
+            self._rows[last] = row
+            self._vectors[row] = self._vectors[len(self.keys)]
+
+    def best(self, vector: np.ndarray) -> Tuple[Optional[str], float]:
+        """The key of the most similar question and its cosine similarity."""
+        if not self.keys:
+            return None, float("-inf")
+        scores = self._vectors[:len(self.keys)] @ vector
+        best = int(np.argmax(scores))
+        return self.keys[best], float(scores[best])
+
+
+class AnswerCache:
+    """
+    In-process cache of final query answers per organization.
+
+    Answers are found by (orgId, retrieval scope, normalized question) and, when similarity is
+    above 0, by the cosine similarity of the question's embedding to those of
+    the organization's cached questions with the same scope. Semantic reuse is
+    off by default: questions differing only in a code or a number can embed
+    almost identically. Entries expire after ttl seconds, the
+    least recently used ones are evicted past max_entries, and invalidate()
+    drops an organization's entries when its documents change. An answer is
+    only stored if no invalidation happened since generation() was read before
+    computing it, so a query racing an upload cannot cache a stale answer. Each worker
+    process keeps its own cache, so ttl also bounds how long another worker's
+    changes can go unseen.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl: float,
+        similarity: float = 0.0,
+        embed_query: Optional[Callable[[str], List[float]]] = None
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self._embed_query = embed_query
+        self._entries: "OrderedDict[Tuple[str, str], CachedAnswer]" = OrderedDict()
+        # Per organization the keys of its entries, and per organization and scope their vectors
+        self._org_keys: Dict[str, Dict[str, None]] = {}
+        self._matrices: Dict[Tuple[str, str], _QuestionMatrix] = {}
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self.invalidations = 0
+
+    def _embed(self, question: str) -> np.ndarray:
+        embed_query = self._embed_query or get_embedding_model().embed_query
+        vector = np.asarray(embed_query(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expired(self, entry: CachedAnswer) -> bool:
+        return time.monotonic() - entry.created_at > self.ttl
+
+    def _remove(self, key: Tuple[str, str]) -> None:
+        entry = self._entries.pop(key, None)
+        org_keys = self._org_keys.get(key[0])
+        if org_keys is not None:
+            org_keys.pop(key[1], None)
+            if not org_keys:
+                del self._org_keys[key[0]]
+        if entry is not None and entry.vector is not None:
+            matrix_key = (key[0], entry.scope)
+            matrix = self._matrices.get(matrix_key)
+            if matrix is not None:
+                matrix.remove(key[1])
+                if not matrix:
+                    del self._matrices[matrix_key]
+
+    @staticmethod
+    def _key(org_id: str, question: str, scope: str) -> Tuple[str, str]:
+        question = normalize_question(question)
+        return (org_id, f"{scope}|{question}" if scope else question)
+
+    def _semantic_match(self, org_id: str, vector: np.ndarray, scope: str) -> Optional[Tuple[str, str]]:
+        matrix = self._matrices.get((org_id, scope))
+        if matrix is None:
+            return None
+        question, score = matrix.best(vector)
+        return (org_id, question) if question is not None and score >= self.similarity else None
+
+    def generation(self, org_id: str) -> int:
+        """Number of invalidations of an organization so far. Pass it to store()."""
+        with self._lock:
+            return self._generations.get(org_id, 0)
+
+    def _get(self, key: Tuple[str, str]) -> Optional[CachedAnswer]:
+        entry = self._entries.get(key)
+        if entry is not None and self._expired(entry):
+            self._remove(key)
+            return None
+        return entry
+
+    def _hit(self, key: Tuple[str, str], entry: CachedAnswer) -> CachedAnswer:
+        self._entries.move_to_end(key)
+        self.hits += 1
+        self.saved_seconds += entry.latency
+        return entry
+
+    def lookup(self, org_id: str, question: str, scope: str = "") -> Tuple[Optional[CachedAnswer], Optional[np.ndarray]]:
+        """
+        Find a cached answer. Blocking, since a semantic lookup embeds the question.
+
+        Returns the answer, or None, and the question's embedding when one was
+        computed so store() can reuse it.
+        """
+        key = self._key(org_id, question, scope)
+        with self._lock:
+            entry = self._get(key)
+            if entry is not None:
+                return self._hit(key, entry), None
+            if self.similarity <= 0 or org_id not in self._org_keys:
+                self.misses += 1
+                return None, None
+
+        # Embed outside the lock, the call may go over the network
+        vector = self._embed(question)
+        with self._lock:
+            match = self._semantic_match(org_id, vector, scope)
+            entry = self._get(match) if match else None
+            if entry is not None:
+                self.semantic_hits += 1
+                return self._hit(match, entry), vector
+            self.misses += 1
+            return None, vector
+
+    def store(
+        self,
+        org_id: str,
+        question: str,
+        answer: str,
+        document_ids: List[str],
+        confidence: float,
+        latency: float,
+        generation: int,
+        vector: Optional[np.ndarray] = None,
+        scope: str = "",
+        sources: Optional[List[Dict[str, Any]]] = None
+    ) -> bool:
+        """
+        Cache an answer computed after generation() returned generation. Blocking
+        when semantic lookups are on and vector is not given. Returns whether it was stored.
+        """
+        if self.similarity > 0 and vector is None:
+            vector = self._embed(question)
+        key = self._key(org_id, question, scope)
+        with self._lock:
+            if self._generations.get(org_id, 0) != generation:
+                return False
+            self._remove(key)
+            self._entries[key] = CachedAnswer(answer, list(document_ids), confidence, latency, vector, scope, list(sources or []))
+            self._org_keys.setdefault(org_id, {})[key[1]] = None
+            if vector is not None:
+                matrix = self._matrices.get((org_id, scope))
+                if matrix is None:
+                    matrix = self._matrices[(org_id, scope)] = _QuestionMatrix(len(vector))
+                matrix.add(key[1], vector)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+            return True
+
+    def invalidate(self, org_id: str) -> int:
+        """Drop every cached answer of an organization. Returns the number of entries dropped."""
+        with self._lock:
+            keys = list(self._org_keys.get(org_id, {}))
+            for question in keys:
+                self._remove((org_id, question))
+            self._generations[org_id] = self._generations.get(org_id, 0) + 1
+            self.invalidations += 1
+            return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "saved_seconds": self.saved_seconds,
+                "invalidations": self.invalidations
+            }
+
+
+answer_cache = AnswerCache(
+    max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+    ttl=settings.ANSWER_CACHE_TTL,
+    similarity=settings.ANSWER_CACHE_SIMILARITY
+)
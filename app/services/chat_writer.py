@@ -0,0 +1,205 @@
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from bson import ObjectId
+from pymongo import InsertOne, UpdateOne
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.errors import BulkWriteError
+from core import logger, settings
+from schema import ChatHistoryCreate
+
+
+class ChatHistoryWriter:
+    """
+    Write-behind buffer for chat history.
+
+    submit() buffers a turn's messages and returns without waiting for
+    MongoDB. A flusher task writes whatever all sessions buffered with one
+    bulk_write to chatMessages and one to chatHistory, once flush_messages
+    messages are buffered or every flush_interval seconds. At most
+    max_messages are held: past that, submit() waits for a flush, so a slow
+    database slows callers down instead of growing memory. stop() flushes
+    what is left, so a graceful shutdown loses no messages, and pending()
+    lets reads see messages not written yet.
+    """
+
+    def __init__(
+        self,
+        flush_messages: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        max_messages: Optional[int] = None
+    ):
+        self.flush_messages = flush_messages or settings.CHAT_FLUSH_MESSAGES
+        self.flush_interval = flush_interval or settings.CHAT_FLUSH_INTERVAL
+        self.max_messages = max_messages or settings.CHAT_BUFFER_MESSAGES
+        self._db: Optional[AsyncDatabase] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._messages: List[Dict[str, Any]] = []
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        # Messages of the flush in progress, still visible to pending()
+        self._flushing: List[Dict[str, Any]] = []
+        self._flush_lock = asyncio.Lock()
+        self._space = asyncio.Condition()
+        self._wake = asyncio.Event()
+        self.messages = 0
+        self.flushes = 0
+        self.round_trips = 0
+        self.waits = 0
+        self.failures = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self, db: AsyncDatabase) -> None:
+        """Start the flusher task."""
+        if self._task is not None:
+            return
+        self._db = db
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            f"Started chat history writer, flushing every {self.flush_interval}s "
+            f"or {self.flush_messages} messages, buffering up to {self.max_messages}"
+        )
+
+    async def stop(self) -> None:
+        """Stop the flusher task and write every buffered message."""
+        if self._task is None:
+            return
+        # Not cancelled, so a flush in progress is never cut off halfway
+        self._stopping = True
+        self._wake.set()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await self.flush()
+        if self._messages or self._sessions:
+            logger.error(f"Chat history writer stopped with {len(self._messages)} messages not written")
+
+    def _buffered(self) -> int:
+        return len(self._messages) + len(self._flushing)
+
+    async def submit(self, payload: ChatHistoryCreate) -> None:
+        """Buffer a session's new messages, waiting for a flush while the buffer is full."""
+        async with self._space:
+            while self._buffered() and self._buffered() + len(payload.messages) > self.max_messages:
+                self.waits += 1
+                self._wake.set()
+                await self._space.wait()
+            now = datetime.now(timezone.utc)
+            # ObjectIds taken now keep the messages in submission order once written
+            self._messages.extend(
+                {"_id": ObjectId(), "sessionId": payload.sessionId, **msg.model_dump(exclude={"id"})}
+                for msg in payload.messages
+            )
+            self._merge_session(payload.sessionId, {
+                "userId": payload.userId,
+                "orgId": payload.orgId,
+                "isActive": payload.isActive,
+                "createdAt": now,
+                "updatedAt": now,
+                "count": len(payload.messages)
+            })
+            self.messages += len(payload.messages)
+        if len(self._messages) >= self.flush_messages:
+            self._wake.set()
+
+    def _merge_session(self, session_id: str, update: Dict[str, Any]) -> None:
+        current = self._sessions.get(session_id)
+        if current is None:
+            self._sessions[session_id] = update
+            return
+        # The older update's fields are the ones an insert must set
+        older, newer = (update, current) if update["createdAt"] < current["createdAt"] else (current, update)
+        self._sessions[session_id] = {**older, "updatedAt": newer["updatedAt"], "count": current["count"] + update["count"]}
+
+    def pending(self, session_id: str) -> List[Dict[str, Any]]:
+        """A session's messages not written to MongoDB yet, oldest first."""
+        return [msg for msg in self._flushing + self._messages if msg["sessionId"] == session_id]
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def _insert_messages(self, messages: List[Dict[str, Any]]) -> None:
+        try:
+            await self._db.chatMessages.bulk_write([InsertOne(msg) for msg in messages], ordered=False)
+        except BulkWriteError as e:
+            # Messages a failed flush did write already exist, retrying them is harmless
+            if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+        finally:
+            self.round_trips += 1
+
+    async def _update_sessions(self, sessions: Dict[str, Dict[str, Any]]) -> None:
+        try:
+            await self._db.chatHistory.bulk_write([
+                UpdateOne(
+                    {"sessionId": session_id},
+                    {
+                        "$setOnInsert": {
+                            "userId": update["userId"],
+                            "orgId": update["orgId"],
+                            "isActive": update["isActive"],
+                            "createdAt": update["createdAt"]
+                        },
+                        "$set": {"updatedAt": update["updatedAt"]},
+                        "$inc": {"messageCount": update["count"]}
+                    },
+                    upsert=True
+                )
+                for session_id, update in sessions.items()
+            ], ordered=False)
+        finally:
+            self.round_trips += 1
+
+    async def flush(self) -> int:
+        """Write everything buffered. Returns the number of messages written; on failure they stay buffered."""
+        async with self._flush_lock:
+            if not self._messages and not self._sessions:
+                return 0
+            messages, sessions = self._messages, self._sessions
+            self._messages, self._sessions = [], {}
+            self._flushing = messages
+            written = 0
+            try:
+                if messages:
+                    await self._insert_messages(messages)
+                    written = len(messages)
+                await self._update_sessions(sessions)
+                self.flushes += 1
+            except Exception as e:
+                self.failures += 1
+                logger.warning(f"Chat history flush of {len(messages)} messages failed, retrying later: {str(e)}")
+                if not written:
+                    self._messages = messages + self._messages
+                # The session updates go out again with the next flush
+                for session_id, update in sessions.items():
+                    self._merge_session(session_id, update)
+            finally:
+                self._flushing = []
+            async with self._space:
+                self._space.notify_all()
+            if written:
+                logger.debug(f"Flushed {written} chat messages of {len(sessions)} sessions")
+            return written
+
+    def stats(self) -> Dict[str, Any]:
+        """Messages submitted, flushes and MongoDB round trips so far, and the current buffer."""
+        return {
+            "messages": self.messages,
+            "flushes": self.flushes,
+            "round_trips": self.round_trips,
+            "buffered": self._buffered(),
+            "waits": self.waits,
+            "failures": self.failures
+        }
+
+
+chat_writer = ChatHistoryWriter()
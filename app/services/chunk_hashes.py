@@ -0,0 +1,55 @@
+import asyncio
+from concurrent.futures import TimeoutError
+from typing import Any, Coroutine, Dict, List, Optional
+from pymongo import UpdateOne
+from pymongo.asynchronous.database import AsyncDatabase
+from core import settings
+
+
+class MongoChunkHashStore:
+    """
+    Chunk hash store backed by the chunkHashes collection.
+
+    process_all_pdfs runs in a worker thread, so every call is scheduled on
+    the event loop that owns the async database client and waited for, at
+    most settings.INGEST_DB_TIMEOUT seconds so a loop that is shutting down
+    cannot block the thread forever.
+
+    Vectors can only be fetched from the namespace they were stored in, so
+    hashes are recorded per namespace. Entries of the default namespace keep
+    the bare hash as their key.
+    """
+
+    def __init__(self, db: AsyncDatabase, loop: asyncio.AbstractEventLoop, namespace: Optional[str] = None):
+        self._db = db
+        self._loop = loop
+        self._prefix = f"{namespace}/" if namespace else ""
+
+    def _wait(self, coro: Coroutine[Any, Any, Any]) -> Any:
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        try:
+            return future.result(timeout=settings.INGEST_DB_TIMEOUT)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    def lookup(self, hashes: List[str]) -> Dict[str, str]:
+        return self._wait(self._lookup(hashes))
+
+    def record(self, vector_ids: Dict[str, str]) -> None:
+        if vector_ids:
+            self._wait(self._record(vector_ids))
+
+    async def _lookup(self, hashes: List[str]) -> Dict[str, str]:
+        found = {}
+        keys = [self._prefix + h for h in hashes]
+        async for doc in self._db.chunkHashes.find({"_id": {"$in": keys}}):
+            found[doc["_id"][len(self._prefix):]] = doc["vectorId"]
+        return found
+
+    async def _record(self, vector_ids: Dict[str, str]) -> None:
+        # Overwrite stale entries whose vector was removed together with its document
+        await self._db.chunkHashes.bulk_write(
+            [UpdateOne({"_id": self._prefix + h}, {"$set": {"vectorId": vector_id}}, upsert=True) for h, vector_id in vector_ids.items()],
+            ordered=False
+        )
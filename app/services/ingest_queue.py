@@ -0,0 +1,243 @@
+import asyncio
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.asynchronous.database import AsyncDatabase
+from core import logger, settings
+from rag1.main import process_all_pdfs
+from services.retrieval_cache import invalidate_org_caches
+from services.chunk_hashes import MongoChunkHashStore
+from utils import org_namespace
+from schema import ProcessingResult
+
+
+class IngestJobQueue:
+    """
+    In-process queue that runs PDF ingestion in the background.
+
+    Jobs are persisted in the ingestJobs collection so their status can be
+    polled and so queued work survives a restart. A fixed pool of worker
+    tasks bounds how many ingestions run at once; each ingestion runs in a
+    thread so parsing, embedding and upserts never block the event loop.
+
+    Several processes may share the collection, so a worker only runs a job
+    it claimed by atomically moving it from queued to running under its
+    owner ID. A running job's owner refreshes its heartbeat while it works;
+    one whose heartbeat is older than settings.INGEST_JOB_LEASE is taken to
+    be abandoned by a crashed process and queued again at startup.
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers or settings.INGEST_WORKERS
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._queue: "asyncio.Queue[Optional[ObjectId]]" = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+        self._db: Optional[AsyncDatabase] = None
+        # Seen by ingestion threads, which stop between batches once it is set
+        self._stopping = threading.Event()
+
+    async def start(self, db: AsyncDatabase) -> None:
+        """Start the worker pool and enqueue jobs left unfinished by a previous run."""
+        if self._tasks:
+            return
+        self._db = db
+        self._stopping.clear()
+        self._queue = asyncio.Queue()
+        await self._recover_jobs()
+        self._tasks = [asyncio.create_task(self._worker(n)) for n in range(self.workers)]
+        logger.info(f"Started ingestion queue with {self.workers} workers as {self.owner}")
+
+    async def stop(self) -> None:
+        """
+        Stop the worker pool. Running ingestions stop after their current batch
+        and go back to the queue with their staged files, so unfinished jobs
+        resume on next start.
+        """
+        if not self._tasks:
+            return
+        self._stopping.set()
+        # Wake idle workers so they see the stop
+        for _ in self._tasks:
+            self._queue.put_nowait(None)
+        _, pending = await asyncio.wait(self._tasks, timeout=settings.INGEST_STOP_TIMEOUT)
+        for task in pending:
+            logger.warning("Ingestion worker did not stop in time, its job is queued again once its lease expires")
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, org_id: str, document_mappings: Dict[str, str], staging_dir: Path) -> str:
+        """Persist a new ingestion job and enqueue it. Returns the job ID."""
+        job = {
+            "organizationId": org_id,
+            "documentIds": list(document_mappings.values()),
+            "files": [{"filename": name, "documentId": doc_id} for name, doc_id in document_mappings.items()],
+            "stagingDir": str(staging_dir),
+            "status": "queued",
+            "stage": "queued",
+            "progress": {"pages": 0, "chunks": 0, "vectors": 0},
+            "timings": {"queuedAt": datetime.now(timezone.utc)},
+            "result": None,
+            "error": None
+        }
+        result = await self._db.ingestJobs.insert_one(job)
+        await self._queue.put(result.inserted_id)
+        logger.info(f"Queued ingestion job {result.inserted_id} for organization {org_id}")
+        return str(result.inserted_id)
+
+    async def _recover_jobs(self) -> None:
+        expired = datetime.now(timezone.utc) - timedelta(seconds=settings.INGEST_JOB_LEASE)
+        result = await self._db.ingestJobs.update_many(
+            {
+                "status": "running",
+                "$or": [
+                    {"heartbeatAt": {"$lt": expired}},
+                    # Jobs started before heartbeats were recorded
+                    {"heartbeatAt": {"$exists": False}, "timings.startedAt": {"$lt": expired}}
+                ]
+            },
+            {"$set": {"status": "queued", "stage": "queued"}, "$unset": {"owner": ""}}
+        )
+        if result.modified_count:
+            logger.info(f"Re-queued {result.modified_count} ingestion jobs abandoned by their owner")
+        # Other processes may enqueue the same jobs, only the one that claims a job runs it
+        async for job in self._db.ingestJobs.find({"status": "queued"}, {"_id": 1}).sort("_id", 1):
+            await self._queue.put(job["_id"])
+            logger.info(f"Queued unfinished ingestion job {job['_id']}")
+
+    async def _worker(self, worker_no: int) -> None:
+        while not self._stopping.is_set():
+            job_id = await self._queue.get()
+            if job_id is None or self._stopping.is_set():
+                self._queue.task_done()
+                break
+            try:
+                await self._run_job(job_id)
+            except Exception as e:
+                logger.error(f"Ingestion worker {worker_no} failed on job {job_id}: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    async def _set_documents_status(self, document_ids: List[str], status: str) -> None:
+        object_ids = [ObjectId(doc_id) for doc_id in document_ids if ObjectId.is_valid(doc_id)]
+        await self._db.documents.update_many({"_id": {"$in": object_ids}}, {"$set": {"status": status}})
+
+    async def _claim(self, job_id: ObjectId) -> Optional[Dict[str, Any]]:
+        """Move a queued job to running under this queue's owner ID. None if it is not queued anymore."""
+        now = datetime.now(timezone.utc)
+        return await self._db.ingestJobs.find_one_and_update(
+            {"_id": job_id, "status": "queued"},
+            {"$set": {
+                "status": "running",
+                "stage": "parsing",
+                "owner": self.owner,
+                "heartbeatAt": now,
+                "timings.startedAt": now
+            }},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _release(self, job_id: ObjectId) -> None:
+        """Put a job this queue stopped back in the queue for the next start."""
+        await self._db.ingestJobs.update_one(
+            {"_id": job_id, "owner": self.owner},
+            {"$set": {"status": "queued", "stage": "queued"}, "$unset": {"owner": ""}}
+        )
+        logger.info(f"Ingestion job {job_id} stopped, queued again")
+
+    async def _run_job(self, job_id: ObjectId) -> None:
+        job = await self._claim(job_id)
+        if job is None:
+            # Finished, or claimed by another worker
+            return
+
+        staging_dir = Path(job["stagingDir"])
+        if not staging_dir.exists():
+            await self._finish(job, "failed", error="Staged files are no longer available")
+            return
+
+        await self._set_documents_status(job["documentIds"], "processing")
+
+        # The ingestion thread only writes into this dict; this coroutine persists it periodically
+        state: Dict[str, Any] = {}
+
+        def on_progress(stage: str, progress: Dict[str, Any]) -> None:
+            state.update(progress, stage=stage)
+
+        document_mappings = {f["filename"]: f["documentId"] for f in job["files"]}
+        chunk_store = MongoChunkHashStore(self._db, asyncio.get_running_loop(), org_namespace(job["organizationId"]))
+        task = asyncio.create_task(asyncio.to_thread(
+            process_all_pdfs, job["organizationId"], document_mappings, staging_dir, on_progress, chunk_store,
+            self._stopping
+        ))
+        while not task.done():
+            await asyncio.wait({task}, timeout=settings.INGEST_PROGRESS_INTERVAL)
+            # Saving progress also refreshes the heartbeat that keeps the job claimed
+            await self._save_progress(job_id, dict(state))
+
+        try:
+            response = task.result()
+        except Exception as e:
+            await self._finish(job, "failed", error=str(e))
+            return
+
+        if response.get("status") == "stopped":
+            await self._release(job_id)
+            return
+        await self._finish(job, "completed", response=response)
+
+    async def _save_progress(self, job_id: ObjectId, state: Dict[str, Any]) -> None:
+        update = {"stage": state.get("stage", "parsing"), "heartbeatAt": datetime.now(timezone.utc)}
+        for key in ("pages", "chunks", "vectors"):
+            if key in state:
+                update[f"progress.{key}"] = state[key]
+        for key, seconds in state.get("timings", {}).items():
+            update[f"timings.{key}"] = seconds
+        await self._db.ingestJobs.update_one({"_id": job_id}, {"$set": update})
+
+    async def _finish(self, job: Dict[str, Any], status: str, response: Optional[Dict[str, Any]] = None, error: Optional[str] = None) -> None:
+        update: Dict[str, Any] = {
+            "status": status,
+            "stage": "done",
+            "timings.finishedAt": datetime.now(timezone.utc),
+            "error": error
+        }
+        if response is not None:
+            timings = response.get("timings", {})
+            chunks_processed = response.get("chunks_processed", 0)
+            chunks_deduplicated = response.get("chunks_deduplicated", 0)
+            update["result"] = ProcessingResult(
+                status=response.get("status", "unknown"),
+                message=response.get("message", "Processing completed"),
+                chunks_processed=chunks_processed,
+                documents_loaded=response.get("documents_loaded", 0),
+                processing_time=response.get("processing_time"),
+                chunks_deduplicated=chunks_deduplicated,
+                dedup_hit_rate=chunks_deduplicated / chunks_processed if chunks_processed else 0.0
+            ).model_dump()
+            update["progress.pages"] = response.get("documents_loaded", 0)
+            update["progress.chunks"] = response.get("chunks_processed", 0)
+            update["progress.vectors"] = response.get("chunks_processed", 0)
+            for key, seconds in timings.items():
+                update[f"timings.{key}"] = seconds
+        else:
+            update["result"] = ProcessingResult(
+                status="failed",
+                message=f"PDF processing failed: {error}",
+                error_details=error
+            ).model_dump()
+
+        await self._db.ingestJobs.update_one({"_id": job["_id"]}, {"$set": update})
+        await self._set_documents_status(job["documentIds"], "indexed" if status == "completed" else "failed")
+        # Answers and results cached while the documents were being ingested do not reflect them
+        invalidate_org_caches(job["organizationId"])
+        logger.info(f"Ingestion job {job['_id']} {status}")
+
+
+ingest_queue = IngestJobQueue()
@@ -0,0 +1,72 @@
+import threading
+from typing import Optional
+import httpx
+from langchain_openai import ChatOpenAI
+from core import settings, logger
+
+
+class LLMClientRegistry:
+    """
+    Process-wide chat model client, created once at application startup.
+
+    Every query reuses the same ChatOpenAI, whose httpx clients keep their
+    connections to the API alive between requests, so a query no longer pays
+    for building a client or for a new connection and TLS handshake.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._chat: Optional[ChatOpenAI] = None
+        self._http_client: Optional[httpx.Client] = None
+        self._http_async_client: Optional[httpx.AsyncClient] = None
+
+    def start(self) -> None:
+        """Create the clients. Called on application startup, and on first use otherwise."""
+        with self._lock:
+            if self._chat is not None:
+                return
+            timeout = httpx.Timeout(settings.CHAT_TIMEOUT, connect=settings.CHAT_CONNECT_TIMEOUT)
+            limits = httpx.Limits(
+                max_connections=settings.CHAT_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.CHAT_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.CHAT_KEEPALIVE_EXPIRY
+            )
+            self._http_client = httpx.Client(timeout=timeout, limits=limits)
+            self._http_async_client = httpx.AsyncClient(timeout=timeout, limits=limits)
+            self._chat = ChatOpenAI(
+                model_name=settings.CHAT_MODEL,
+                temperature=settings.CHAT_TEMPERATURE,
+                api_key=settings.OPENAI_API_KEY,
+                base_url=settings.OPENAI_BASE_URL,
+                timeout=timeout,
+                max_retries=settings.CHAT_MAX_RETRIES,
+                http_client=self._http_client,
+                http_async_client=self._http_async_client
+            )
+            logger.info(
+                f"Created chat model client for {settings.CHAT_MODEL} "
+                f"with up to {settings.CHAT_MAX_CONNECTIONS} pooled connections"
+            )
+
+    def chat(self) -> ChatOpenAI:
+        if self._chat is None:
+            self.start()
+        return self._chat
+
+    async def close(self) -> None:
+        """Close the pooled connections. Called on application shutdown."""
+        with self._lock:
+            http_client, http_async_client = self._http_client, self._http_async_client
+            self._chat = self._http_client = self._http_async_client = None
+        if http_async_client is not None:
+            await http_async_client.aclose()
+        if http_client is not None:
+            http_client.close()
+
+
+llm_clients = LLMClientRegistry()
+
+
+def get_chat_model() -> ChatOpenAI:
+    """The shared chat model client of this process."""
+    return llm_clients.chat()
@@ -0,0 +1,150 @@
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+from pypdf import PdfReader
+from langchain.schema import Document
+from core import logger, settings
+
+# Process-wide parse pool, created lazily on first use and shared by concurrent ingestion jobs
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _extract_page_range(file_path: str, start: int, stop: int) -> List[str]:
+    """Extract the text of pages [start, stop) of a PDF. Runs inside a worker process."""
+    reader = PdfReader(file_path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def _count_pages(file_path: str) -> int:
+    """Return the number of pages in a PDF without extracting any text."""
+    return len(PdfReader(file_path).pages)
+
+
+def _plan_tasks(file_paths: List[str], pages_per_task: int) -> List[Tuple[str, int, int]]:
+    """Split every PDF into (path, start, stop) page ranges of at most pages_per_task pages."""
+    tasks = []
+    for file_path in file_paths:
+        try:
+            page_count = _count_pages(file_path)
+        except Exception as e:
+            logger.error(f"Unable to read PDF {file_path}: {str(e)}")
+            continue
+        for start in range(0, page_count, pages_per_task):
+            tasks.append((file_path, start, min(start + pages_per_task, page_count)))
+    return tasks
+
+
+def get_parse_executor() -> ProcessPoolExecutor:
+    """Return the shared parse pool, sized once by settings.PDF_PARSE_WORKERS."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Workers are spawned, forking a process running event loop and client threads can deadlock
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.PDF_PARSE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            logger.info(f"Started PDF parse pool with {settings.PDF_PARSE_WORKERS} workers")
+        return _executor
+
+
+def shutdown_parse_executor() -> None:
+    """Shut down the shared parse pool. Called on application shutdown."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+
+def _to_documents(file_path: str, pages: List[str], document_mappings: Dict[str, str]) -> List[Document]:
+    """Wrap extracted page texts in Documents carrying only the documentId metadata."""
+    filename = os.path.basename(file_path)
+    document_id = document_mappings.get(filename)
+    docs = []
+    for text in pages:
+        doc = Document(page_content=text, metadata={})
+        if document_id:
+            doc.metadata['documentId'] = document_id
+        docs.append(doc)
+    return docs
+
+
+def iter_parsed_pages(
+    file_paths: List[str],
+    document_mappings: Dict[str, str],
+    max_workers: Optional[int] = None,
+    pages_per_task: Optional[int] = None
+) -> Iterator[List[Document]]:
+    """
+    Parse PDFs on the parse pool and yield their pages one page range at a time.
+
+    Page ranges are yielded in file order and page order as soon as they are
+    ready, with at most two tasks per worker in flight, so callers can start
+    on the first pages while later ones are still being parsed.
+
+    Args:
+        file_paths: PDF files to parse, in the order their pages should be returned
+        document_mappings: Mapping of filename to document ID
+        max_workers: Page ranges parsed at once by this call, defaults to settings.PDF_PARSE_WORKERS
+        pages_per_task: Pages per task, defaults to settings.PDF_PAGES_PER_TASK
+
+    Yields:
+        Page documents of one page range, carrying only documentId metadata
+    """
+    workers = max_workers or settings.PDF_PARSE_WORKERS
+    tasks = _plan_tasks(file_paths, pages_per_task or settings.PDF_PAGES_PER_TASK)
+    for file_path in {task[0] for task in tasks}:
+        if not document_mappings.get(os.path.basename(file_path)):
+            logger.warning(f"No document ID found for {os.path.basename(file_path)}")
+
+    if workers <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield _to_documents(task[0], _extract_page_range(*task), document_mappings)
+        return
+
+    executor = get_parse_executor()
+    pending: Deque[Tuple[str, Future]] = deque()
+    next_task = 0
+    try:
+        while next_task < len(tasks) or pending:
+            while next_task < len(tasks) and len(pending) < workers * 2:
+                task = tasks[next_task]
+                pending.append((task[0], executor.submit(_extract_page_range, *task)))
+                next_task += 1
+            # Wait on the oldest task so page order is preserved
+            file_path, future = pending.popleft()
+            yield _to_documents(file_path, future.result(), document_mappings)
+    finally:
+        for _, future in pending:
+            future.cancel()
+
+
+def parse_pdfs(
+    file_paths: List[str],
+    document_mappings: Dict[str, str],
+    max_workers: Optional[int] = None,
+    pages_per_task: Optional[int] = None
+) -> List[Document]:
+    """
+    Parse PDFs into one Document per page, fanning page ranges out to the parse pool.
+
+    Args:
+        file_paths: PDF files to parse, in the order their pages should be returned
+        document_mappings: Mapping of filename to document ID
+        max_workers: Page ranges parsed at once by this call, defaults to settings.PDF_PARSE_WORKERS
+        pages_per_task: Pages per task, defaults to settings.PDF_PAGES_PER_TASK
+
+    Returns:
+        Page documents in file order and page order, carrying only documentId metadata
+    """
+    docs = []
+    for pages in iter_parsed_pages(file_paths, document_mappings, max_workers, pages_per_task):
+        docs.extend(pages)
+
+    logger.info(f"Parsed {len(docs)} pages from {len(file_paths)} PDFs")
+    return docs
@@ -0,0 +1,39 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+from core import logger, settings
+
+T = TypeVar("T")
+
+# Process-wide pool for the blocking calls of the query path, created lazily on first use
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_query_executor() -> ThreadPoolExecutor:
+    """
+    Return the shared query pool.
+
+    Queries get their own pool instead of the event loop's default one, whose
+    size follows the CPU count, because their blocking calls wait on the network
+    and ingestion keeps the default pool busy.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.QUERY_THREADS, thread_name_prefix="query")
+        logger.info(f"Started query pool with {settings.QUERY_THREADS} threads")
+    return _executor
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking call of the query path in the query pool without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_query_executor(), functools.partial(func, *args, **kwargs))
+
+
+def shutdown_query_executor() -> None:
+    """Shut down the shared query pool. Called on application shutdown."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
@@ -0,0 +1,144 @@
+import math
+import threading
+from typing import Dict, List, Optional, Tuple
+from langchain_core.documents import Document
+import numpy as np
+from core import settings, logger
+from utils import fetch_vectors, tokenize
+
+
+class Reranker:
+    """
+    Reorders over-fetched (chunk, similarity) candidates and keeps the best k.
+
+    Rerankers only change the order: every chunk keeps its vector similarity
+    as its score, so confidence and minScore mean the same with any of them.
+    This base class keeps the retrieval order.
+    """
+
+    name = "none"
+
+    def rerank(
+        self,
+        query: str,
+        candidates: List[Tuple[Document, float]],
+        k: int,
+        namespace: Optional[str] = None
+    ) -> List[Tuple[Document, float]]:
+        return candidates[:k]
+
+
+class LexicalOverlapReranker(Reranker):
+    """
+    Blends vector similarity with how much of the query a chunk contains,
+    query terms weighted by their rarity among the candidates.
+    """
+
+    name = "lexical"
+
+    def __init__(self, weight: float):
+        self.weight = weight
+
+    def rerank(self, query, candidates, k, namespace=None):
+        query_terms = set(tokenize(query))
+        if not query_terms or not candidates:
+            return candidates[:k]
+        chunk_terms = [set(tokenize(doc.page_content)) for doc, _ in candidates]
+        idf = {
+            term: math.log(1 + len(candidates) / (1 + sum(term in terms for terms in chunk_terms)))
+            for term in query_terms
+        }
+        total = sum(idf.values()) or 1.0
+        blended = [
+            (1 - self.weight) * score + self.weight * sum(idf[term] for term in query_terms & terms) / total
+            for (_, score), terms in zip(candidates, chunk_terms)
+        ]
+        order = sorted(range(len(candidates)), key=lambda i: -blended[i])
+        return [candidates[i] for i in order[:k]]
+
+
+class MMRReranker(Reranker):
+    """
+    Maximal marginal relevance: picks chunks ranked high by retrieval but not
+    similar to the chunks already picked, so near-duplicates do not fill the
+    prompt. Relevance is the retrieval rank, so keyword hits of hybrid search
+    count as much as vector hits; similarity between chunks uses their stored
+    vectors.
+    """
+
+    name = "mmr"
+
+    def __init__(self, lambda_mult: float):
+        self.lambda_mult = lambda_mult
+
+    def rerank(self, query, candidates, k, namespace=None):
+        if len(candidates) <= 1:
+            return candidates[:k]
+        vectors = fetch_vectors([doc.id for doc, _ in candidates if doc.id], namespace)
+        dim = len(next(iter(vectors.values()))) if vectors else 1
+        matrix = np.array([vectors.get(doc.id, np.zeros(dim)) for doc, _ in candidates], dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+        relevance = 1.0 - np.arange(len(candidates)) / len(candidates)
+
+        picked = [0]
+        redundancy = matrix @ matrix[0]
+        while len(picked) < min(k, len(candidates)):
+            marginal = self.lambda_mult * relevance - (1 - self.lambda_mult) * redundancy
+            marginal[picked] = -np.inf
+            best = int(np.argmax(marginal))
+            picked.append(best)
+            redundancy = np.maximum(redundancy, matrix @ matrix[best])
+        return [candidates[i] for i in picked]
+
+
+class CrossEncoderReranker(Reranker):
+    """Scores (query, chunk) pairs with a local cross-encoder model from sentence-transformers."""
+
+    name = "cross-encoder"
+
+    def __init__(self, model_name: str):
+        # Optional dependency, only needed when this reranker is configured
+        from sentence_transformers import CrossEncoder
+        self._model = CrossEncoder(model_name)
+        self._lock = threading.Lock()
+
+    def rerank(self, query, candidates, k, namespace=None):
+        if not candidates:
+            return []
+        with self._lock:
+            scores = self._model.predict([(query, doc.page_content) for doc, _ in candidates])
+        order = sorted(range(len(candidates)), key=lambda i: -float(scores[i]))
+        return [candidates[i] for i in order[:k]]
+
+
+_rerankers: Dict[str, Reranker] = {}
+_rerankers_lock = threading.Lock()
+
+
+def _create_reranker(name: str) -> Reranker:
+    if name == "cross-encoder":
+        try:
+            return CrossEncoderReranker(settings.RERANK_CROSS_ENCODER_MODEL)
+        except Exception as e:
+            logger.warning(f"Cross-encoder reranker unavailable, using lexical overlap instead: {str(e)}")
+            return LexicalOverlapReranker(settings.RERANK_LEXICAL_WEIGHT)
+    if name == "lexical":
+        return LexicalOverlapReranker(settings.RERANK_LEXICAL_WEIGHT)
+    if name == "mmr":
+        return MMRReranker(settings.RERANK_MMR_LAMBDA)
+    return Reranker()
+
+
+def get_reranker(name: Optional[str] = None) -> Reranker:
+    """The reranker called name, settings.RERANKER by default, created on first use."""
+    name = name or settings.RERANKER
+    reranker = _rerankers.get(name)
+    if reranker is None:
+        with _rerankers_lock:
+            reranker = _rerankers.get(name)
+            if reranker is None:
+                reranker = _create_reranker(name)
+                _rerankers[name] = reranker
+    return reranker
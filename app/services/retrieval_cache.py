@@ -0,0 +1,97 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from core import settings
+from services.answer_cache import answer_cache
+
+
+class RetrievalCache:
+    """
+    In-process TTL + LRU cache of top-k retrieval results.
+
+    Keys are (orgId, generation, query embedding hash, k, filter). Ingestion
+    and deletion bump the organization's generation, so results retrieved
+    before its documents changed are never looked up again and simply age
+    out. The generation is read when the key is built, before the search
+    runs, so a search racing an update is stored under the old generation.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, List[Document]]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.bumps = 0
+
+    def generation(self, org_id: str) -> int:
+        with self._lock:
+            return self._generations.get(org_id, 0)
+
+    def bump(self, org_id: str) -> int:
+        """Start a new generation for an organization whose documents changed."""
+        with self._lock:
+            self._generations[org_id] = self._generations.get(org_id, 0) + 1
+            self.bumps += 1
+            return self._generations[org_id]
+
+    def key(self, org_id: str, query_vector: List[float], k: int, filter: Optional[Dict[str, Any]] = None) -> Hashable:
+        vector_hash = hashlib.sha256(np.asarray(query_vector, dtype=np.float32).tobytes()).hexdigest()
+        filter_key = json.dumps(filter, sort_keys=True, default=str) if filter else ""
+        return (org_id, self.generation(org_id), vector_hash, k, filter_key)
+
+    def get(self, key: Hashable) -> Optional[List[Document]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(entry[1])
+
+    def put(self, key: Hashable, docs: List[Document]) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), list(docs))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "expirations": self.expirations,
+                "evictions": self.evictions,
+                "generation_bumps": self.bumps
+            }
+
+
+retrieval_cache = RetrievalCache(
+    max_entries=settings.RETRIEVAL_CACHE_MAX_ENTRIES,
+    ttl=settings.RETRIEVAL_CACHE_TTL
+)
+
+
+def invalidate_org_caches(org_id: str) -> None:
+    """Forget the cached answers and retrieval results of an organization whose documents changed."""
+    answer_cache.invalidate(org_id)
+    retrieval_cache.bump(org_id)
@@ -0,0 +1,74 @@
+import asyncio
+import hashlib
+import os
+from typing import Any, Dict, Optional
+from core import logger, settings, BadRequestException, PayloadTooLargeException
+
+PDF_MAGIC = b"%PDF-"
+
+
+async def stream_upload_to_disk(
+    file: Any,
+    file_path: str,
+    max_bytes: Optional[int] = None,
+    chunk_size: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Stream an uploaded file to disk in fixed-size chunks.
+
+    Size, SHA-256 and the PDF magic-byte check are computed in the same pass,
+    and file writes run in a thread so the event loop is never blocked. A
+    partially written file is removed if the upload is rejected.
+
+    Args:
+        file: Object with an async read(size) method, e.g. fastapi.UploadFile
+        file_path: Destination path
+        max_bytes: Reject the file once it grows past this many bytes
+        chunk_size: Bytes read per chunk, defaults to settings.UPLOAD_CHUNK_SIZE
+
+    Returns:
+        Dict with the file size in bytes and its hex SHA-256 digest
+
+    Raises:
+        BadRequestException: If the file is empty or not a PDF
+        PayloadTooLargeException: If the file exceeds max_bytes
+    """
+    chunk_size = chunk_size or settings.UPLOAD_CHUNK_SIZE
+    sha256 = hashlib.sha256()
+    size = 0
+    head = b""
+
+    out = await asyncio.to_thread(open, file_path, "wb")
+    try:
+        while True:
+            chunk = await file.read(chunk_size)
+            if not chunk:
+                break
+
+            size += len(chunk)
+            if max_bytes is not None and size > max_bytes:
+                raise PayloadTooLargeException(f"File exceeds the {max_bytes} byte limit")
+
+            # The magic bytes may straddle the first chunks when chunks are tiny
+            if len(head) < len(PDF_MAGIC):
+                head += chunk[:len(PDF_MAGIC) - len(head)]
+                if len(head) == len(PDF_MAGIC) and head != PDF_MAGIC:
+                    raise BadRequestException("File content is not a PDF")
+
+            sha256.update(chunk)
+            await asyncio.to_thread(out.write, chunk)
+
+        if size == 0:
+            raise BadRequestException("File is empty")
+        if head != PDF_MAGIC:
+            raise BadRequestException("File content is not a PDF")
+    except Exception:
+        await asyncio.to_thread(out.close)
+        try:
+            os.remove(file_path)
+        except OSError as e:
+            logger.warning(f"Unable to remove rejected upload {file_path}: {str(e)}")
+        raise
+
+    await asyncio.to_thread(out.close)
+    return {"size": size, "sha256": sha256.hexdigest()}
@@ -1,5 +1,7 @@
-from .embedding_generator import get_embedding_model
-from .pinecone_store import get_vectorstore, pc
+from .embedding_generator import get_embedding_model, get_embedding_scheduler, get_query_batcher, text_hash, DedupEmbeddings
+from .vector_store import get_vectorstore, fetch_vectors, get_vector_backend, org_namespace
 from .text_chunker import get_text_splitter, chunk_text
+from .context_builder import build_context, Context
+from .lexical_index import get_lexical_index, tokenize
 
-__all__ = ["get_embedding_model","get_vectorstore","pc","get_text_splitter", "chunk_text"]
\ No newline at end of file
+__all__ = ["get_embedding_model","get_embedding_scheduler","get_query_batcher","text_hash","DedupEmbeddings","get_vectorstore","fetch_vectors","get_vector_backend","org_namespace","get_text_splitter", "chunk_text","build_context","Context","get_lexical_index","tokenize"]
\ No newline at end of file
@@ -0,0 +1,112 @@
+import math
+from pathlib import Path
+from typing import Any, List, Optional
+import numpy as np
+from core import logger
+from .local_vector_store import LocalVectorIndex
+
+
+class IVFVectorIndex(LocalVectorIndex):
+    """
+    Approximate cosine top-k over the local vector index with an inverted file (IVF).
+
+    Vectors are clustered with spherical k-means into nlist lists. A query scores
+    the centroids, then only the rows of its nprobe closest lists, so raising
+    nprobe trades latency for recall. New rows join their closest list as they
+    are inserted and deletes stay tombstones, so the lists only need rebuilding
+    with train() when the data drifts. Until min_train_vectors rows exist the
+    index answers with an exact scan.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        initial_capacity: int = 1024,
+        nlist: int = 0,
+        nprobe: int = 8,
+        min_train_vectors: int = 10000
+    ):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_vectors = min_train_vectors
+        self._centroids: Optional[np.ndarray] = None
+        self._members: List[List[int]] = []
+        super().__init__(path, initial_capacity)
+        centroids_path = self.path / "centroids.npy"
+        if self.dim and centroids_path.exists():
+            self._centroids = np.load(centroids_path)
+            self._rebuild_members()
+
+    def _open(self, capacity: int) -> None:
+        super()._open(capacity)
+        # List number + 1 per row, 0 means not assigned yet
+        self._lists = self._map("lists.i32", np.int32, (capacity,))
+
+    def _flush(self) -> None:
+        super()._flush()
+        self._lists.flush()
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        """Closest centroid of each vector, computed in batches to bound memory."""
+        lists = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), 65536):
+            lists[start:start + 65536] = np.argmax(vectors[start:start + 65536] @ self._centroids.T, axis=1)
+        return lists
+
+    def _rebuild_members(self) -> None:
+        lists = np.asarray(self._lists[:self._count]) - 1
+        self._members = [[] for _ in range(len(self._centroids))]
+        for row in np.flatnonzero(lists >= 0):
+            self._members[lists[row]].append(int(row))
+
+    def train(self, nlist: Optional[int] = None, iterations: int = 10, seed: int = 0) -> None:
+        """(Re)build the centroids from the live rows and reassign every row to a list."""
+        with self._lock:
+            alive = np.flatnonzero(self._alive[:self._count])
+            if not len(alive):
+                return
+            nlist = min(nlist or self.nlist or max(1, int(4 * math.sqrt(len(alive)))), len(alive))
+            rng = np.random.default_rng(seed)
+            # k-means converges well on a sample of a few hundred vectors per list
+            sample_rows = np.sort(rng.choice(alive, min(len(alive), nlist * 256), replace=False))
+            sample = np.asarray(self._vectors[sample_rows])
+            centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+            for _ in range(iterations):
+                self._centroids = centroids
+                assignment = self._assign(sample)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, assignment, sample)
+                norms = np.linalg.norm(sums, axis=1, keepdims=True)
+                # Lists that attracted no vectors keep their previous centroid
+                centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+
+            self._centroids = centroids.astype(np.float32)
+            np.save(self.path / "centroids.npy", self._centroids)
+            for start in range(0, self._count, 65536):
+                stop = min(start + 65536, self._count)
+                self._lists[start:stop] = self._assign(np.asarray(self._vectors[start:stop])) + 1
+            self._lists.flush()
+            self._rebuild_members()
+            self.nlist = nlist
+            logger.info(f"Trained IVF index at {self.path} with {nlist} lists over {len(alive)} vectors")
+
+    def _on_added(self, rows: np.ndarray, vectors: np.ndarray) -> None:
+        if self._centroids is None:
+            if int(self._alive[:self._count].sum()) >= self.min_train_vectors:
+                self.train()
+            return
+        lists = self._assign(vectors)
+        for row, list_no in zip(rows.tolist(), lists.tolist()):
+            # A re-inserted row may stay listed under its old list too; search de-duplicates
+            self._lists[row] = list_no + 1
+            self._members[list_no].append(row)
+
+    def _candidates(self, query: np.ndarray, nprobe: Optional[int] = None, **options: Any) -> Optional[np.ndarray]:
+        if self._centroids is None:
+            return None
+        nprobe = min(nprobe or self.nprobe, len(self._centroids))
+        scores = self._centroids @ query
+        probed = np.argpartition(-scores, nprobe - 1)[:nprobe]
+        members = [np.asarray(self._members[list_no], dtype=np.int64) for list_no in probed]
+        return np.unique(np.concatenate(members)) if members else np.empty(0, dtype=np.int64)
@@ -0,0 +1,110 @@
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+import tiktoken
+from langchain_core.documents import Document
+from core import settings
+
+# Overlaps shorter than this are more likely coincidence than splitter overlap
+MIN_OVERLAP_CHARS = 20
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    return tiktoken.encoding_for_model(model)
+
+
+def count_chat_tokens(text: str) -> int:
+    """Number of tokens text takes in the chat model's prompt."""
+    return len(_encoding(settings.CHAT_MODEL).encode(text))
+
+
+def chunk_position(doc: Document) -> Optional[int]:
+    """Position of a chunk in its document, taken from its '<documentId>#<position>' vector ID."""
+    _, sep, position = (doc.id or "").rpartition("#")
+    return int(position) if sep and position.isdigit() else None
+
+
+def overlap_length(previous: str, text: str, max_chars: Optional[int] = None) -> int:
+    """Length of the longest suffix of previous that text starts with."""
+    max_chars = min(len(previous), len(text), max_chars or len(text))
+    for start in range(len(previous) - max_chars, len(previous)):
+        if text.startswith(previous[start:]):
+            overlap = len(previous) - start
+            return overlap if overlap >= MIN_OVERLAP_CHARS else 0
+    return 0
+
+
+@dataclass
+class Context:
+    text: str
+    # (chunk, score) pairs that made it into the context, in context order
+    chunks: List[Tuple[Document, float]] = field(default_factory=list)
+    tokens: int = 0
+    # Tokens the plain join of every retrieved chunk would have taken on top of tokens
+    tokens_saved: int = 0
+
+
+def build_context(
+    scored: List[Tuple[Document, float]],
+    max_tokens: Optional[int] = None,
+    count_tokens: Optional[Callable[[str], int]] = None
+) -> Context:
+    """
+    Assemble the prompt context from retrieved (chunk, score) pairs, best first.
+
+    The best ranked chunks are kept while their tokens fit in max_tokens
+    (settings.QUERY_CONTEXT_TOKENS by default). Kept chunks are grouped by
+    document, documents ordered by their best chunk, and chunks put in
+    document order. Neighbouring chunks repeat the text splitter's overlap,
+    so that repeated text is cut from the second chunk and the two are
+    joined into one passage.
+    """
+    count_tokens = count_tokens or count_chat_tokens
+    max_tokens = settings.QUERY_CONTEXT_TOKENS if max_tokens is None else max_tokens
+    naive_tokens = count_tokens("\n\n".join(doc.page_content for doc, _ in scored)) if scored else 0
+
+    kept: List[Tuple[Document, float]] = []
+    budget = max_tokens
+    separator = count_tokens("\n\n")
+    for doc, score in scored:
+        cost = count_tokens(doc.page_content) + (separator if kept else 0)
+        if cost <= budget:
+            kept.append((doc, score))
+            budget -= cost
+
+    document_rank: Dict[str, int] = {}
+    for doc, _ in kept:
+        document_rank.setdefault(doc.metadata.get("documentId", ""), len(document_rank))
+    ordered = sorted(
+        enumerate(kept),
+        key=lambda item: (
+            document_rank[item[1][0].metadata.get("documentId", "")],
+            chunk_position(item[1][0]) if chunk_position(item[1][0]) is not None else float("inf"),
+            item[0]
+        )
+    )
+
+    passages: List[str] = []
+    chunks: List[Tuple[Document, float]] = []
+    previous: Optional[Document] = None
+    for _, (doc, score) in ordered:
+        text = doc.page_content
+        position = chunk_position(doc)
+        adjacent = (
+            previous is not None
+            and previous.metadata.get("documentId") == doc.metadata.get("documentId")
+            and position is not None
+            and chunk_position(previous) == position - 1
+        )
+        overlap = overlap_length(previous.page_content, text) if adjacent else 0
+        if adjacent:
+            passages[-1] += text[overlap:] if overlap else "\n" + text
+        else:
+            passages.append(text)
+        chunks.append((doc, score))
+        previous = doc
+
+    text = "\n\n".join(passages)
+    tokens = count_tokens(text) if text else 0
+    return Context(text=text, chunks=chunks, tokens=tokens, tokens_saved=max(naive_tokens - tokens, 0))
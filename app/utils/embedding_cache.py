@@ -0,0 +1,261 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+from langchain_core.embeddings import Embeddings
+from core import logger
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text before hashing so insignificant whitespace does not change the key."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+# Recently used entries are written back to the store in batches, not on every hit
+_TOUCH_BATCH = 1000
+_TOUCH_INTERVAL = 60.0
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper with an in-memory LRU in front of a persistent SQLite store.
+
+    Entries are keyed on (model, SHA-256 of the normalized text) and stored as
+    float32 blobs. The store keeps at most max_entries rows, evicting the least
+    recently used ones. The SQLite file is opened on first use, so importing
+    the module touches no disk. Safe to share between threads.
+
+    The lock only guards the in-memory LRU and counters. Each thread reads the
+    store through its own connection, WAL mode lets those reads run alongside
+    the one writer, and hits are recorded in memory and written back with the
+    next store, or once _TOUCH_BATCH of them or _TOUCH_INTERVAL seconds have
+    built up, instead of committing on every hit.
+    """
+
+    def __init__(
+        self,
+        base: Embeddings,
+        model: str,
+        path: Path,
+        memory_entries: int = 10000,
+        max_entries: int = 1000000
+    ):
+        self.base = base
+        self.model = model
+        self.path = Path(path)
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.backend_calls = 0
+        self._memory: "OrderedDict[str, array]" = OrderedDict()
+        self._lock = threading.Lock()
+        # One writer at a time, also guards opening the store
+        self._write_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._stored = 0
+        self._local = threading.local()
+        self._readers: List[sqlite3.Connection] = []
+        # Bumped by close() so threads open new read connections afterwards
+        self._generation = 0
+        self._touched: Dict[str, float] = {}
+        self._touches_written = time.monotonic()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Open the SQLite store for writing on first use. Called with the write lock held."""
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL, "
+                "PRIMARY KEY (model, text_hash))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+            conn.commit()
+            (self._stored,) = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            self._conn = conn
+        return self._conn
+
+    def _reader(self) -> sqlite3.Connection:
+        """This thread's read connection to the store."""
+        generation, conn = getattr(self._local, "reader", (None, None))
+        if conn is not None and generation == self._generation:
+            return conn
+        with self._write_lock:
+            self._connection()
+        # Not bound to the thread, so close() can close it from another one
+        conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        conn.execute("PRAGMA query_only = ON")
+        with self._lock:
+            self._readers.append(conn)
+            self._local.reader = (self._generation, conn)
+        return conn
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        # float32 arrays take a fraction of the memory of a list of Python floats
+        self._memory[key] = array("f", vector)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _load(self, keys: List[str]) -> Dict[str, List[float]]:
+        conn = self._reader()
+        found = {}
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(
+                f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                [self.model, *batch]
+            ).fetchall()
+            for key, blob in rows:
+                found[key] = array("f", blob).tolist()
+        return found
+
+    def _write_touches(self, conn: sqlite3.Connection) -> None:
+        """Write the recorded hits' last_used times. Called with the write lock held, the caller commits."""
+        with self._lock:
+            touched, self._touched = self._touched, {}
+            self._touches_written = time.monotonic()
+        if touched:
+            conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                [(used, self.model, key) for key, used in touched.items()]
+            )
+
+    def _flush_touches(self) -> None:
+        """Write the recorded hits back unless a write is in progress, which writes them anyway."""
+        if not self._write_lock.acquire(blocking=False):
+            return
+        try:
+            conn = self._connection()
+            self._write_touches(conn)
+            conn.commit()
+        finally:
+            self._write_lock.release()
+
+    def _store(self, vectors: Dict[str, List[float]]) -> None:
+        now = time.time()
+        rows = [(self.model, key, array("f", vector).tobytes(), now) for key, vector in vectors.items()]
+        with self._write_lock:
+            conn = self._connection()
+            cursor = conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (model, text_hash, vector, last_used) VALUES (?, ?, ?, ?)", rows
+            )
+            self._stored += cursor.rowcount
+            # Before evicting, so entries hit since the last write are not taken for unused ones
+            self._write_touches(conn)
+            if self._stored > self.max_entries:
+                evicted = conn.execute(
+                    "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (self._stored - self.max_entries,)
+                ).rowcount
+                self._stored -= evicted
+                logger.info(f"Evicted {evicted} entries from the embedding cache")
+            conn.commit()
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key].tolist()
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        loaded = self._load(missing) if missing else {}
+        now = time.time()
+        with self._lock:
+            for key, vector in loaded.items():
+                self._remember(key, vector)
+                found[key] = vector
+            self._touched.update((key, now) for key in found)
+            flush = (
+                len(self._touched) >= _TOUCH_BATCH
+                or (self._touched and time.monotonic() - self._touches_written >= _TOUCH_INTERVAL)
+            )
+        if flush:
+            self._flush_touches()
+        return found
+
+    def _save(self, vectors: Dict[str, List[float]]) -> None:
+        with self._lock:
+            for key, vector in vectors.items():
+                self._remember(key, vector)
+        self._store(vectors)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        found = self._lookup(keys)
+
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+
+        if missing:
+            computed = dict(zip(missing.keys(), self.base.embed_documents(list(missing.values()))))
+            self._save(computed)
+            found.update(computed)
+
+        with self._lock:
+            if missing:
+                self.backend_calls += 1
+            self.misses += len(missing)
+            self.hits += len(texts) - len(missing)
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        found = self._lookup([key])
+        if key in found:
+            with self._lock:
+                self.hits += 1
+            return found[key]
+
+        vector = self.base.embed_query(text)
+        self._save({key: vector})
+        with self._lock:
+            self.misses += 1
+            self.backend_calls += 1
+        return vector
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters and current cache sizes."""
+        with self._write_lock:
+            self._connection()
+            stored = self._stored
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "backend_calls": self.backend_calls,
+                "memory_entries": len(self._memory),
+                "stored_entries": stored
+            }
+
+    def close(self) -> None:
+        with self._write_lock:
+            if self._conn is not None:
+                self._write_touches(self._conn)
+                self._conn.commit()
+                self._conn.close()
+                self._conn = None
+        with self._lock:
+            readers, self._readers = self._readers, []
+            self._generation += 1
+        for conn in readers:
+            conn.close()
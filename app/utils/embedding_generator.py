@@ -1,7 +1,91 @@
+import hashlib
+from typing import Dict, List
+from langchain_core.embeddings import Embeddings
+from pathlib import Path
 from langchain_openai  import OpenAIEmbeddings
 from core import settings
+from .embedding_cache import CachedEmbeddings
+from .embedding_scheduler import EmbeddingScheduler
+from .query_batcher import QueryEmbeddingBatcher
 
-embedding_model = OpenAIEmbeddings(openai_api_key=settings.OPENAI_API_KEY)
+
+def _cache_path() -> Path:
+    """Resolve the embedding cache file, relative paths are taken from the app folder."""
+    path = Path(settings.EMBEDDING_CACHE_PATH)
+    if not path.is_absolute():
+        path = Path(__file__).resolve().parent.parent / path
+    return path
+
+
+# Retries are left to the scheduler so it can back off as a whole on rate limits
+embedding_scheduler = EmbeddingScheduler(
+    OpenAIEmbeddings(model=settings.EMBEDDING_MODEL, openai_api_key=settings.OPENAI_API_KEY, max_retries=0),
+    max_batch_tokens=settings.EMBEDDING_BATCH_TOKENS,
+    max_batch_size=settings.EMBEDDING_BATCH_SIZE,
+    max_concurrency=settings.EMBEDDING_CONCURRENCY,
+    max_retries=settings.EMBEDDING_MAX_RETRIES
+)
+
+# Cache misses of concurrent queries reach the backend together
+query_batcher = QueryEmbeddingBatcher(
+    embedding_scheduler,
+    window=settings.QUERY_EMBEDDING_WINDOW_MS / 1000,
+    max_batch=settings.QUERY_EMBEDDING_BATCH_SIZE
+)
+
+embedding_model = CachedEmbeddings(
+    query_batcher,
+    model=settings.EMBEDDING_MODEL,
+    path=_cache_path(),
+    memory_entries=settings.EMBEDDING_CACHE_MEMORY_ENTRIES,
+    max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES
+)
 
 def get_embedding_model():
-    return embedding_model
\ No newline at end of file
+    return embedding_model
+
+
+def get_embedding_scheduler() -> EmbeddingScheduler:
+    return embedding_scheduler
+
+
+def get_query_batcher() -> QueryEmbeddingBatcher:
+    return query_batcher
+
+
+def text_hash(text: str) -> str:
+    """SHA-256 hex digest of a chunk's text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class DedupEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that embeds each distinct text only once.
+
+    Vectors for known text hashes are served without calling the backend,
+    and every vector it computes is remembered for the rest of its lifetime.
+    """
+
+    def __init__(self, base: Embeddings, known: Dict[str, List[float]] = None):
+        self.base = base
+        self.known = dict(known or {})
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [text_hash(text) for text in texts]
+        missing: Dict[str, str] = {}
+        for h, text in zip(hashes, texts):
+            if h not in self.known and h not in missing:
+                missing[h] = text
+
+        if missing:
+            vectors = self.base.embed_documents(list(missing.values()))
+            self.known.update(zip(missing.keys(), vectors))
+
+        self.misses += len(missing)
+        self.hits += len(texts) - len(missing)
+        return [self.known[h] for h in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.base.embed_query(text)
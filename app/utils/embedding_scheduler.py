@@ -0,0 +1,182 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from langchain_core.embeddings import Embeddings
+from core import logger
+from .text_chunker import num_tokens
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    return getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    """Recognise 429 responses from the OpenAI client and from plain HTTP backends."""
+    return _status_code(error) == 429 or type(error).__name__ == "RateLimitError"
+
+
+def _is_transient(error: Exception) -> bool:
+    """Recognise timeouts, connection failures and 5xx responses, which are worth retrying as they are."""
+    status = _status_code(error)
+    if isinstance(status, int) and status >= 500:
+        return True
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    # The OpenAI client's and httpx's timeout and connection errors, matched by name like RateLimitError
+    return any(
+        cls.__name__ in ("APITimeoutError", "APIConnectionError", "TimeoutException", "NetworkError")
+        for cls in type(error).__mro__
+    )
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Read the Retry-After header of a rate-limited response, if the backend sent one."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class EmbeddingScheduler(Embeddings):
+    """
+    Embeddings wrapper that packs texts into token-budgeted batches and embeds
+    a bounded number of batches concurrently.
+
+    Concurrency adapts to the backend: it is halved whenever a batch is rate
+    limited (429) and grows back by one slot per window of successful batches.
+    Rate-limited batches are retried after the server's Retry-After, or an
+    exponential backoff with jitter. Timeouts, connection errors and 5xx
+    responses are retried with the same backoff but leave the concurrency
+    alone. The limit is shared by every caller, so concurrent ingestions
+    never exceed it together. Queries go through the same retries as
+    single-text batches.
+    """
+
+    def __init__(
+        self,
+        base: Embeddings,
+        max_batch_tokens: int = 20000,
+        max_batch_size: int = 256,
+        max_concurrency: int = 4,
+        max_retries: int = 6,
+        backoff: float = 1.0,
+        token_counter: Callable[[str], int] = num_tokens
+    ):
+        self.base = base
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.token_counter = token_counter
+        self._limit = float(max_concurrency)
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._batches: "deque[Dict[str, float]]" = deque(maxlen=1000)
+        self.rate_limited = 0
+        self.transient_errors = 0
+
+    def _plan_batches(self, texts: List[str]) -> List[List[int]]:
+        """Group text indexes into batches of at most max_batch_tokens tokens and max_batch_size texts."""
+        batches: List[List[int]] = []
+        current: List[int] = []
+        current_tokens = 0
+        for i, text in enumerate(texts):
+            tokens = self.token_counter(text)
+            if current and (current_tokens + tokens > self.max_batch_tokens or len(current) >= self.max_batch_size):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _acquire(self) -> None:
+        with self._cond:
+            while self._in_flight >= int(self._limit):
+                self._cond.wait()
+            self._in_flight += 1
+
+    def _release(self) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def _on_success(self) -> None:
+        with self._cond:
+            self._limit = min(float(self.max_concurrency), self._limit + 1 / self._limit)
+            self._cond.notify_all()
+
+    def _on_rate_limited(self) -> None:
+        with self._cond:
+            self._limit = max(1.0, self._limit / 2)
+            self.rate_limited += 1
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        tokens = sum(self.token_counter(text) for text in texts)
+        for attempt in range(self.max_retries + 1):
+            self._acquire()
+            start = time.perf_counter()
+            try:
+                vectors = self.base.embed_documents(texts)
+            except Exception as e:
+                rate_limited = _is_rate_limited(e)
+                if not (rate_limited or _is_transient(e)) or attempt == self.max_retries:
+                    raise
+                if rate_limited:
+                    self._on_rate_limited()
+                else:
+                    with self._cond:
+                        self.transient_errors += 1
+                delay = _retry_after(e) or self.backoff * (2 ** attempt) * (0.5 + random.random())
+                reason = "rate limited" if rate_limited else f"failed ({type(e).__name__})"
+            else:
+                latency = time.perf_counter() - start
+                self._batches.append({"texts": len(texts), "tokens": tokens, "latency": latency, "retries": attempt})
+                self._on_success()
+                logger.debug(f"Embedded batch of {len(texts)} texts ({tokens} tokens) in {latency:.3f}s")
+                return vectors
+            finally:
+                self._release()
+            logger.warning(f"Embedding batch {reason}, retrying in {delay:.2f}s at concurrency {int(self._limit)}")
+            time.sleep(delay)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        batches = self._plan_batches(texts)
+        if len(batches) == 1:
+            results = [self._embed_batch(texts)]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as pool:
+                results = list(pool.map(lambda batch: self._embed_batch([texts[i] for i in batch]), batches))
+
+        vectors: List[List[float]] = [None] * len(texts)
+        for batch, batch_vectors in zip(batches, results):
+            for i, vector in zip(batch, batch_vectors):
+                vectors[i] = vector
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_batch([text])[0]
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-batch latency and throughput over the most recent batches."""
+        batches = list(self._batches)
+        latencies = sorted(batch["latency"] for batch in batches)
+        busy = sum(latencies)
+        tokens = sum(batch["tokens"] for batch in batches)
+        return {
+            "batches": len(batches),
+            "latency_p50": latencies[len(latencies) // 2] if latencies else 0.0,
+            "latency_max": latencies[-1] if latencies else 0.0,
+            "tokens_per_second": tokens / busy if busy else 0.0,
+            "rate_limited": self.rate_limited,
+            "transient_errors": self.transient_errors,
+            "concurrency": int(self._limit)
+        }
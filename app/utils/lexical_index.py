@@ -0,0 +1,140 @@
+import json
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.documents import Document
+from core import settings, logger
+from .local_vector_store import _namespace_dir
+
+# Words, numbers and codes like "E-104", "XJ_200" or "v2.1", lowercased
+_TOKEN = re.compile(r"[^\W_]+(?:[-_./][^\W_]+)*")
+_PART = re.compile(r"[^\W_]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Index terms of text. A code like "E-104" is indexed as itself, as its
+    parts and with its separators dropped, so "E-104", "e104" and "104" all
+    find it.
+    """
+    terms = []
+    for token in _TOKEN.findall(text.lower()):
+        terms.append(token)
+        parts = _PART.findall(token)
+        if len(parts) > 1:
+            terms.extend(parts)
+            terms.append("".join(parts))
+    return terms
+
+
+class LexicalIndex:
+    """
+    BM25 keyword index of one organization's chunks, in a SQLite file.
+
+    Chunks are stored with their text and metadata so keyword hits can be
+    returned as documents, and terms go to an FTS5 table ranked with its
+    built-in BM25. Safe to share between threads.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "chunk_id TEXT PRIMARY KEY, document_id TEXT, text TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_document ON chunks (document_id)")
+        # Terms are tokenized by tokenize(), FTS5 only has to split them on spaces
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS terms USING fts5("
+            "body, tokenize = \"unicode61 remove_diacritics 0 tokenchars '-_./'\")"
+        )
+        self._conn.commit()
+
+    def _remove(self, where: str, params: List[Any]) -> int:
+        self._conn.execute(f"DELETE FROM terms WHERE rowid IN (SELECT rowid FROM chunks WHERE {where})", params)
+        return self._conn.execute(f"DELETE FROM chunks WHERE {where}", params).rowcount
+
+    def add(self, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """Index chunks under their vector IDs, replacing chunks indexed under the same IDs."""
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                self._remove(f"chunk_id IN ({','.join('?' * len(batch))})", batch)
+            for chunk_id, text, metadata in zip(ids, texts, metadatas):
+                row = self._conn.execute(
+                    "INSERT INTO chunks (chunk_id, document_id, text, metadata) VALUES (?, ?, ?, ?)",
+                    (chunk_id, metadata.get("documentId"), text, json.dumps(metadata))
+                ).lastrowid
+                self._conn.execute("INSERT INTO terms (rowid, body) VALUES (?, ?)", (row, " ".join(tokenize(text))))
+            self._conn.commit()
+
+    def search(self, query: str, k: int, document_id: Optional[str] = None) -> List[Tuple[Document, float]]:
+        """Up to k (chunk, BM25 score) pairs matching any term of query, best first."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or k <= 0:
+            return []
+        match = " OR ".join(f'"{term}"' for term in terms)
+        sql = (
+            "SELECT c.chunk_id, c.text, c.metadata, bm25(terms) AS rank FROM terms "
+            "JOIN chunks c ON c.rowid = terms.rowid WHERE terms MATCH ?"
+        )
+        params: List[Any] = [match]
+        if document_id:
+            sql += " AND c.document_id = ?"
+            params.append(document_id)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(k)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        # FTS5 ranks better matches lower, BM25 scores are the negated rank
+        return [
+            (Document(id=chunk_id, page_content=text, metadata=json.loads(metadata)), -rank)
+            for chunk_id, text, metadata, rank in rows
+        ]
+
+    def delete(self, document_id: str) -> int:
+        """Remove the chunks of a document, returning how many were removed."""
+        with self._lock:
+            removed = self._remove("document_id = ?", [document_id])
+            self._conn.commit()
+            return removed
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_indexes: Dict[str, LexicalIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def _lexical_index_path() -> Path:
+    """Resolve the lexical index folder, relative paths are taken from the app folder."""
+    path = Path(settings.LEXICAL_INDEX_PATH)
+    if not path.is_absolute():
+        path = Path(__file__).resolve().parent.parent / path
+    return path
+
+
+def get_lexical_index(org_id: str) -> LexicalIndex:
+    """The keyword index of an organization, opened on first use."""
+    index = _indexes.get(org_id)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(org_id)
+            if index is None:
+                path = _lexical_index_path() / f"{_namespace_dir(org_id)}.sqlite3"
+                index = LexicalIndex(path)
+                _indexes[org_id] = index
+                logger.info(f"Opened lexical index of organization {org_id} at {path}")
+    return index
@@ -0,0 +1,427 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import uuid
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+from core import settings, logger
+from .vector_backend import VectorBackend
+
+# Metadata fields kept as per-row integer codes so filters on them are vectorised masks
+FILTER_FIELDS = ("orgId", "documentId")
+
+
+def _filter_values(condition: Any) -> List[Any]:
+    """Accept {"field": value}, {"field": {"$eq": value}} and {"field": {"$in": [...]}} filters."""
+    if isinstance(condition, dict):
+        if "$in" in condition:
+            return list(condition["$in"])
+        if "$eq" in condition:
+            return [condition["$eq"]]
+        raise ValueError(f"Unsupported filter operator: {condition}")
+    return [condition]
+
+
+class LocalVectorIndex:
+    """
+    Exact cosine top-k search over a float32 matrix persisted to memory-mapped files.
+
+    Rows are L2-normalised on insert so cosine similarity is a dot product.
+    IDs, texts and metadata live in a SQLite file next to the matrix. Deleted
+    rows are tombstoned in the alive mask and never searched again.
+    """
+
+    def __init__(self, path: Path, initial_capacity: int = 1024):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.initial_capacity = initial_capacity
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(str(self.path / "rows.sqlite3"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS rows (row INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, text TEXT, metadata TEXT)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS codes (field TEXT, value TEXT, code INTEGER, PRIMARY KEY (field, value))")
+        self._db.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT)")
+        self._db.commit()
+
+        info = dict(self._db.execute("SELECT key, value FROM info").fetchall())
+        self.dim: Optional[int] = int(info["dim"]) if "dim" in info else None
+        self.capacity = int(info.get("capacity", 0))
+        self._count = int(info.get("count", 0))
+        self._row_of: Dict[str, int] = dict(self._db.execute("SELECT id, row FROM rows").fetchall())
+        self._codes: Dict[str, Dict[str, int]] = {field: {} for field in FILTER_FIELDS}
+        for field, value, code in self._db.execute("SELECT field, value, code FROM codes"):
+            self._codes[field][value] = code
+        if self.dim:
+            self._open(self.capacity)
+
+    def _map(self, name: str, dtype: Any, shape: Tuple[int, ...]) -> np.memmap:
+        file_path = self.path / name
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        with open(file_path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        return np.memmap(file_path, dtype=dtype, mode="r+", shape=shape)
+
+    def _open(self, capacity: int) -> None:
+        self._vectors = self._map("vectors.f32", np.float32, (capacity, self.dim))
+        self._fields = self._map("fields.i32", np.int32, (capacity, len(FILTER_FIELDS)))
+        self._alive = self._map("alive.u8", np.uint8, (capacity,))
+        self.capacity = capacity
+
+    def _set_info(self, **values: Any) -> None:
+        self._db.executemany("INSERT OR REPLACE INTO info (key, value) VALUES (?, ?)", [(k, str(v)) for k, v in values.items()])
+
+    def _code(self, field: str, value: Any) -> int:
+        if value is None:
+            return -1
+        value = str(value)
+        codes = self._codes[field]
+        if value not in codes:
+            codes[value] = len(codes)
+            self._db.execute("INSERT INTO codes (field, value, code) VALUES (?, ?, ?)", (field, value, codes[value]))
+        return codes[value]
+
+    def _flush(self) -> None:
+        for array in (self._vectors, self._fields, self._alive):
+            array.flush()
+
+    def add(self, ids: List[str], vectors: Any, texts: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """Insert or overwrite rows by ID."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise ValueError("Expected one vector per ID")
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors = vectors / norms
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._open(self.initial_capacity)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected vectors of dimension {self.dim}, got {vectors.shape[1]}")
+
+            rows = []
+            for vector_id in ids:
+                row = self._row_of.get(vector_id)
+                if row is None:
+                    row = self._count
+                    self._count += 1
+                    self._row_of[vector_id] = row
+                rows.append(row)
+
+            if self._count > self.capacity:
+                self._flush()
+                self._open(max(self._count, self.capacity * 2))
+
+            rows_array = np.asarray(rows)
+            self._vectors[rows_array] = vectors
+            self._fields[rows_array] = [
+                [self._code(field, (metadata or {}).get(field)) for field in FILTER_FIELDS] for metadata in metadatas
+            ]
+            self._alive[rows_array] = 1
+            self._on_added(rows_array, vectors)
+            self._flush()
+
+            self._db.executemany(
+                "INSERT OR REPLACE INTO rows (row, id, text, metadata) VALUES (?, ?, ?, ?)",
+                [(row, vector_id, text, json.dumps(metadata or {})) for row, vector_id, text, metadata in zip(rows, ids, texts, metadatas)]
+            )
+            self._set_info(dim=self.dim, capacity=self.capacity, count=self._count)
+            self._db.commit()
+
+    def _on_added(self, rows: np.ndarray, vectors: np.ndarray) -> None:
+        """Hook for subclasses that maintain an index over the stored rows."""
+
+    def _candidates(self, query: np.ndarray, **options: Any) -> Optional[np.ndarray]:
+        """Rows worth scoring for query, or None to scan every row. Subclasses narrow this down."""
+        return None
+
+    def _mask(self, filter: Optional[Dict[str, Any]], rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Which rows (all stored rows, or the given ones) are alive and match filter."""
+        selector = slice(0, self._count) if rows is None else rows
+        mask = self._alive[selector].astype(bool)
+        for field, condition in (filter or {}).items():
+            if field not in FILTER_FIELDS:
+                raise ValueError(f"Filtering on '{field}' is not supported, use one of {FILTER_FIELDS}")
+            codes = [self._codes[field].get(str(value)) for value in _filter_values(condition)]
+            codes = [code for code in codes if code is not None]
+            mask &= np.isin(self._fields[selector, FILTER_FIELDS.index(field)], codes)
+        return mask
+
+    def search(self, vector: Any, k: int, filter: Optional[Dict[str, Any]] = None, **options: Any) -> List[Tuple[int, float]]:
+        """Top-k (row, cosine similarity) pairs among rows matching filter, best first."""
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+
+        with self._lock:
+            if not self._count:
+                return []
+            candidates = self._candidates(query, **options)
+            if candidates is not None:
+                candidates = candidates[self._mask(filter, candidates)]
+                if not len(candidates):
+                    return []
+                scores = self._vectors[candidates] @ query
+            else:
+                candidates = np.flatnonzero(self._mask(filter))
+                if not len(candidates):
+                    return []
+                if len(candidates) * 4 < self._count:
+                    # Selective filter, only score the matching rows
+                    scores = self._vectors[candidates] @ query
+                else:
+                    scores = self._vectors[:self._count] @ query
+                    scores = scores[candidates]
+
+        k = min(k, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(candidates[i]), float(scores[i])) for i in top]
+
+    def get_rows(self, rows: List[int]) -> Dict[int, Tuple[str, str, Dict[str, Any]]]:
+        """(id, text, metadata) of the given rows."""
+        if not rows:
+            return {}
+        placeholders = ",".join("?" * len(rows))
+        with self._lock:
+            found = self._db.execute(f"SELECT row, id, text, metadata FROM rows WHERE row IN ({placeholders})", rows).fetchall()
+        return {row: (vector_id, text, json.loads(metadata)) for row, vector_id, text, metadata in found}
+
+    def iter_rows(self, batch_size: int = 1000) -> Iterator[List[Tuple[str, List[float], str, Dict[str, Any]]]]:
+        """Batches of (id, vector, text, metadata) of the live rows, safe to delete from while iterating."""
+        last_row = -1
+        while True:
+            with self._lock:
+                found = self._db.execute(
+                    "SELECT row, id, text, metadata FROM rows WHERE row > ? ORDER BY row LIMIT ?", (last_row, batch_size)
+                ).fetchall()
+                if not found:
+                    return
+                batch = [(vector_id, self._vectors[row].tolist(), text, json.loads(metadata)) for row, vector_id, text, metadata in found]
+            last_row = found[-1][0]
+            yield batch
+
+    def fetch(self, ids: List[str]) -> Dict[str, List[float]]:
+        """Stored (normalised) vectors by ID. Missing IDs are left out."""
+        with self._lock:
+            rows = {vector_id: self._row_of[vector_id] for vector_id in ids if vector_id in self._row_of}
+            return {vector_id: self._vectors[row].tolist() for vector_id, row in rows.items()}
+
+    def delete(self, ids: Optional[List[str]] = None, filter: Optional[Dict[str, Any]] = None) -> int:
+        """Tombstone rows by ID or by filter. Returns the number of rows deleted."""
+        with self._lock:
+            if ids is not None:
+                rows = [self._row_of[vector_id] for vector_id in ids if vector_id in self._row_of]
+            elif filter:
+                rows = np.flatnonzero(self._mask(filter)).tolist() if self._count else []
+            else:
+                raise ValueError("Either ids or filter is required")
+            if not rows:
+                return 0
+
+            self._alive[np.asarray(rows)] = 0
+            self._alive.flush()
+            deleted = set(rows)
+            self._row_of = {vector_id: row for vector_id, row in self._row_of.items() if row not in deleted}
+            self._db.executemany("DELETE FROM rows WHERE row = ?", [(row,) for row in rows])
+            self._db.commit()
+            return len(rows)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return int(self._alive[:self._count].sum()) if self._count else 0
+
+    def close(self) -> None:
+        with self._lock:
+            if self.dim:
+                self._flush()
+            self._db.close()
+
+
+class LocalVectorStore(VectorStore):
+    """LangChain vector store over a LocalVectorIndex."""
+
+    def __init__(self, index: LocalVectorIndex, embedding):
+        self._index = index
+        self._embedding = embedding
+
+    @property
+    def embeddings(self):
+        return self._embedding
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any
+    ) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        ids = list(ids) if ids else [uuid.uuid4().hex for _ in texts]
+        metadatas = metadatas or [{} for _ in texts]
+        vectors = self._embedding.embed_documents(texts)
+        self._index.add(ids, vectors, texts, metadatas)
+        return ids
+
+    def similarity_search_by_vector_with_score(
+        self, embedding: List[float], k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        hits = self._index.search(embedding, k, filter, **kwargs)
+        rows = self._index.get_rows([row for row, _ in hits])
+        results = []
+        for row, score in hits:
+            if row in rows:
+                vector_id, text, metadata = rows[row]
+                results.append((Document(id=vector_id, page_content=text, metadata=metadata), score))
+        return results
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k, filter)
+
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter)]
+
+    def similarity_search(
+        self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        # Same cosine-to-relevance mapping as PineconeVectorStore
+        return lambda score: (score + 1) / 2
+
+    def delete(self, ids: Optional[List[str]] = None, filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> bool:
+        self._index.delete(ids=ids, filter=filter)
+        return True
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding,
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        path: Optional[Path] = None,
+        **kwargs: Any
+    ) -> "LocalVectorStore":
+        store = cls(LocalVectorIndex(path or settings.LOCAL_VECTOR_PATH), embedding)
+        store.add_texts(texts, metadatas, ids)
+        return store
+
+
+def _namespace_dir(namespace: str) -> str:
+    """Folder name of a namespace shard, hashed when the name is not a safe file name."""
+    if re.fullmatch(r"[A-Za-z0-9_.-]{1,100}", namespace) and not namespace.startswith("."):
+        return namespace
+    return hashlib.sha256(namespace.encode("utf-8")).hexdigest()
+
+
+class LocalVectorBackend(VectorBackend):
+    """
+    In-process vector backend, for running offline and in CI.
+
+    The default namespace lives in path itself and every other namespace is
+    a separate index (shard) under path/namespaces, opened on first use.
+    """
+
+    name = "local"
+
+    def __init__(self, path: Path, embedding_factory, index_factory=LocalVectorIndex):
+        self.path = Path(path)
+        self._embedding_factory = embedding_factory
+        self._index_factory = index_factory
+        self._lock = threading.Lock()
+        self._index: Optional[LocalVectorIndex] = None
+        self._shards: Dict[str, LocalVectorIndex] = {}
+
+    def initialize(self) -> None:
+        if self._index is not None:
+            return
+        with self._lock:
+            if self._index is None:
+                self._index = self._index_factory(self.path)
+                logger.info(f"Opened local vector index at {self.path} with {len(self._index)} vectors")
+
+    def refresh(self) -> None:
+        with self._lock:
+            for index in [self._index, *self._shards.values()]:
+                if index is not None:
+                    index.close()
+            self._index = None
+            self._shards = {}
+        self.initialize()
+
+    @property
+    def index(self) -> LocalVectorIndex:
+        self.initialize()
+        return self._index
+
+    def shard(self, namespace: Optional[str] = None) -> LocalVectorIndex:
+        """The index holding one namespace."""
+        if namespace is None:
+            return self.index
+        index = self._shards.get(namespace)
+        if index is None:
+            with self._lock:
+                index = self._shards.get(namespace)
+                if index is None:
+                    index = self._index_factory(self.path / "namespaces" / _namespace_dir(namespace))
+                    self._shards[namespace] = index
+        return index
+
+    def vectorstore(self, embedding=None, namespace: Optional[str] = None) -> LocalVectorStore:
+        return LocalVectorStore(self.shard(namespace), embedding or self._embedding_factory())
+
+    def fetch(self, ids: List[str], namespace: Optional[str] = None) -> Dict[str, List[float]]:
+        return self.shard(namespace).fetch(ids)
+
+    def move_to_namespaces(
+        self,
+        namespace_of: Callable[[Dict[str, Any]], Optional[str]],
+        batch_size: int = 100,
+        dry_run: bool = False
+    ) -> Dict[str, int]:
+        moved: Dict[str, int] = defaultdict(int)
+        source = self.index
+        for batch in source.iter_rows(batch_size):
+            groups = defaultdict(list)
+            for vector_id, vector, text, metadata in batch:
+                namespace = namespace_of(metadata)
+                if namespace:
+                    groups[namespace].append((vector_id, vector, text, metadata))
+            for namespace, records in groups.items():
+                if not dry_run:
+                    ids, vectors, texts, metadatas = (list(column) for column in zip(*records))
+                    self.shard(namespace).add(ids, vectors, texts, metadatas)
+                    source.delete(ids=ids)
+                moved[namespace] += len(records)
+        return dict(moved)
+
+    def health(self) -> Dict[str, Any]:
+        try:
+            shards = self.path / "namespaces"
+            namespaces = sum(1 for entry in shards.iterdir() if entry.is_dir()) if shards.exists() else 0
+            return {
+                "status": "ok",
+                "backend": self.name,
+                "path": str(self.path),
+                "vectors": len(self.index),
+                "namespaces": namespaces
+            }
+        except Exception as e:
+            return {"status": "error", "backend": self.name, "error": str(e)}
@@ -1,36 +1,147 @@
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional
 from pinecone import Pinecone, ServerlessSpec
 
 from langchain_pinecone import PineconeVectorStore
-from core import settings, BadRequestException
-from utils import get_embedding_model
+from core import settings, logger, BadRequestException
+from .embedding_generator import get_embedding_model
+from .vector_backend import VectorBackend
 
 # pinecone.init(api_key=settings.PINECONE_API_KEY, environment=settings.PINECONE_ENV)
 
 pc = Pinecone(api_key=settings.PINECONE_API_KEY)
 
-def create_index():
+def create_index(client: Pinecone = None):
+    client = client or pc
     try:
-        if not pc.has_index(settings.PINECONE_INDEX_NAME):
-            pc.create_index(
+        if not client.has_index(settings.PINECONE_INDEX_NAME):
+            client.create_index(
                 name=settings.PINECONE_INDEX_NAME,
                 dimension=1536,
                 metric="cosine",
                 spec=ServerlessSpec(cloud="aws", region="us-east-1")        
         )
-        index = pc.Index(settings.PINECONE_INDEX_NAME)
+        # The index handle keeps a pool of data-plane connections that every caller shares
+        index = client.Index(settings.PINECONE_INDEX_NAME, pool_threads=settings.PINECONE_POOL_THREADS)
         return index;
     except Exception as e:
         raise BadRequestException(f"Error in creating Pinecone Index {e}")
-    
-    
 
 
+class VectorStoreClient(VectorBackend):
+    """
+    Process-wide Pinecone index handle and vector store.
 
-def get_vectorstore():
-    try:
-        embedding_model = get_embedding_model()
-        
-        index = create_index()
-        return PineconeVectorStore(index=index, embedding=embedding_model)
-    except Exception as e:
-        raise BadRequestException(f"Error in get vector store {e}")
\ No newline at end of file
+    The index is checked and opened once, on startup or on first use, and
+    then reused by every query, delete and ingest. refresh() re-opens it,
+    for example after the index was recreated.
+    """
+
+    name = "pinecone"
+
+    def __init__(self, client: Pinecone):
+        self._client = client
+        self._lock = threading.Lock()
+        self._index = None
+        self._vectorstore: Optional[PineconeVectorStore] = None
+        # Vector stores over a namespace of the shared index, one per namespace
+        self._namespaced: Dict[str, PineconeVectorStore] = {}
+        self.initialized_at: Optional[float] = None
+        self.initializations = 0
+
+    def initialize(self) -> None:
+        """Check the index and open the shared handle, unless that already happened."""
+        if self._index is not None:
+            return
+        with self._lock:
+            if self._index is None:
+                index = create_index(self._client)
+                self._vectorstore = PineconeVectorStore(index=index, embedding=get_embedding_model())
+                self._index = index
+                self.initialized_at = time.time()
+                self.initializations += 1
+                logger.info(f"Opened Pinecone index {settings.PINECONE_INDEX_NAME}")
+
+    def refresh(self) -> None:
+        """Drop the shared handle and open it again."""
+        with self._lock:
+            self._index = None
+            self._vectorstore = None
+            self._namespaced = {}
+        self.initialize()
+
+    @property
+    def index(self):
+        self.initialize()
+        return self._index
+
+    def vectorstore(self, embedding=None, namespace: Optional[str] = None) -> PineconeVectorStore:
+        """The shared vector store, or one over a namespace of the shared index or with a custom embedding."""
+        self.initialize()
+        if embedding is not None:
+            return PineconeVectorStore(index=self._index, embedding=embedding, namespace=namespace)
+        if namespace is None:
+            return self._vectorstore
+        vectorstore = self._namespaced.get(namespace)
+        if vectorstore is None:
+            with self._lock:
+                vectorstore = self._namespaced.get(namespace)
+                if vectorstore is None:
+                    vectorstore = PineconeVectorStore(index=self._index, embedding=get_embedding_model(), namespace=namespace)
+                    self._namespaced[namespace] = vectorstore
+        return vectorstore
+
+    def fetch(self, ids: List[str], namespace: Optional[str] = None) -> Dict[str, List[float]]:
+        vectors = {}
+        for start in range(0, len(ids), 100):
+            response = self.index.fetch(ids=ids[start:start + 100], namespace=namespace)
+            for vector_id, vector in response.vectors.items():
+                vectors[vector_id] = list(vector.values)
+        return vectors
+
+    def move_to_namespaces(
+        self,
+        namespace_of: Callable[[Dict[str, Any]], Optional[str]],
+        batch_size: int = 100,
+        dry_run: bool = False
+    ) -> Dict[str, int]:
+        """
+        Copy vectors out of the default namespace page by page, then delete the
+        copied ones, so an interrupted run is simply started again.
+        Listing IDs needs a serverless index.
+        """
+        moved: Dict[str, int] = defaultdict(int)
+        for ids in self.index.list(namespace="", limit=batch_size):
+            response = self.index.fetch(ids=ids, namespace="")
+            groups = defaultdict(list)
+            for vector_id, vector in response.vectors.items():
+                metadata = dict(vector.metadata or {})
+                namespace = namespace_of(metadata)
+                if namespace:
+                    groups[namespace].append({"id": vector_id, "values": list(vector.values), "metadata": metadata})
+            for namespace, records in groups.items():
+                if not dry_run:
+                    self.index.upsert(vectors=records, namespace=namespace, show_progress=False)
+                    self.index.delete(ids=[record["id"] for record in records], namespace="")
+                moved[namespace] += len(records)
+        return dict(moved)
+
+    def health(self) -> Dict[str, Any]:
+        """Report whether the index answers, with its vector count."""
+        try:
+            stats = self.index.describe_index_stats()
+            return {
+                "status": "ok",
+                "backend": self.name,
+                "index": settings.PINECONE_INDEX_NAME,
+                "vectors": stats.total_vector_count,
+                "namespaces": len(stats.namespaces or {}),
+                "initializedAt": self.initialized_at
+            }
+        except Exception as e:
+            return {"status": "error", "backend": self.name, "index": settings.PINECONE_INDEX_NAME, "error": str(e)}
+
+
+vector_store_client = VectorStoreClient(pc)
\ No newline at end of file
@@ -0,0 +1,98 @@
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+from langchain_core.embeddings import Embeddings
+from core import logger
+
+
+class QueryEmbeddingBatcher(Embeddings):
+    """
+    Embeddings wrapper that coalesces concurrent query embeddings into batches.
+
+    Queries embed one short text each from the threads of the query pool. The
+    first query to arrive waits up to window seconds, or until max_batch texts
+    are queued, then embeds everything queued in one embed_documents call and
+    hands each waiting thread its vector. A text already queued or being
+    embedded is not sent again, its callers wait for the same vector. A window
+    of 0 embeds every query on its own. Documents are passed straight through.
+    """
+
+    def __init__(self, base: Embeddings, window: float = 0.005, max_batch: int = 32):
+        self.base = base
+        self.window = window
+        self.max_batch = max_batch
+        self._cond = threading.Condition()
+        self._queue: Dict[str, "Future[List[float]]"] = {}
+        self._in_flight: Dict[str, "Future[List[float]]"] = {}
+        self._leader = False
+        self.queries = 0
+        self.collapsed = 0
+        self.backend_calls = 0
+
+    def _flush(self) -> None:
+        """Wait out the window as the leader, then embed the queued texts."""
+        deadline = time.monotonic() + self.window
+        with self._cond:
+            while len(self._queue) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch, self._queue = self._queue, {}
+            self._in_flight.update(batch)
+            # The next query to arrive leads the next batch while this one is embedded
+            self._leader = False
+            self.backend_calls += 1
+
+        texts = list(batch)
+        try:
+            vectors = self.base.embed_documents(texts)
+        except Exception as e:
+            for future in batch.values():
+                future.set_exception(e)
+        else:
+            for text, vector in zip(texts, vectors):
+                batch[text].set_result(vector)
+        finally:
+            with self._cond:
+                for text in texts:
+                    self._in_flight.pop(text, None)
+        logger.debug(f"Embedded {len(texts)} coalesced queries in one call")
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.window <= 0:
+            with self._cond:
+                self.queries += 1
+                self.backend_calls += 1
+            return self.base.embed_query(text)
+
+        lead = False
+        with self._cond:
+            self.queries += 1
+            future: Optional["Future[List[float]]"] = self._queue.get(text) or self._in_flight.get(text)
+            if future is not None:
+                self.collapsed += 1
+            else:
+                future = Future()
+                self._queue[text] = future
+                if not self._leader:
+                    self._leader = lead = True
+                elif len(self._queue) >= self.max_batch:
+                    self._cond.notify_all()
+        if lead:
+            self._flush()
+        return future.result()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.base.embed_documents(texts)
+
+    def stats(self) -> Dict[str, float]:
+        """Queries seen, how many shared another query's embedding, and the backend calls made for them."""
+        with self._cond:
+            return {
+                "queries": self.queries,
+                "collapsed": self.collapsed,
+                "backend_calls": self.backend_calls,
+                "mean_batch": (self.queries - self.collapsed) / self.backend_calls if self.backend_calls else 0.0
+            }
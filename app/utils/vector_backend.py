@@ -0,0 +1,48 @@
+from typing import Any, Callable, Dict, List, Optional
+from langchain_core.vectorstores import VectorStore
+
+
+class VectorBackend:
+    """
+    Interface of the vector store backends selectable through settings.VECTOR_STORE_BACKEND.
+
+    A backend is created once per process and hands out LangChain vector
+    stores over its shared index, so callers never depend on which one runs.
+    Vectors live in namespaces, separate partitions of the index that are
+    searched, fetched and deleted independently. None is the default namespace.
+    """
+
+    name = "base"
+
+    def initialize(self) -> None:
+        """Open the index, unless that already happened."""
+        raise NotImplementedError
+
+    def refresh(self) -> None:
+        """Drop the open index and open it again."""
+        raise NotImplementedError
+
+    def vectorstore(self, embedding=None, namespace: Optional[str] = None) -> VectorStore:
+        """A vector store over one namespace of the shared index, optionally with a custom embedding."""
+        raise NotImplementedError
+
+    def fetch(self, ids: List[str], namespace: Optional[str] = None) -> Dict[str, List[float]]:
+        """Stored values of existing vectors by ID. Missing IDs are left out."""
+        raise NotImplementedError
+
+    def move_to_namespaces(
+        self,
+        namespace_of: Callable[[Dict[str, Any]], Optional[str]],
+        batch_size: int = 100,
+        dry_run: bool = False
+    ) -> Dict[str, int]:
+        """
+        Move the vectors of the default namespace into the namespace namespace_of
+        picks from their metadata. Vectors it maps to None stay where they are.
+        Returns the number of vectors moved per namespace.
+        """
+        raise NotImplementedError
+
+    def health(self) -> Dict[str, Any]:
+        """Report whether the index answers, with its vector count."""
+        raise NotImplementedError
@@ -0,0 +1,72 @@
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+from core import settings, BadRequestException
+from .embedding_generator import get_embedding_model
+from .vector_backend import VectorBackend
+
+_backend: Optional[VectorBackend] = None
+_backend_lock = threading.Lock()
+
+
+def _local_vector_path() -> Path:
+    """Resolve the local vector index folder, relative paths are taken from the app folder."""
+    path = Path(settings.LOCAL_VECTOR_PATH)
+    if not path.is_absolute():
+        path = Path(__file__).resolve().parent.parent / path
+    return path
+
+
+def _create_backend() -> VectorBackend:
+    if settings.VECTOR_STORE_BACKEND == "local":
+        from .local_vector_store import LocalVectorBackend, LocalVectorIndex
+        if settings.LOCAL_VECTOR_INDEX == "ivf":
+            from .ann_index import IVFVectorIndex
+            index_factory = lambda path: IVFVectorIndex(
+                path,
+                nlist=settings.LOCAL_IVF_LISTS,
+                nprobe=settings.LOCAL_IVF_NPROBE,
+                min_train_vectors=settings.LOCAL_IVF_MIN_VECTORS
+            )
+        else:
+            index_factory = LocalVectorIndex
+        return LocalVectorBackend(_local_vector_path(), get_embedding_model, index_factory)
+    from .pinecone_store import vector_store_client
+    return vector_store_client
+
+
+def get_vector_backend() -> VectorBackend:
+    """The process-wide vector backend selected by settings.VECTOR_STORE_BACKEND."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = _create_backend()
+    return _backend
+
+
+def org_namespace(org_id: Optional[str]) -> Optional[str]:
+    """
+    Namespace holding an organization's vectors, or None when every organization
+    shares the default namespace and is told apart by the orgId metadata filter.
+    """
+    if not settings.VECTOR_ORG_PARTITIONS or not org_id:
+        return None
+    return f"org-{org_id}"
+
+
+def get_vectorstore(embedding=None, namespace: Optional[str] = None):
+    try:
+        return get_vector_backend().vectorstore(embedding, namespace)
+    except Exception as e:
+        raise BadRequestException(f"Error in get vector store {e}")
+
+
+def fetch_vectors(ids: List[str], namespace: Optional[str] = None) -> Dict[str, List[float]]:
+    """Fetch the stored values of existing vectors by ID. Missing IDs are left out."""
+    if not ids:
+        return {}
+    try:
+        return get_vector_backend().fetch(ids, namespace)
+    except Exception as e:
+        raise BadRequestException(f"Error in fetching vectors {e}")
\ No newline at end of file